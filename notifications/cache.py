@@ -0,0 +1,84 @@
+# notifications/cache.py
+"""
+Per-owner / per-customer cache for computed dashboard contexts.
+
+Keys are invalidated from notifications/signals.py whenever a Payment,
+Subscription, Plan or Category that feeds a dashboard changes.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 30       # seconds a recompute may hold the lock
+LOCK_WAIT = 5.0         # seconds a contender waits for the holder's result
+LOCK_POLL = 0.05
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def admin_dashboard_key(owner_id=None):
+    return f"dashboard:admin:{owner_id or 'all'}"
+
+
+def customer_dashboard_key(customer_id):
+    return f"dashboard:customer:{customer_id}"
+
+
+def get_or_compute(key, builder, timeout=None):
+    """
+    Return cache[key], computing it with builder() on a miss.
+
+    Only one caller recomputes a missing key (lock via cache.add); the others
+    wait up to LOCK_WAIT for its result before computing themselves. A
+    generation counter stops a recompute that raced with an invalidation from
+    writing its stale result back.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    gen_key, lock_key = f"{key}:gen", f"{key}:lock"
+    generation = cache.get(gen_key, 0)
+
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        return builder()
+
+    try:
+        value = builder()
+        if cache.get(gen_key, 0) == generation:
+            cache.set(key, value, timeout if timeout is not None else _timeout())
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+def invalidate(*keys):
+    """Drop cached values and bump their generation so in-flight recomputes are discarded."""
+    keys = [k for k in keys if k]
+    if not keys:
+        return
+    for key in keys:
+        gen_key = f"{key}:gen"
+        if not cache.add(gen_key, 1, None):
+            try:
+                cache.incr(gen_key)
+            except ValueError:
+                cache.set(gen_key, 1, None)
+    cache.delete_many(keys)
+
+
+def invalidate_dashboards(owner_ids=(), customer_ids=()):
+    """Invalidate the given admins' dashboards, the unscoped one, and the given customers'."""
+    keys = [admin_dashboard_key(None)]
+    keys += [admin_dashboard_key(o) for o in set(owner_ids) if o]
+    keys += [customer_dashboard_key(c) for c in set(customer_ids) if c]
+    invalidate(*keys)
@@ -0,0 +1,278 @@
+# notifications/channels.py
+"""
+Delivery channels and the per-user router.
+
+A channel sends a batch of Notifications through one provider and returns one
+result dict per notification ({"success", "error", "error_class", "code",
+"provider_message_id"}):
+  - email : SMTP, one connection per batch (providers_email)
+  - msg91 : MSG91 HTTP API over a pooled, long-lived requests.Session, with
+            many recipients per call (see MSG91Channel.pack)
+  - twilio: Twilio REST client (keeps its own pooled session), created once
+
+deliver() routes each notification through its recipient's ordered channel
+preferences (User.notification_channels, else NOTIFICATION_DEFAULT_CHANNELS),
+falling back to the next channel when one fails, is over its rate limit or has
+no address for the recipient.
+"""
+import threading
+from collections import defaultdict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import ratelimit
+from .providers_email import build_email, failure_result, send_email_batch
+from .templating import render_notification
+
+_lock = threading.Lock()
+
+
+def sms_text(notification):
+    subject, text, _ = render_notification(notification)
+    if subject:
+        return f"{subject}: {text}".strip()
+    return text
+
+
+def _mobile_number(notification):
+    user = getattr(notification, 'recipient_user', None)
+    return getattr(user, 'mobile_number', None) or None
+
+
+def http_failure(exc, status=None):
+    """Result dict for an HTTP provider error: 429, 5xx and network errors are transient."""
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is not None:
+        transient = status == 429 or status >= 500
+    else:
+        transient = isinstance(exc, requests.RequestException)
+    return {"success": False, "error": str(exc), "code": status,
+            "error_class": 'transient' if transient else 'permanent'}
+
+
+# ----------------------------
+# Channels
+# ----------------------------
+class EmailChannel:
+    name = 'email'
+    rate_limit = 'smtp'
+
+    def configured(self):
+        return True
+
+    def address(self, notification):
+        user = getattr(notification, 'recipient_user', None)
+        return (user.email if user else None) or notification.recipient
+
+    def send_batch(self, notifications):
+        results = [None] * len(notifications)
+        messages, positions = [], []
+        for i, notification in enumerate(notifications):
+            try:
+                subject, text, html = render_notification(notification)
+                messages.append(build_email(
+                    self.address(notification),
+                    subject or "Notification from SUBHUB",
+                    body_text=text,
+                    html_body=html,
+                ))
+                positions.append(i)
+            except Exception as e:
+                results[i] = failure_result(e)
+
+        for i, result in zip(positions, send_email_batch(messages)):
+            results[i] = result
+        return results
+
+
+class MSG91Channel:
+    name = 'msg91'
+    rate_limit = 'msg91'
+    URL = "https://api.msg91.com/api/v2/sendsms"
+
+    def __init__(self):
+        self._session = None
+
+    def configured(self):
+        return bool(getattr(settings, 'MSG91_AUTH_KEY', None))
+
+    def address(self, notification):
+        return _mobile_number(notification)
+
+    @property
+    def session(self):
+        # one keep-alive connection pool per process instead of a handshake per text
+        if self._session is None:
+            with _lock:
+                if self._session is None:
+                    pool = getattr(settings, 'SMS_HTTP_POOL_SIZE', 10)
+                    session = requests.Session()
+                    session.mount('https://', HTTPAdapter(pool_connections=pool, pool_maxsize=pool))
+                    session.headers.update({'authkey': settings.MSG91_AUTH_KEY or '',
+                                            'Content-Type': 'application/json'})
+                    self._session = session
+        return self._session
+
+    def _post(self, sms):
+        """One API call for a list of {"message", "to": [...]} entries."""
+        payload = {
+            "sender": settings.MSG91_SENDER_ID,
+            "route": settings.MSG91_ROUTE,
+            "country": settings.MSG91_COUNTRY,
+            "sms": sms,
+        }
+        try:
+            response = self.session.post(self.URL, json=payload,
+                                         timeout=getattr(settings, 'SMS_HTTP_TIMEOUT', 10))
+            response.raise_for_status()
+        except Exception as e:
+            return http_failure(e)
+        try:
+            request_id = response.json().get('message')
+        except ValueError:
+            request_id = None
+        return {"success": True, "provider_message_id": request_id}
+
+    def send_text(self, phone, message):
+        return self._post([{"message": message, "to": [phone]}])
+
+    def pack(self, notifications):
+        """
+        Yield (sms entries, notification indexes) per API call: identical texts
+        share one entry with many "to" numbers, distinct texts become separate
+        entries, and each call carries at most MSG91_BATCH_SIZE recipients.
+        """
+        size = max(getattr(settings, 'MSG91_BATCH_SIZE', 100), 1)
+        by_text = defaultdict(list)
+        for i, notification in enumerate(notifications):
+            by_text[sms_text(notification)].append((i, self.address(notification)))
+
+        sms, indexes = [], []
+        for text, members in by_text.items():
+            while members:
+                room = size - len(indexes)
+                take, members = members[:room], members[room:]
+                sms.append({"message": text, "to": [phone for _, phone in take]})
+                indexes.extend(i for i, _ in take)
+                if len(indexes) >= size:
+                    yield sms, indexes
+                    sms, indexes = [], []
+        if sms:
+            yield sms, indexes
+
+    def send_batch(self, notifications):
+        # MSG91 answers per call: every recipient in a call shares its outcome and request id
+        results = [None] * len(notifications)
+        for sms, indexes in self.pack(notifications):
+            result = self._post(sms)
+            for i in indexes:
+                results[i] = dict(result)
+        return results
+
+
+class TwilioChannel:
+    name = 'twilio'
+    rate_limit = 'twilio'
+
+    def __init__(self):
+        self._client = None
+
+    def configured(self):
+        return bool(getattr(settings, 'TWILIO_ACCOUNT_SID', None) and
+                    getattr(settings, 'TWILIO_AUTH_TOKEN', None) and
+                    getattr(settings, 'TWILIO_PHONE_NUMBER', None))
+
+    def address(self, notification):
+        number = _mobile_number(notification)
+        if number and not number.startswith('+'):
+            number = f"+{settings.TWILIO_COUNTRY}{number}"
+        return number
+
+    @property
+    def client(self):
+        # the Twilio client keeps a pooled requests.Session of its own; build it once
+        if self._client is None:
+            with _lock:
+                if self._client is None:
+                    from twilio.rest import Client
+                    self._client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        return self._client
+
+    def send_text(self, phone, message):
+        from twilio.base.exceptions import TwilioRestException
+
+        try:
+            sent = self.client.messages.create(to=phone, from_=settings.TWILIO_PHONE_NUMBER, body=message)
+        except TwilioRestException as e:
+            return http_failure(e, status=e.status)
+        except Exception as e:
+            return http_failure(e)
+        return {"success": True, "provider_message_id": sent.sid}
+
+    def send_batch(self, notifications):
+        return [self.send_text(self.address(n), sms_text(n)) for n in notifications]
+
+
+CHANNELS = {channel.name: channel for channel in (EmailChannel(), MSG91Channel(), TwilioChannel())}
+
+
+# ----------------------------
+# Routing
+# ----------------------------
+def channels_for(notification):
+    """Ordered, configured channels for the notification's recipient."""
+    user = getattr(notification, 'recipient_user', None)
+    names = (getattr(user, 'notification_channels', None) or
+             getattr(settings, 'NOTIFICATION_DEFAULT_CHANNELS', ['email']))
+    chosen = [CHANNELS[name] for name in names if name in CHANNELS and CHANNELS[name].configured()]
+    return chosen or [CHANNELS['email']]
+
+
+def deliver(notifications):
+    """
+    Send each notification through its first usable channel, falling back down
+    its preference list. Channels are batched: every round sends one batch per
+    channel. Returns one result dict per notification (with "channel"), in order.
+    """
+    notifications = list(notifications)
+    plans = [channels_for(n) for n in notifications]
+    position = [0] * len(notifications)
+    results = [None] * len(notifications)
+    todo = list(range(len(notifications)))
+
+    while todo:
+        batches = defaultdict(list)
+        for i in todo:
+            plan = plans[i]
+            while position[i] < len(plan) and not plan[position[i]].address(notifications[i]):
+                position[i] += 1
+            if position[i] < len(plan):
+                batches[plan[position[i]].name].append(i)
+            elif results[i] is None:
+                results[i] = {"success": False, "error": "no address for any channel",
+                              "error_class": "permanent", "code": None}
+        todo = []
+
+        for name, indexes in batches.items():
+            channel = CHANNELS[name]
+            granted, retry_after = len(indexes), 0.0
+            if channel.rate_limit:
+                granted, retry_after = ratelimit.acquire(channel.rate_limit, len(indexes))
+            sendable, limited = indexes[:granted], indexes[granted:]
+
+            for i in limited:
+                results[i] = {"success": False, "deferred": True, "retry_after": retry_after,
+                              "error": f"{name} rate limit reached", "channel": name}
+            sent = channel.send_batch([notifications[i] for i in sendable]) if sendable else []
+            for i, result in zip(sendable, sent):
+                results[i] = dict(result, channel=name)
+
+            for i in indexes:
+                if not results[i].get("success"):
+                    position[i] += 1
+                    if position[i] < len(plans[i]):
+                        todo.append(i)
+    return results
@@ -6,6 +6,8 @@ from django.http import HttpResponseForbidden
 from django.utils import timezone
 from datetime import timedelta, date
 from django.db.models import Sum
+from .cache import customer_dashboard_key, get_or_compute
+from .pagination import keyset_paginate
 
 
 # --------------------------
@@ -23,13 +25,12 @@ from datetime import date
 from collections import Counter
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
-from .models import Notification
+from .models import Notification, normalize_recipient
 
 
-@login_required
-def customer_dashboard(request):
-    customer = request.user
-    subscriptions = customer.subscriptions.all()
+def _customer_dashboard_context(customer):
+    """Subscription/payment part of the customer dashboard (cacheable)."""
+    subscriptions = list(customer.subscriptions.select_related('plan'))
 
     # Calculate days left
     for sub in subscriptions:
@@ -62,15 +63,7 @@ def customer_dashboard(request):
     payment_labels = list(payment_counter.keys())
     payment_data = list(payment_counter.values())
 
-    # Notifications
-    notifications = Notification.objects.filter(
-        recipient=customer.email
-    ).order_by('-date_sent')
-
-    unread_count = notifications.filter(is_read=False).count()
-
-    context = {
-        'customer': customer,
+    return {
         'subscriptions': subscriptions,
         'active_subscriptions': active_subscriptions,
         'pending_payments': pending_payments,
@@ -78,9 +71,31 @@ def customer_dashboard(request):
         'subscription_data': subscription_data,
         'payment_labels': payment_labels,
         'payment_data': payment_data,
+    }
+
+
+@login_required
+def customer_dashboard(request):
+    customer = request.user
+
+    # Cached per customer; invalidated by notifications/signals.py
+    context = dict(get_or_compute(
+        customer_dashboard_key(customer.pk),
+        lambda: _customer_dashboard_context(customer),
+    ))
+
+    # Notifications stay live (read/unread toggles are not cache events)
+    notifications = Notification.objects.filter(
+        recipient=normalize_recipient(customer.email)
+    ).order_by('-date_sent')
+
+    unread_count = notifications.filter(is_read=False).count()
+
+    context.update({
+        'customer': customer,
         'notifications': notifications[:5],
         'unread_count': unread_count,
-    }
+    })
 
     return render(request, 'dashboard/cusindex.html', context)
 
@@ -125,8 +140,9 @@ def subscribe_plan(request, plan_id):
 # ✅ List (All subscriptions of logged-in customer)
 @login_required
 def customer_subscriptions(request):
-    subscriptions = request.user.subscriptions.all()
-    return render(request, 'customers/subscription_list.html', {'subscriptions': subscriptions})
+    subscriptions = request.user.subscriptions.select_related('plan')
+    page = keyset_paginate(subscriptions, request, ('-id',), per_page=10)
+    return render(request, 'customers/subscription_list.html', {'subscriptions': page, 'page': page})
 
 
 # ✅ Update (Edit subscription details like address, phone, payment)
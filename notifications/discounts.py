@@ -0,0 +1,148 @@
+# notifications/discounts.py
+"""
+Stored effective prices for plans.
+
+Plan.current_price and Plan.discount_applied hold the values Plan.final_price
+and Plan.discount_status would otherwise work out from the discount window on
+every access. They only change at the window's two boundaries, so:
+
+  - Plan.save() stores them for the moment of saving, and the post_save
+    signal schedules apply_discount_boundary (a Celery ETA task) at each
+    boundary coming up within DISCOUNT_SCHEDULE_HORIZON_SECONDS;
+  - apply_discount_boundary re-evaluates the plan when its ETA fires;
+  - sweep_plan_discounts (beat, every DISCOUNT_SWEEP_SECONDS) corrects any
+    plan whose stored values disagree with the clock -- a lost or late task,
+    a queryset.update() that bypassed save() -- and schedules the ETAs for
+    boundaries in the last sweep interval of the horizon (sweep_window), so
+    each boundary is queued by one sweep rather than by every sweep that sees
+    it. ETAs are never queued further ahead than the horizon because brokers
+    with a visibility timeout (Redis) redeliver long-delayed tasks.
+
+When a discount starts, customers subscribed to plans in the same category
+can get a 'Discount' notification (DISCOUNT_NOTIFY_CUSTOMERS). Each window is
+announced once: Plan.discount_notified_at is claimed with a conditional
+UPDATE before any notification is created.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .cache import invalidate_dashboards
+from .models import Plan, Subscription, User, plan_discount_active, plan_effective_price
+
+# the deactivation date is still inside the window (<=), so that task fires just after it
+AFTER_WINDOW = timedelta(microseconds=1)
+
+
+def horizon():
+    return timedelta(seconds=getattr(settings, 'DISCOUNT_SCHEDULE_HORIZON_SECONDS', 900))
+
+
+def sweep_window(now=None):
+    """
+    (start, within) of the boundaries one sweep schedules: only the last
+    DISCOUNT_SWEEP_SECONDS of the horizon, since the earlier part was already
+    covered by the previous sweeps (or by Plan.save()).
+    """
+    now = now or timezone.now()
+    lead = max(horizon() - timedelta(seconds=getattr(settings, 'DISCOUNT_SWEEP_SECONDS', 300)), timedelta(0))
+    return now + lead, horizon()
+
+
+def boundaries(plan, now=None, within=None, start=None):
+    """ETAs at which `plan`'s stored price must be re-evaluated, after start (default now) up to now + within."""
+    now = now or timezone.now()
+    start = start or now
+    end = now + (within or horizon())
+    if not (plan.discount_activated_date and plan.discount_deactivated_date):
+        return []
+    etas = (plan.discount_activated_date, plan.discount_deactivated_date + AFTER_WINDOW)
+    return [eta for eta in etas if start < eta <= end]
+
+
+def upcoming(now=None, within=None, start=None):
+    """Plans with a boundary after start (default now) up to now + within."""
+    now = now or timezone.now()
+    start = start or now
+    end = now + (within or horizon())
+    return Plan.objects.filter(
+        Q(discount_activated_date__gt=start, discount_activated_date__lte=end) |
+        Q(discount_deactivated_date__gte=start - AFTER_WINDOW, discount_deactivated_date__lte=end)
+    )
+
+
+def refresh_prices(plan_ids=None, now=None):
+    """
+    Store the current effective price of every plan (or only `plan_ids`) whose
+    stored values are out of date. Computed in SQL from the row itself, so a
+    concurrent edit is never overwritten with stale values. Dashboards showing
+    the changed plans are invalidated. Returns the ids of plans whose discount
+    has just started.
+    """
+    now = now or timezone.now()
+    plans = Plan.objects.all() if plan_ids is None else Plan.objects.filter(pk__in=list(plan_ids))
+    stale = plans.with_effective_price(now).filter(
+        Q(current_price__isnull=True) | Q(discount_applied__isnull=True) |
+        ~Q(current_price=F('effective_price')) | ~Q(discount_applied=F('discount_active'))
+    )
+    with transaction.atomic():
+        rows = list(stale.select_for_update().values_list('pk', 'discount_applied', 'discount_active'))
+        if not rows:
+            return []
+        changed = [pk for pk, _, _ in rows]
+        Plan.objects.filter(pk__in=changed).update(
+            current_price=Round(plan_effective_price(now=now), 2),
+            discount_applied=plan_discount_active(now=now),
+        )
+        owners = list(Plan.objects.filter(pk__in=changed).values_list('category__created_by', flat=True))
+        customers = list(Subscription.objects.filter(plan_id__in=changed).values_list(
+            'customer_id', flat=True).distinct())
+        transaction.on_commit(lambda: invalidate_dashboards(owners, customers))
+    return [pk for pk, was_applied, active in rows if active and not was_applied]
+
+
+# ----------------------------
+# Customer announcements
+# ----------------------------
+def notify_enabled():
+    return getattr(settings, 'DISCOUNT_NOTIFY_CUSTOMERS', False)
+
+
+def claim_announcement(plan_id, now=None):
+    """
+    Mark the plan's current discount window as announced. Returns the plan if
+    this caller won the claim (and the discount is live), else None.
+    """
+    now = now or timezone.now()
+    claimed = Plan.objects.filter(
+        Q(discount_notified_at__isnull=True) | Q(discount_notified_at__lt=F('discount_activated_date')),
+        pk=plan_id,
+        discount_activated_date__lte=now,
+        discount_deactivated_date__gte=now,
+    ).update(discount_notified_at=now)
+    if not claimed:
+        return None
+    return Plan.objects.select_related('category').get(pk=plan_id)
+
+
+def audience(plan):
+    """Customers subscribed to any plan in `plan`'s category."""
+    return User.objects.filter(
+        role='customer', subscriptions__plan__category_id=plan.category_id
+    ).distinct().order_by('pk')
+
+
+def announcement(plan):
+    """(title, details) of the 'Discount' notification for `plan`."""
+    percent = f"{Decimal(plan.discount_percent or 0).normalize():f}"
+    title = f"{plan.name}: {percent}% off"
+    details = (
+        f"{plan.name} is now ₹{plan.final_price} (was ₹{plan.price}) until "
+        f"{timezone.localtime(plan.discount_deactivated_date):%d %b %Y, %I:%M %p}."
+    )
+    return title, details
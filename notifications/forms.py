@@ -108,7 +108,7 @@ from .models import Notification
 class NotificationForm(forms.ModelForm):
     class Meta:
         model = Notification
-        fields = ['title', 'recipient', 'type', 'details']
+        fields = ['title', 'recipient', 'type', 'details', 'template']
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control form-control-lg',
@@ -126,6 +126,12 @@ class NotificationForm(forms.ModelForm):
                 'rows': 5,
                 'placeholder': 'Write the full message that will be emailed to the user…',
             }),
+            'template': forms.Select(attrs={
+                'class': 'form-select',
+            }),
+        }
+        help_texts = {
+            'template': 'Optional: personalise the email/SMS with a saved template.',
         }
 
     def clean_recipient(self):
@@ -0,0 +1,133 @@
+# notifications/jobs.py
+"""
+Daily subscription jobs and the sharding helpers that split them across
+Celery workers.
+
+Every job takes an optional Subscription `queryset` to run over, so the same
+function serves the monolithic run (queryset=None) and one shard of a
+sharded run (see tasks.run_subscription_job_shard). Jobs return a dict of
+counts, optionally with per-phase seconds under 'timings'.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .cache import invalidate_dashboards
+from .models import Subscription
+from .reminders import run_reminders
+
+
+# ----------------------------
+# Jobs
+# ----------------------------
+def expiry_job(queryset=None, chunk_size=None):
+    """
+    Deactivate subscriptions that have ended (one UPDATE). Expiry reminders are
+    issued and sent by payment_reminders_job alone: both share the reminder
+    ledger, so a second issuer would claim reminders that nothing sends.
+    Returns the count plus per-phase timings (select / update / invalidate).
+    """
+    base = queryset if queryset is not None else Subscription.objects.all()
+    today = timezone.localdate()
+    timings = {}
+
+    started = time.monotonic()
+    expired = base.filter(is_active=True, end_date__lte=today)
+    affected = list(expired.values_list('owner_id', 'customer_id'))
+    timings['select'] = round(time.monotonic() - started, 3)
+
+    started = time.monotonic()
+    deactivated = expired.update(subscription_status="Inactive", is_active=False)
+    timings['update'] = round(time.monotonic() - started, 3)
+
+    # signals don't fire for UPDATE, so drop the cached dashboards here
+    started = time.monotonic()
+    if affected:
+        owners, customers = zip(*affected)
+        invalidate_dashboards(owners, customers)
+    timings['invalidate'] = round(time.monotonic() - started, 3)
+
+    return {'deactivated': deactivated, 'timings': timings}
+
+
+def alerts_job(queryset=None, chunk_size=None):
+    """Alert rows for subscriptions at the SUBSCRIPTION_ALERT_OFFSETS tiers."""
+    stats = run_reminders(
+        kind='alert',
+        offsets=getattr(settings, 'SUBSCRIPTION_ALERT_OFFSETS', (7, 0)),
+        chunk_size=chunk_size,
+        queryset=queryset,
+    )
+    return {'alerts': stats['created'], 'checked': stats['candidates']}
+
+
+def payment_reminders_job(queryset=None, chunk_size=None):
+    """
+    Expiry reminders, each chunk sent over one SMTP connection as it is created.
+    Whatever the channels' rate limits can't take right now goes to 'retry', not waited for.
+    """
+    from . import outbox
+    from .tasks import send_notification_batch
+
+    counts = {'sent': 0, 'failed': 0, 'deferred': 0}
+
+    def send(notifications):
+        # run inline; rate-limited rows are left to the retry sweeper
+        result = send_notification_batch([n.pk for n in notifications])
+        for key in counts:
+            counts[key] += result[key]
+
+    # in outbox mode the dispatcher picks the new rows up
+    on_created = None if outbox.enabled() else send
+    stats = run_reminders(kind='notification', chunk_size=chunk_size, queryset=queryset, on_created=on_created)
+    return {'reminders': stats['created'], **counts}
+
+
+SUBSCRIPTION_JOBS = {
+    'check_subscription_notifications': expiry_job,
+    'generate_alerts': alerts_job,
+    'send_payment_reminders': payment_reminders_job,
+}
+
+
+# ----------------------------
+# Sharding
+# ----------------------------
+def shard_count():
+    return max(int(getattr(settings, 'SUBSCRIPTION_JOB_SHARDS', 1) or 1), 1)
+
+
+def plan_shards(count=None, mode=None):
+    """
+    Split the Subscription table into `count` JSON-serialisable shard specs:
+      - 'range': contiguous id ranges between MIN(id) and MAX(id)
+      - 'hash' : customer_id % count buckets (keeps a customer on one shard)
+    """
+    count = count or shard_count()
+    mode = mode or getattr(settings, 'SUBSCRIPTION_JOB_SHARD_MODE', 'range')
+
+    if mode == 'hash':
+        return [{'mode': 'hash', 'index': i, 'count': count} for i in range(count)]
+
+    bounds = Subscription.objects.aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return []
+    lo, hi = bounds['lo'], bounds['hi']
+    size = math.ceil((hi - lo + 1) / count)
+    return [
+        {'mode': 'range', 'lo': start, 'hi': min(start + size - 1, hi)}
+        for start in range(lo, hi + 1, size)
+    ]
+
+
+def shard_queryset(shard):
+    """Subscription queryset covered by one shard spec from plan_shards()."""
+    qs = Subscription.objects.all()
+    if shard['mode'] == 'hash':
+        return qs.annotate(shard_bucket=Mod('customer_id', shard['count'])).filter(
+            shard_bucket=shard['index'])
+    return qs.filter(pk__gte=shard['lo'], pk__lte=shard['hi'])
@@ -0,0 +1,145 @@
+# notifications/locks.py
+"""
+DB-row lease locks for scheduled jobs.
+
+A lease is a JobLease row named "<job>:<period>". Whoever inserts it (or
+takes over an expired, unfinished one) runs the job; everyone else exits
+immediately. While the job runs a heartbeat thread keeps pushing expires_at
+forward, so a crashed holder's lease lapses after JOB_LEASE_TTL_SECONDS and
+the next contender can take over. A completed lease blocks the rest of the
+period, which is what stops duplicate beat / web instances from double-running.
+Leases of past periods are deleted by prune_leases (run daily with retention).
+"""
+import functools
+import logging
+import socket
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import JobLease
+
+logger = logging.getLogger(__name__)
+
+PERIOD_FORMATS = {
+    'daily': '%Y-%m-%d',
+    'hourly': '%Y-%m-%dT%H',
+}
+
+
+def _ttl(ttl=None):
+    return ttl or getattr(settings, 'JOB_LEASE_TTL_SECONDS', 600)
+
+
+def period_key(period):
+    if not period:
+        return 'always'
+    return timezone.localtime().strftime(PERIOD_FORMATS[period])
+
+
+def acquire_lease(name, ttl=None, holder=None):
+    """Return a holder token if the lease `name` was acquired, else None."""
+    ttl = _ttl(ttl)
+    holder = holder or f"{socket.gethostname()}:{uuid.uuid4().hex[:12]}"
+    now = timezone.now()
+    expires = now + timedelta(seconds=ttl)
+
+    try:
+        with transaction.atomic():
+            JobLease.objects.create(name=name, holder=holder, acquired_at=now,
+                                    heartbeat_at=now, expires_at=expires)
+        return holder
+    except IntegrityError:
+        pass
+
+    # take over a lease whose holder died before finishing
+    taken = JobLease.objects.filter(
+        name=name, completed_at__isnull=True, expires_at__lt=now
+    ).update(holder=holder, acquired_at=now, heartbeat_at=now, expires_at=expires)
+    return holder if taken else None
+
+
+def heartbeat(name, holder, ttl=None):
+    """Extend a held lease; False means it was lost to another holder."""
+    now = timezone.now()
+    return bool(JobLease.objects.filter(name=name, holder=holder, completed_at__isnull=True).update(
+        heartbeat_at=now, expires_at=now + timedelta(seconds=_ttl(ttl))
+    ))
+
+
+def release_lease(name, holder, completed=True):
+    """
+    completed=True  -> keep the row so the rest of the period is skipped.
+    completed=False -> expire it now so the next contender may retry.
+    """
+    now = timezone.now()
+    fields = {'completed_at': now} if completed else {'expires_at': now}
+    JobLease.objects.filter(name=name, holder=holder).update(**fields)
+
+
+def prune_leases(keep=timedelta(days=2)):
+    """
+    Delete leases that lapsed more than `keep` ago. Longer than the longest
+    period ('daily'), so a completed lease still blocks the rest of its period;
+    a running holder's heartbeat keeps its own row out of reach.
+    """
+    count, _ = JobLease.objects.filter(expires_at__lt=timezone.now() - keep).delete()
+    return count
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, name, holder, ttl):
+        super().__init__(daemon=True)
+        self.lease_name, self.holder, self.ttl = name, holder, ttl
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.ttl / 3):
+                if not heartbeat(self.lease_name, self.holder, self.ttl):
+                    logger.warning("lease %s lost by %s", self.lease_name, self.holder)
+                    return
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=5)
+
+
+def singleton_task(period='daily', ttl=None):
+    """
+    Decorator for scheduled task functions: run at most one instance per
+    `period` ('daily', 'hourly', or None for plain mutual exclusion).
+    Contenders return {"status": "skipped"} without doing any work.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            name = f"{func.__name__}:{period_key(period)}"
+            lease_ttl = _ttl(ttl)
+            holder = acquire_lease(name, lease_ttl)
+            if holder is None:
+                logger.info("%s: lease %s held elsewhere, skipping", func.__name__, name)
+                return {"status": "skipped", "reason": "lease_held", "lease": name}
+
+            beat = _Heartbeat(name, holder, lease_ttl)
+            beat.start()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                beat.stop()
+                release_lease(name, holder, completed=False)
+                raise
+            beat.stop()
+            if period:
+                release_lease(name, holder, completed=True)
+            else:
+                JobLease.objects.filter(name=name, holder=holder).delete()
+            return result
+        return wrapper
+    return decorator
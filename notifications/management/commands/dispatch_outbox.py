@@ -0,0 +1,67 @@
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending notifications from the outbox (run as many dispatchers as needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows claimed per batch (default: NOTIFICATION_BATCH_SIZE)')
+        parser.add_argument('--idle-sleep', type=float, default=2.0,
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the outbox once and exit instead of polling')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.NOTIFICATION_BATCH_SIZE
+        idle_sleep = options['idle_sleep']
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        name = socket.gethostname()
+        totals = {'sent': 0, 'failed': 0}
+        released = outbox.release_stale_claims()
+        if released:
+            self.stdout.write(f'{name}: released {released} stale claims')
+
+        last_release = time.monotonic()
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() - last_release > 60:
+                outbox.release_stale_claims()
+                last_release = time.monotonic()
+
+            notifications = outbox.claim(batch_size)
+            if not notifications:
+                if options['once']:
+                    break
+                time.sleep(idle_sleep)
+                continue
+
+            # channels take their own rate-limit tokens; rows over a limit come back deferred
+            results = outbox.deliver(notifications)
+            sent = sum(1 for r in results if r.get('success'))
+            deferred = [r.get('retry_after') or 0 for r in results if r.get('deferred')]
+            totals['sent'] += sent
+            totals['failed'] += len(results) - sent - len(deferred)
+            self.stdout.write(f'{name}: batch of {len(results)}: {sent} sent, '
+                              f'{len(results) - sent - len(deferred)} failed, {len(deferred)} deferred')
+            if len(deferred) == len(results):
+                # everything hit a rate limit: wait for the buckets instead of deferring the whole outbox
+                time.sleep(min(deferred))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox dispatcher stopped: sent {totals['sent']}, failed {totals['failed']}"
+        ))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notifications.rollups import rebuild_daily_metrics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyOwnerMetrics dashboard rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Rebuild the last N days (default: current year)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days']:
+            since = timezone.localdate() - timedelta(days=options['days'])
+        rows = rebuild_daily_metrics(since=since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} rollup rows'))
@@ -0,0 +1,197 @@
+# notifications/metrics.py
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import List, Optional
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import (
+    DailyOwnerMetrics, Payment, Plan, Subscription, plan_monthly_price,
+)
+
+
+# ----------------------------
+# Result object
+# ----------------------------
+@dataclass(frozen=True)
+class DashboardMetrics:
+    """All KPIs shown on the admin dashboard, computed in one pass."""
+    total_revenue: float = 0.0
+    active_subscriptions: int = 0
+    new_subscriptions: int = 0
+    churn_rate: float = 0.0
+    arpu: float = 0.0
+    mrr: float = 0.0
+    total_plans: int = 0
+    revenue_by_month: List[float] = field(default_factory=lambda: [0.0] * 12)
+    subscriptions_by_month: List[int] = field(default_factory=lambda: [0] * 12)
+    top_location: Optional[str] = None
+    top_location_ratio: float = 0.0
+
+
+# ----------------------------
+# Scoping helpers
+# ----------------------------
+def _subscriptions_for(owner):
+    qs = Subscription.objects.all()
+    if owner:
+        qs = qs.for_owner(owner)
+    return qs
+
+
+def _payments_for(owner):
+    qs = Payment.objects.all()
+    if owner:
+        qs = qs.for_owner(owner)
+    return qs
+
+
+def _plans_for(owner):
+    qs = Plan.objects.all()
+    if owner:
+        qs = qs.filter(category__created_by=owner)
+    return qs
+
+
+# ----------------------------
+# MRR (computed in SQL)
+# ----------------------------
+def calculate_mrr(owner=None):
+    """
+    Monthly Recurring Revenue: monthly-equivalent effective price of every
+    active subscription, summed in one aggregate query.
+    """
+    total = _subscriptions_for(owner).filter(subscription_status='Active').aggregate(
+        mrr=Sum(plan_monthly_price('plan__'))
+    )['mrr']
+    return round(float(total or 0.0), 2)
+
+
+def monthly_series(owner=None, year=None):
+    """
+    Revenue and new-subscription totals per month of `year`, read from the
+    DailyOwnerMetrics rollups (at most 365 rows per plan) in one grouped query.
+    """
+    year = year or timezone.localdate().year
+    rows = DailyOwnerMetrics.objects.filter(date__year=year)
+    if owner:
+        rows = rows.filter(owner=owner)
+    rows = rows.values('date__month').annotate(
+        revenue=Sum('revenue'), new=Sum('new_subscriptions')
+    ).order_by()
+
+    revenue, subscriptions = [0.0] * 12, [0] * 12
+    for row in rows:
+        revenue[row['date__month'] - 1] = float(row['revenue'] or 0.0)
+        subscriptions[row['date__month'] - 1] = row['new'] or 0
+    return revenue, subscriptions
+
+
+# ----------------------------
+# Location analytics (CustomerProfile hierarchy)
+# ----------------------------
+LOCATION_LEVELS = ('state', 'district', 'city', 'pin_code')
+
+
+def location_breakdown(owner=None, level='state', top_n=None, total=None, **parents):
+    """
+    Subscriptions grouped by the customer's CustomerProfile `level`
+    (state -> district -> city -> pin_code), computed with one GROUP BY.
+
+    Drill down by passing the parent levels, e.g.
+        location_breakdown(owner, 'city', state='Kerala', district='Ernakulam')
+    Ratios are relative to all subscriptions in that scope; pass `total` if
+    the caller already knows it to save the count query.
+    """
+    if level not in LOCATION_LEVELS:
+        raise ValueError(f"Unknown location level: {level}")
+    allowed = LOCATION_LEVELS[:LOCATION_LEVELS.index(level)]
+
+    subs = _subscriptions_for(owner)
+    for parent, value in parents.items():
+        if parent not in allowed:
+            raise ValueError(f"'{parent}' is not a parent of '{level}'")
+        subs = subs.filter(**{f'customer__customer_profile__{parent}': value})
+
+    if total is None:
+        total = subs.count()
+    if not total:
+        return []
+
+    field = f'customer__customer_profile__{level}'
+    rows = (
+        subs.exclude(**{f'{field}__isnull': True})
+        .exclude(**{field: ''})
+        .values(field)
+        .annotate(subscriptions=Count('id'), customers=Count('customer', distinct=True))
+        .order_by('-subscriptions', field)
+    )
+    if top_n:
+        rows = rows[:top_n]
+
+    return [
+        {
+            'location': row[field],
+            'subscriptions': row['subscriptions'],
+            'customers': row['customers'],
+            'ratio': round((row['subscriptions'] / total) * 100, 2),
+        }
+        for row in rows
+    ]
+
+
+# ----------------------------
+# Engine
+# ----------------------------
+def compute_dashboard_metrics(owner=None, days=30):
+    """
+    Compute the full dashboard KPI set for `owner` (or globally when owner is None).
+
+    Subscription KPIs come from a single conditional-aggregation query and
+    revenue from a second one; the year charts are read from the
+    DailyOwnerMetrics rollups; top city and plan count are two small
+    grouped/count queries.
+    """
+    today = timezone.now().date()
+    since = today - timedelta(days=days)
+    year = today.year
+
+    active = Q(subscription_status='Active')
+    subs = _subscriptions_for(owner)
+    sub_aggs = {
+        'total': Count('id'),
+        'active': Count('id', filter=active),
+        'active_customers': Count('customer', filter=active, distinct=True),
+        'new': Count('id', filter=Q(start_date__gte=since)),
+        'at_start': Count('id', filter=Q(start_date__lt=since)),
+        'churned': Count('id', filter=Q(
+            subscription_status='Inactive', end_date__gte=since, end_date__lte=today
+        )),
+        'mrr': Sum(plan_monthly_price('plan__'), filter=active),
+    }
+    s = subs.aggregate(**sub_aggs)
+    total_revenue = float(_payments_for(owner).aggregate(total=Sum('amount'))['total'] or 0.0)
+    revenue_by_month, subscriptions_by_month = monthly_series(owner, year)
+
+    arpu = round(total_revenue / s['active_customers'], 2) if s['active_customers'] else 0.0
+    churn_rate = round((s['churned'] / s['at_start']) * 100, 2) if s['at_start'] else 0.0
+
+    top_location, top_location_ratio = None, 0.0
+    top = location_breakdown(owner, 'city', top_n=1, total=s['total'])
+    if top:
+        top_location, top_location_ratio = top[0]['location'], top[0]['ratio']
+
+    return DashboardMetrics(
+        total_revenue=total_revenue,
+        active_subscriptions=s['active'],
+        new_subscriptions=s['new'],
+        churn_rate=churn_rate,
+        arpu=arpu,
+        mrr=round(float(s['mrr'] or 0.0), 2),
+        total_plans=_plans_for(owner).count(),
+        revenue_by_month=revenue_by_month,
+        subscriptions_by_month=subscriptions_by_month,
+        top_location=top_location,
+        top_location_ratio=top_location_ratio,
+    )
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0011_alter_subscription_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOwnerMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payments_count', models.PositiveIntegerField(default=0)),
+                ('new_subscriptions', models.PositiveIntegerField(default=0)),
+                ('expirations', models.PositiveIntegerField(default=0)),
+                ('active_count', models.PositiveIntegerField(default=0)),
+                ('upi_payments', models.PositiveIntegerField(default=0)),
+                ('netbanking_payments', models.PositiveIntegerField(default=0)),
+                ('card_payments', models.PositiveIntegerField(default=0)),
+                ('wallet_payments', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_metrics', to=settings.AUTH_USER_MODEL)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_metrics', to='notifications.plan')),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['owner', 'date'], name='notificatio_owner_i_53c4cb_idx'), models.Index(fields=['date'], name='notificatio_date_863de1_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyownermetrics',
+            constraint=models.UniqueConstraint(fields=('owner', 'date', 'plan'), name='uniq_daily_owner_metrics'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0012_dailyownermetrics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerprofile',
+            index=models.Index(fields=['state', 'district', 'city', 'pin_code'], name='profile_location_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_owner(apps, schema_editor):
+    Plan = apps.get_model('notifications', 'Plan')
+    Subscription = apps.get_model('notifications', 'Subscription')
+    Payment = apps.get_model('notifications', 'Payment')
+
+    Subscription.objects.update(owner=Subquery(
+        Plan.objects.filter(pk=OuterRef('plan_id')).values('category__created_by')[:1]
+    ))
+    Payment.objects.update(owner=Subquery(
+        Subscription.objects.filter(pk=OuterRef('subscription_id')).values('owner')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0013_customerprofile_location_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='owner',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='owned_payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='owner',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='owned_subscriptions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['owner', 'payment_date'], name='notificatio_owner_i_600bdd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['owner', 'subscription_status'], name='notificatio_owner_i_5cfd96_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['owner', 'start_date'], name='notificatio_owner_i_784044_idx'),
+        ),
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0014_denormalize_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('notification', 'Notification'), ('alert', 'Alert')], default='notification', max_length=20)),
+                ('offset_days', models.PositiveSmallIntegerField()),
+                ('period', models.DateField()),
+                ('run_id', models.CharField(db_index=True, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['is_active', 'end_date'], name='notificatio_is_acti_f77ab6_idx'),
+        ),
+        migrations.AddField(
+            model_name='reminderledger',
+            name='subscription',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='notifications.subscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='reminderledger',
+            constraint=models.UniqueConstraint(fields=('subscription', 'kind', 'offset_days', 'period'), name='uniq_reminder_ledger'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-17 09:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0017_broadcast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.14 on 2026-10-17 09:25
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_content_hash(apps, schema_editor):
+    # same formula as models.notification_content_hash (historical models have no methods)
+    Notification = apps.get_model('notifications', 'Notification')
+    batch = []
+    for n in Notification.objects.only('id', 'title', 'details', 'type').iterator(chunk_size=1000):
+        content = '\x1f'.join((n.title or '', n.details or '', n.type or ''))
+        n.content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        batch.append(n)
+        if len(batch) >= 1000:
+            Notification.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        Notification.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0018_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['content_hash', 'recipient_user'], name='notif_hash_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['content_hash', 'recipient'], name='notif_hash_recipient_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0021_notification_outbox_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notification_channels',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0023_notificationtemplate'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='notificatio_owner_i_600bdd_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['date_sent', 'id'], name='notif_date_sent_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['owner', 'payment_date', 'id'], name='payment_owner_date_id_idx'),
+        ),
+    ]
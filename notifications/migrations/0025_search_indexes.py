@@ -0,0 +1,119 @@
+# Generated by Django 5.0.14 on 2026-10-17 11:40
+
+# Search indexes for notifications/search.py: FTS5 tables + triggers on SQLite,
+# tsvector / pg_trgm GIN indexes on PostgreSQL, nothing elsewhere. SQLite drops a
+# table's triggers when a migration rebuilds it; such a migration must re-create
+# them.
+
+from django.db import migrations
+
+TOKENIZE = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+
+# one payment_fts row per payment: what payments_list searches
+PAYMENT_ROWS = (
+    "SELECT p.id, p.transaction_id, u.username, pl.name FROM notifications_payment p "
+    "JOIN notifications_subscription s ON s.id = p.subscription_id "
+    "JOIN notifications_user u ON u.id = s.customer_id "
+    "JOIN notifications_plan pl ON pl.id = s.plan_id"
+)
+PAYMENT_FTS_INSERT = "INSERT INTO notifications_payment_fts(rowid, transaction_id, username, plan_name) "
+
+SQLITE_FORWARD = [
+    # notifications: external content, the row itself stays in notifications_notification
+    f"CREATE VIRTUAL TABLE notifications_notification_fts USING fts5("
+    f"title, details, content='notifications_notification', content_rowid='id', {TOKENIZE})",
+    "CREATE TRIGGER notifications_notification_fts_ai AFTER INSERT ON notifications_notification BEGIN "
+    "INSERT INTO notifications_notification_fts(rowid, title, details) VALUES (new.id, new.title, new.details); END",
+    "CREATE TRIGGER notifications_notification_fts_ad AFTER DELETE ON notifications_notification BEGIN "
+    "INSERT INTO notifications_notification_fts(notifications_notification_fts, rowid, title, details) "
+    "VALUES ('delete', old.id, old.title, old.details); END",
+    "CREATE TRIGGER notifications_notification_fts_au AFTER UPDATE OF title, details ON notifications_notification BEGIN "
+    "INSERT INTO notifications_notification_fts(notifications_notification_fts, rowid, title, details) "
+    "VALUES ('delete', old.id, old.title, old.details); "
+    "INSERT INTO notifications_notification_fts(rowid, title, details) VALUES (new.id, new.title, new.details); END",
+    "INSERT INTO notifications_notification_fts(notifications_notification_fts) VALUES ('rebuild')",
+
+    # payments: denormalized text from three tables, refreshed when any source changes
+    f"CREATE VIRTUAL TABLE notifications_payment_fts USING fts5(transaction_id, username, plan_name, {TOKENIZE})",
+    f"CREATE TRIGGER notifications_payment_fts_ai AFTER INSERT ON notifications_payment BEGIN "
+    f"{PAYMENT_FTS_INSERT}{PAYMENT_ROWS} WHERE p.id = new.id; END",
+    "CREATE TRIGGER notifications_payment_fts_ad AFTER DELETE ON notifications_payment BEGIN "
+    "DELETE FROM notifications_payment_fts WHERE rowid = old.id; END",
+    f"CREATE TRIGGER notifications_payment_fts_au AFTER UPDATE OF transaction_id, subscription_id "
+    f"ON notifications_payment BEGIN "
+    f"DELETE FROM notifications_payment_fts WHERE rowid = old.id; "
+    f"{PAYMENT_FTS_INSERT}{PAYMENT_ROWS} WHERE p.id = new.id; END",
+    f"CREATE TRIGGER notifications_subscription_payment_fts_au AFTER UPDATE OF customer_id, plan_id "
+    f"ON notifications_subscription BEGIN "
+    f"DELETE FROM notifications_payment_fts WHERE rowid IN "
+    f"(SELECT id FROM notifications_payment WHERE subscription_id = new.id); "
+    f"{PAYMENT_FTS_INSERT}{PAYMENT_ROWS} WHERE s.id = new.id; END",
+    f"CREATE TRIGGER notifications_user_payment_fts_au AFTER UPDATE OF username ON notifications_user BEGIN "
+    f"DELETE FROM notifications_payment_fts WHERE rowid IN (SELECT p.id FROM notifications_payment p "
+    f"JOIN notifications_subscription s ON s.id = p.subscription_id WHERE s.customer_id = new.id); "
+    f"{PAYMENT_FTS_INSERT}{PAYMENT_ROWS} WHERE s.customer_id = new.id; END",
+    f"CREATE TRIGGER notifications_plan_payment_fts_au AFTER UPDATE OF name ON notifications_plan BEGIN "
+    f"DELETE FROM notifications_payment_fts WHERE rowid IN (SELECT p.id FROM notifications_payment p "
+    f"JOIN notifications_subscription s ON s.id = p.subscription_id WHERE s.plan_id = new.id); "
+    f"{PAYMENT_FTS_INSERT}{PAYMENT_ROWS} WHERE s.plan_id = new.id; END",
+    f"{PAYMENT_FTS_INSERT}{PAYMENT_ROWS}",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS notifications_plan_payment_fts_au",
+    "DROP TRIGGER IF EXISTS notifications_user_payment_fts_au",
+    "DROP TRIGGER IF EXISTS notifications_subscription_payment_fts_au",
+    "DROP TRIGGER IF EXISTS notifications_payment_fts_au",
+    "DROP TRIGGER IF EXISTS notifications_payment_fts_ad",
+    "DROP TRIGGER IF EXISTS notifications_payment_fts_ai",
+    "DROP TABLE IF EXISTS notifications_payment_fts",
+    "DROP TRIGGER IF EXISTS notifications_notification_fts_au",
+    "DROP TRIGGER IF EXISTS notifications_notification_fts_ad",
+    "DROP TRIGGER IF EXISTS notifications_notification_fts_ai",
+    "DROP TABLE IF EXISTS notifications_notification_fts",
+]
+
+# the tsvector expression must match search.NOTIFICATION_TSVECTOR; the trigram
+# ones match what Django's icontains emits: UPPER("col"::text) LIKE UPPER(%s)
+POSTGRES_FORWARD = [
+    "CREATE INDEX notif_search_idx ON notifications_notification USING gin "
+    "((to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(details, ''))))",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX payment_txn_trgm_idx ON notifications_payment USING gin "
+    "((upper(transaction_id::text)) gin_trgm_ops)",
+    "CREATE INDEX user_username_trgm_idx ON notifications_user USING gin "
+    "((upper(username::text)) gin_trgm_ops)",
+    "CREATE INDEX plan_name_trgm_idx ON notifications_plan USING gin "
+    "((upper(name::text)) gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS plan_name_trgm_idx",
+    "DROP INDEX IF EXISTS user_username_trgm_idx",
+    "DROP INDEX IF EXISTS payment_txn_trgm_idx",
+    "DROP INDEX IF EXISTS notif_search_idx",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql, params=None)
+
+
+def create_search_indexes(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+
+
+def drop_search_indexes(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0024_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
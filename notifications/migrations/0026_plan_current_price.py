@@ -0,0 +1,50 @@
+# Generated by Django 5.0.14 on 2026-10-17 12:15
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_current_price(apps, schema_editor):
+    # same rule as Plan.compute_price (historical models have no methods)
+    Plan = apps.get_model('notifications', 'Plan')
+    now = timezone.now()
+    plans = list(Plan.objects.only('id', 'price', 'discount_percent',
+                                   'discount_activated_date', 'discount_deactivated_date'))
+    for plan in plans:
+        live = bool(plan.discount_activated_date and plan.discount_deactivated_date and (
+            plan.discount_activated_date <= now <= plan.discount_deactivated_date
+        ))
+        plan.current_price = plan.price
+        if live:
+            discounted = plan.price - plan.price * (plan.discount_percent or 0) / 100
+            plan.current_price = discounted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        plan.discount_applied = live
+    Plan.objects.bulk_update(plans, ['current_price', 'discount_applied'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0025_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='current_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='discount_applied',
+            field=models.BooleanField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='discount_notified_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_current_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 13:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0026_plan_current_price'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customerprofile',
+            name='profile_location_idx',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-17 13:40
+
+from django.db import migrations
+from django.db.models.functions import Lower, Trim
+
+
+def lowercase_recipients(apps, schema_editor):
+    # models.normalize_recipient for existing rows; new rows are stored that way by save()
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.exclude(recipient=Lower(Trim('recipient'))).update(recipient=Lower(Trim('recipient')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0027_remove_profile_location_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_recipients, migrations.RunPython.noop),
+    ]
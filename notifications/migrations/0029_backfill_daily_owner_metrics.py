@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-17 14:05
+
+# 0012 created DailyOwnerMetrics empty, and the dashboard charts read only from
+# it, so fill the current year now rather than waiting for the nightly rebuild.
+
+from django.db import migrations
+
+
+def backfill_daily_metrics(apps, schema_editor):
+    # the rebuild works on the current models, which match the schema as of
+    # 0028; if Payment/Subscription/Plan change later, run `manage.py
+    # rebuild_metrics` instead of this step
+    from notifications.rollups import rebuild_daily_metrics
+
+    rebuild_daily_metrics()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0028_lowercase_notification_recipient'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_metrics, migrations.RunPython.noop),
+    ]
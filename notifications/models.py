@@ -1,4 +1,9 @@
+import hashlib
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.db import models
+from django.db.models import BooleanField, Case, DecimalField, F, Value, When
+from django.db.models.functions import Coalesce, Round
 from django.utils import timezone
 from datetime import timedelta, date
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
@@ -29,6 +34,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     username = models.CharField(max_length=150, unique=True)
     email = models.EmailField(unique=True)
     mobile_number = models.CharField(max_length=15, unique=True, null=True, blank=True)
+    # ordered delivery channels, e.g. ["msg91", "email"]; empty = NOTIFICATION_DEFAULT_CHANNELS
+    notification_channels = models.JSONField(default=list, blank=True)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='customer')
 
     is_active = models.BooleanField(default=True)
@@ -76,9 +83,117 @@ class AdminProfile(models.Model):
 
     def __str__(self):
         return f"AdminProfile: {self.user.username}"
+# ----------------------------
+# Notification templates (compiled and rendered by notifications/templating.py)
+# ----------------------------
+class NotificationTemplate(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    # Django template syntax, e.g. "Hi {{ username }}, your {{ plan }} renews soon"
+    subject = models.CharField(max_length=255)
+    body_text = models.TextField()
+    body_html = models.TextField(blank=True)
+    css = models.TextField(blank=True)  # inlined into body_html once, at compile time
+    # context keys the template uses; only these are stored per notification
+    variables = models.JSONField(default=list, blank=True)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL,
+                                   related_name='notification_templates')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from django.template import TemplateSyntaxError
+        from .templating import compile_source
+
+        try:
+            compile_source(self)
+        except TemplateSyntaxError as e:
+            raise ValidationError(f"Template error: {e}")
+
+
+# ----------------------------
+# Broadcast (one admin message fanned out to every customer)
+# ----------------------------
+class Broadcast(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    title = models.CharField(max_length=255)
+    type = models.CharField(max_length=50)
+    details = models.TextField()
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL,
+                                   related_name='broadcasts')
+    # optional personalised template; `context` holds values shared by every recipient
+    template = models.ForeignKey(NotificationTemplate, null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name='broadcasts')
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+
+    # progress counters, updated with F() expressions by the worker tasks
+    total_recipients = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    dispatch_done = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Broadcast #{self.pk}: {self.title} ({self.status})"
+
+    @property
+    def progress(self):
+        """Percentage of created recipient rows that have been attempted."""
+        if not self.created_count:
+            return 100.0 if self.status == 'completed' else 0.0
+        return round((self.sent_count + self.failed_count) / self.created_count * 100, 2)
+
+
 # ----------------------------
 # Notification
 # ----------------------------
+def notification_content_hash(title, details, type):
+    """sha256 of the message content; equal hashes mean the same message."""
+    content = '\x1f'.join((title or '', details or '', type or ''))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def normalize_recipient(email):
+    """Recipients are stored lower case, so lookups can use exact (indexed) matches."""
+    return (email or '').strip().lower()
+
+
+class NotificationQuerySet(models.QuerySet):
+    def with_content(self, title, details, type):
+        """Notifications carrying exactly this title/details/type (indexed hash lookup)."""
+        return self.filter(content_hash=notification_content_hash(title, details, type))
+
+    def users_with_content(self, title, details, type, user_ids):
+        """Ids among `user_ids` that already have this message, in one IN query."""
+        return set(
+            self.with_content(title, details, type)
+            .filter(recipient_user_id__in=list(user_ids))
+            .values_list('recipient_user_id', flat=True)
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # save() is skipped by bulk_create, so fill the hash and recipient here
+        objs = list(objs)
+        for obj in objs:
+            obj.content_hash = obj.compute_content_hash()
+            obj.recipient = normalize_recipient(obj.recipient)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Notification(models.Model):
     TYPE_CHOICES = [
         ('Payment', 'Payment'),
@@ -92,7 +207,7 @@ class Notification(models.Model):
     date_sent = models.DateTimeField(default=timezone.now)
     is_read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
-    status = models.CharField(max_length=20, default='pending')
+    status = models.CharField(max_length=20, default='pending')  # pending | sending | sent | retry | dead
     provider = models.CharField(max_length=50, blank=True)
     provider_message_id = models.CharField(max_length=255, blank=True, null=True)
     meta = models.JSONField(default=dict, blank=True)
@@ -100,12 +215,46 @@ class Notification(models.Model):
     last_attempt_at = models.DateTimeField(null=True, blank=True)   # newly added
     sent_at = models.DateTimeField(null=True, blank=True)
     recipient_user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    broadcast = models.ForeignKey(Broadcast, null=True, blank=True, on_delete=models.SET_NULL,
+                                  related_name='notifications')
+    # rendered per recipient from `context` (declared template variables only) when set
+    template = models.ForeignKey(NotificationTemplate, null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name='notifications')
+    context = models.JSONField(default=dict, blank=True)
+    # set while status == 'retry' (see notifications/retry.py)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    # set while status == 'sending' by the sender that claimed the row (see notifications/outbox.py)
+    claim_token = models.CharField(max_length=32, null=True, blank=True, db_index=True, editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # notification_content_hash(title, details, type), kept by save() and bulk_create,
+    # which also store `recipient` through normalize_recipient
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    objects = NotificationQuerySet.as_manager()
 
-
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_hash', 'recipient_user'], name='notif_hash_user_idx'),
+            models.Index(fields=['content_hash', 'recipient'], name='notif_hash_recipient_idx'),
+            models.Index(fields=['status', 'next_attempt_at'], name='notif_retry_due_idx'),
+            # keyset pagination of the notification lists (notifications/pagination.py)
+            models.Index(fields=['date_sent', 'id'], name='notif_date_sent_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def compute_content_hash(self):
+        return notification_content_hash(self.title, self.details, self.type)
+
+    def save(self, *args, **kwargs):
+        self.content_hash = self.compute_content_hash()
+        self.recipient = normalize_recipient(self.recipient)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'title', 'details', 'type'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'content_hash'}
+        super().save(*args, **kwargs)
+
 # ----------------------------
 # Alert
 # ----------------------------
@@ -143,6 +292,77 @@ class Category(models.Model):
         return self.name
 
 
+# ----------------------------
+# Plan price expressions (SQL equivalents of Plan.final_price)
+# ----------------------------
+PRICE_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+def plan_effective_price(prefix='', now=None):
+    """
+    Database expression for Plan.final_price: price minus discount_percent while
+    `now` lies inside the discount window. `prefix` is the lookup path to the
+    plan, e.g. 'plan__' from Subscription.
+    """
+    now = now or timezone.now()
+    price = F(f'{prefix}price')
+    return Case(
+        When(
+            **{f'{prefix}discount_activated_date__lte': now,
+               f'{prefix}discount_deactivated_date__gte': now},
+            # * 0.01 rather than / 100: SQLite stores whole prices as integers and would floor-divide
+            then=price - price * Coalesce(F(f'{prefix}discount_percent'), Value(0), output_field=PRICE_FIELD)
+            * Value(Decimal('0.01'), output_field=PRICE_FIELD),
+        ),
+        default=price,
+        output_field=PRICE_FIELD,
+    )
+
+
+def plan_discount_active(prefix='', now=None):
+    """Database expression: True while `now` lies inside the plan's discount window."""
+    now = now or timezone.now()
+    return Case(
+        When(
+            **{f'{prefix}discount_activated_date__lte': now,
+               f'{prefix}discount_deactivated_date__gte': now},
+            then=Value(True),
+        ),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+# 1/12 to full precision: a two-place PRICE_FIELD value would round it to 0.08
+MONTHLY_FACTOR = Value(Decimal(1) / 12, output_field=DecimalField(max_digits=30, decimal_places=28))
+
+
+def plan_monthly_price(prefix='', now=None):
+    """plan_effective_price normalised to a monthly amount (yearly plans / 12)."""
+    effective = plan_effective_price(prefix, now)
+    return Case(
+        # * 1/12 rather than / 12, for the same SQLite integer division as above
+        When(**{f'{prefix}duration': 'yearly'}, then=effective * MONTHLY_FACTOR),
+        default=effective,
+        output_field=PRICE_FIELD,
+    )
+
+
+class PlanQuerySet(models.QuerySet):
+    def with_effective_price(self, now=None):
+        """
+        Annotate effective_price and discount_active, evaluated in SQL at one
+        `now`, so plans can be sorted, filtered and aggregated by final price
+        in the database.
+        """
+        now = now or timezone.now()
+        return self.annotate(
+            # rounded to cents in SQL so keyset cursors compare against the shown value
+            effective_price=Round(plan_effective_price(now=now), 2),
+            discount_active=plan_discount_active(now=now),
+        )
+
+
 # ----------------------------
 # Plan (Updated with Category)
 # ----------------------------
@@ -162,34 +382,91 @@ class Plan(models.Model):
     created_date = models.DateTimeField(auto_now_add=True)
     modified_date = models.DateTimeField(auto_now=True)
 
+    # effective price and discount state, stored by save() and flipped at the
+    # discount window's boundaries by notifications/discounts.py
+    current_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                        editable=False, db_index=True)
+    discount_applied = models.BooleanField(null=True, editable=False)
+    # when the current discount window was announced to customers
+    discount_notified_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = PlanQuerySet.as_manager()
+
+    # fields that feed current_price / discount_applied
+    PRICE_FIELDS = {'price', 'discount_percent', 'discount_activated_date', 'discount_deactivated_date'}
+
     def __str__(self):
         return f"{self.name} ({self.category.name})"
 
+    def discount_live(self, now=None):
+        now = now or timezone.now()
+        return bool(self.discount_activated_date and self.discount_deactivated_date and (
+            self.discount_activated_date <= now <= self.discount_deactivated_date
+        ))
+
+    def compute_price(self, now=None):
+        """(effective price, discount applied) at `now`, rounded like the SQL expression."""
+        if self.discount_live(now):
+            discounted = self.price - (self.price * (self.discount_percent or 0) / 100)
+            return discounted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP), True
+        return self.price, False
+
+    def save(self, *args, **kwargs):
+        if self.price is not None:
+            self.current_price, self.discount_applied = self.compute_price()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and self.PRICE_FIELDS & set(update_fields):
+                kwargs['update_fields'] = set(update_fields) | {'current_price', 'discount_applied'}
+        super().save(*args, **kwargs)
+
     @property
     def final_price(self):
-        now = timezone.now()
-        if self.discount_activated_date and self.discount_deactivated_date and (
-            self.discount_activated_date <= now <= self.discount_deactivated_date
-        ):
-            return self.price - (self.price * (self.discount_percent or 0) / 100)
-        return self.price
+        # rows from with_effective_price() carry the value computed by the query
+        if 'effective_price' in self.__dict__:
+            return self.effective_price.quantize(Decimal('0.01'))
+        if self.current_price is not None:
+            return self.current_price
+        if self.price is None:
+            return None
+        return self.compute_price()[0]
 
     @property
     def discount_status(self):
-        now = timezone.now()
         if self.status == 'expired':
             return 'expired'
         if self.discount_activated_date and self.discount_deactivated_date:
-            if self.discount_activated_date <= now <= self.discount_deactivated_date:
-                return 'active'
-            return 'expired'
+            active = self.__dict__.get('discount_active')  # set by with_effective_price()
+            if active is None:
+                active = self.discount_applied
+            if active is None:
+                active = self.discount_live()
+            return 'active' if active else 'expired'
         return 'NIL'
+# ----------------------------
+# Tenant scoping
+# ----------------------------
+class TenantQuerySet(models.QuerySet):
+    def for_owner(self, owner):
+        """Rows belonging to plans created by `owner` (admin User or id)."""
+        return self.filter(owner=owner)
+
+
+def owner_for_plan(plan_id):
+    """Admin that owns `plan_id` (its Category.created_by), or None."""
+    if not plan_id:
+        return None
+    return Plan.objects.filter(pk=plan_id).values_list('category__created_by', flat=True).first()
+
+
 # ----------------------------
 # Subscription
 # ----------------------------
 class Subscription(models.Model):
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subscriptions')
     plan = models.ForeignKey(Plan, on_delete=models.PROTECT)
+    # denormalized plan.category.created_by, kept in sync by save() and signals
+    owner = models.ForeignKey(User, null=True, blank=True, editable=False,
+                              on_delete=models.SET_NULL, related_name='owned_subscriptions')
 
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
@@ -199,10 +476,17 @@ class Subscription(models.Model):
     is_active = models.BooleanField(default=False)
     subscription_status = models.CharField(max_length=10, default='Pending')
 
+    objects = TenantQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.customer.email} - {self.plan.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_plan_id = instance.__dict__.get('plan_id')
+        return instance
+
     def save(self, *args, **kwargs):
         # Only auto-set end_date if start_date exists
         if self.start_date and not self.end_date:
@@ -211,8 +495,22 @@ class Subscription(models.Model):
             elif self.plan.duration == 'yearly':
                 self.end_date = self.start_date + timedelta(days=365)
 
+        update_fields = kwargs.get('update_fields')
+        plan_changed = self.plan_id != getattr(self, '_loaded_plan_id', None)
+        if plan_changed and update_fields is not None:
+            # only a save that writes the plan moves the subscription to its owner
+            plan_changed = bool({'plan', 'plan_id', 'owner', 'owner_id'} & set(update_fields))
+            if plan_changed:
+                kwargs['update_fields'] = {*update_fields, 'owner'}
+        if plan_changed:
+            self.owner_id = owner_for_plan(self.plan_id)
+
         super().save(*args, **kwargs)
 
+        if plan_changed and self.pk:
+            self._loaded_plan_id = self.plan_id
+            self.payments.exclude(owner_id=self.owner_id).update(owner_id=self.owner_id)
+
 
     def next_due_date(self):
      """Calculate next renewal date"""
@@ -235,6 +533,11 @@ class Subscription(models.Model):
 
     class Meta:
         ordering = ['-start_date']
+        indexes = [
+            models.Index(fields=['owner', 'subscription_status']),
+            models.Index(fields=['owner', 'start_date']),
+            models.Index(fields=['is_active', 'end_date']),
+        ]
 
 
 
@@ -261,6 +564,16 @@ class Payment(models.Model):
         related_name='payments'
     )
 
+    # denormalized subscription.owner (tenant scoping without joins)
+    owner = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='owned_payments'
+    )
+
     transaction_id = models.CharField(
         max_length=100,
         unique=True
@@ -308,8 +621,121 @@ class Payment(models.Model):
         null=True
     )
 
+    objects = TenantQuerySet.as_manager()
+
     class Meta:
         ordering = ['-payment_date']
+        indexes = [
+            # tenant-scoped listing by date, keyset-paginated on (payment_date, id)
+            models.Index(fields=['owner', 'payment_date', 'id'], name='payment_owner_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.subscription.customer.email} - ₹{self.amount}"
+
+    def save(self, *args, **kwargs):
+        if self.owner_id is None and self.subscription_id:
+            self.owner_id = self.subscription.owner_id
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'owner'}
+        super().save(*args, **kwargs)
+
+
+# ----------------------------
+# Daily rollups (dashboard charts)
+# ----------------------------
+class DailyOwnerMetrics(models.Model):
+    """
+    One row per (owner, date, plan). Maintained incrementally from Payment /
+    Subscription writes (see notifications/rollups.py) and rebuilt nightly.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_metrics')
+    date = models.DateField()
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='daily_metrics')
+
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payments_count = models.PositiveIntegerField(default=0)
+    new_subscriptions = models.PositiveIntegerField(default=0)
+    expirations = models.PositiveIntegerField(default=0)
+    active_count = models.PositiveIntegerField(default=0)
+
+    # payment-method counts (mirror Payment.PAYMENT_METHOD_CHOICES)
+    upi_payments = models.PositiveIntegerField(default=0)
+    netbanking_payments = models.PositiveIntegerField(default=0)
+    card_payments = models.PositiveIntegerField(default=0)
+    wallet_payments = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'date', 'plan'], name='uniq_daily_owner_metrics'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'date']),
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} {self.date} plan={self.plan_id}"
+
+
+# ----------------------------
+# Reminder ledger (idempotency for notifications/reminders.py)
+# ----------------------------
+class ReminderLedger(models.Model):
+    """
+    One row per reminder ever issued. The unique constraint on
+    (subscription, kind, offset_days, period) is what makes reruns, catch-up
+    runs and parallel workers safe: a reminder is only created by the run
+    whose ledger insert won.
+    """
+    KIND_CHOICES = [
+        ('notification', 'Notification'),
+        ('alert', 'Alert'),
+    ]
+    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name='reminders')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='notification')
+    offset_days = models.PositiveSmallIntegerField()
+    period = models.DateField()  # the end_date the reminder refers to
+    run_id = models.CharField(max_length=32, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subscription', 'kind', 'offset_days', 'period'], name='uniq_reminder_ledger'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} sub={self.subscription_id} -{self.offset_days}d ({self.period})"
+
+
+# ----------------------------
+# Job leases (singleton scheduled tasks, see notifications/locks.py)
+# ----------------------------
+class JobLease(models.Model):
+    name = models.CharField(max_length=200, unique=True)  # "<job>:<period>"
+    holder = models.CharField(max_length=64)
+    acquired_at = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.holder})"
+
+
+# ----------------------------
+# Provider rate limits (shared token buckets, see notifications/ratelimit.py)
+# ----------------------------
+class RateLimitBucket(models.Model):
+    name = models.CharField(max_length=50, unique=True)  # provider key, e.g. "smtp"
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField(default=timezone.now)
+    version = models.PositiveBigIntegerField(default=0)  # compare-and-swap guard
+
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.1f} tokens"
@@ -0,0 +1,121 @@
+# notifications/outbox.py
+"""
+Transactional outbox for notifications.
+
+The Notification table is the outbox: a row committed with status 'pending'
+(or 'retry' once its next_attempt_at has passed) is due for delivery. Every
+sender -- the dispatch_outbox command and the Celery send_notification_batch
+task alike -- claims rows before sending them: the claim flips them to
+'sending' with a per-claim token in one conditional UPDATE, so two senders
+can never both get a row. Where the database supports it the candidates are
+picked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent dispatchers
+take disjoint batches instead of contending for the same ones.
+
+A sender that dies mid-batch leaves rows in 'sending'; release_stale_claims()
+puts them back to 'pending' after OUTBOX_CLAIM_TIMEOUT_SECONDS.
+
+With NOTIFICATION_DELIVERY = 'outbox' views and tasks only write rows and the
+dispatcher does all the sending; with 'celery' (default) the rows are sent by
+send_notification_batch / send_email_task as before.
+"""
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Broadcast, Notification
+from .utils import send_notifications
+
+
+def enabled():
+    """True when the dispatch_outbox command, not Celery, delivers notifications."""
+    return getattr(settings, 'NOTIFICATION_DELIVERY', 'celery') == 'outbox'
+
+
+def _claimable(now, ids=None):
+    if ids is not None:
+        # explicitly requested rows (e.g. by the retry sweeper) are due by definition
+        return Q(pk__in=ids, status__in=['pending', 'retry'])
+    return Q(status='pending') | Q(status='retry', next_attempt_at__lte=now)
+
+
+def claim(limit, ids=None):
+    """
+    Claim up to `limit` due notifications (only among `ids` if given) for this
+    sender and return them, recipient_user and template loaded, ordered by pk.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    candidates = Notification.objects.filter(_claimable(now, ids)).order_by('pk')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        picked = list(candidates.values_list('pk', flat=True)[:limit])
+        if not picked:
+            return []
+        # re-check claimability: without SKIP LOCKED another sender may have won some rows
+        Notification.objects.filter(_claimable(now, ids), pk__in=picked).update(
+            status='sending', claim_token=token, claimed_at=now
+        )
+
+    return list(
+        Notification.objects.filter(claim_token=token, status='sending')
+        .select_related('recipient_user').prefetch_related('template').order_by('pk')
+    )
+
+
+def release_stale_claims(timeout=None):
+    """Return rows stuck in 'sending' (their sender died) to 'pending'."""
+    timeout = timeout or getattr(settings, 'OUTBOX_CLAIM_TIMEOUT_SECONDS', 600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Notification.objects.filter(status='sending', claimed_at__lt=cutoff).update(
+        status='pending', claim_token=None, claimed_at=None
+    )
+
+
+def requeue(notification_ids):
+    """Put notifications back in the outbox for (re)delivery by the dispatcher."""
+    return Notification.objects.filter(pk__in=list(notification_ids)).exclude(status='sending').update(
+        status='pending', next_attempt_at=None
+    )
+
+
+# ----------------------------
+# Delivery
+# ----------------------------
+def finish_broadcast_if_done(broadcast_id):
+    """Mark the broadcast completed once every created row has been attempted."""
+    Broadcast.objects.filter(
+        pk=broadcast_id,
+        status='running',
+        dispatch_done=True,
+        created_count__lte=F('sent_count') + F('failed_count'),
+    ).update(status='completed', finished_at=timezone.now())
+
+
+def _record_broadcast_results(notifications, results):
+    # broadcast progress counts first attempts only, so retries don't double count
+    counts = defaultdict(lambda: [0, 0])
+    for notification, result in zip(notifications, results):
+        if notification.broadcast_id and notification.attempts == 1:
+            counts[notification.broadcast_id][0 if result.get('success') else 1] += 1
+    for broadcast_id, (sent, failed) in counts.items():
+        Broadcast.objects.filter(pk=broadcast_id).update(
+            sent_count=F('sent_count') + sent,
+            failed_count=F('failed_count') + failed,
+        )
+        finish_broadcast_if_done(broadcast_id)
+
+
+def deliver(notifications):
+    """Send claimed notifications in one batch, store results in bulk, update broadcasts."""
+    results = send_notifications(notifications)
+    _record_broadcast_results(notifications, results)
+    return results
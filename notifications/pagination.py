@@ -0,0 +1,139 @@
+# notifications/pagination.py
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET n, each page asks for the rows strictly after (or before)
+the last row shown, by the page's ordering:
+
+    WHERE (date_sent, id) < (:last_date_sent, :last_id) ORDER BY date_sent DESC, id DESC LIMIT 26
+
+so page 500 costs the same index range scan as page 1, and no COUNT(*) is
+run: one extra row is fetched to know whether there is a next page. The
+ordering must end in a unique field (normally id) so every row has a
+distinct position. Cursors are opaque URL-safe strings carried in ?cursor=.
+"""
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder drops microseconds past milliseconds; cursors must be exact
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _encode(direction, values):
+    raw = json.dumps([direction, values], cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _field(queryset, name):
+    # ordering keys may be annotations, e.g. Plan.objects.with_effective_price()'s effective_price
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+def _decode(cursor, queryset, fields):
+    """(direction, values) from a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+        if direction not in ('next', 'prev') or len(values) != len(fields):
+            return None
+        return direction, [
+            _field(queryset, name).to_python(value)
+            for name, value in zip(fields, values)
+        ]
+    except Exception:
+        return None
+
+
+def _split(ordering):
+    return [(o.lstrip('-'), o.startswith('-')) for o in ordering]
+
+
+def _after(keys, values, reverse=False):
+    """Q for rows positioned after `values` in `keys` order (before it when reverse)."""
+    condition = Q()
+    equal = Q()
+    for (name, descending), value in zip(keys, values):
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    # redundant bound on the leading key gives the planner an index range to start from
+    name, descending = keys[0]
+    return Q(**{f"{name}__{'lte' if descending != reverse else 'gte'}": values[0]}) & condition
+
+
+class KeysetPage:
+    """One page of rows plus links to its neighbours; iterable like a Paginator page."""
+
+    def __init__(self, rows, keys, has_next, has_previous, query):
+        self.object_list = rows
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._keys = keys
+        self._query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def _cursor(self, direction, row):
+        return _encode(direction, [getattr(row, name) for name, _ in self._keys])
+
+    def _url(self, cursor):
+        query = self._query.copy()
+        query['cursor'] = cursor
+        return '?' + query.urlencode()
+
+    @property
+    def next_url(self):
+        return self._url(self._cursor('next', self.object_list[-1])) if self.has_next else None
+
+    @property
+    def previous_url(self):
+        return self._url(self._cursor('prev', self.object_list[0])) if self.has_previous else None
+
+
+def keyset_paginate(queryset, request, ordering, per_page=25):
+    """
+    Page `queryset` by `ordering` (e.g. ('-date_sent', '-id')) using the
+    request's ?cursor=. Other GET parameters (filters, sort_by) are kept in the
+    page links. An unreadable cursor falls back to the first page.
+    """
+    keys = _split(ordering)
+    fields = [name for name, _ in keys]
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    query.pop('page', None)
+
+    cursor = request.GET.get('cursor')
+    decoded = _decode(cursor, queryset, fields) if cursor else None
+    if decoded is None:
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        return KeysetPage(rows[:per_page], keys, len(rows) > per_page, False, query)
+
+    direction, values = decoded
+    if direction == 'next':
+        rows = list(queryset.filter(_after(keys, values)).order_by(*ordering)[:per_page + 1])
+        return KeysetPage(rows[:per_page], keys, len(rows) > per_page, True, query)
+
+    reversed_ordering = [o[1:] if o.startswith('-') else f'-{o}' for o in ordering]
+    rows = list(queryset.filter(_after(keys, values, reverse=True)).order_by(*reversed_ordering)[:per_page + 1])
+    has_previous = len(rows) > per_page
+    rows = rows[:per_page][::-1]
+    return KeysetPage(rows, keys, True, has_previous, query)
@@ -1,35 +1,124 @@
 # notifications/providers_email.py
-from django.core.mail import EmailMessage
+import smtplib
+import socket
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
 from django.template.loader import render_to_string
 
+# connection-level failures: reconnect and retry the message once
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout)
+
+
+def smtp_error_code(exc):
+    """SMTP reply code carried by `exc`, if any (first refused recipient for multi-recipient errors)."""
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code
+    if isinstance(exc, smtplib.SMTPRecipientsRefused) and exc.recipients:
+        code, _ = next(iter(exc.recipients.values()))
+        return code
+    return None
+
+
+def classify_error(exc):
+    """
+    'transient' for failures worth retrying (4xx replies, dropped connections,
+    timeouts), 'permanent' for the rest (5xx replies, bad templates, ...).
+    """
+    code = smtp_error_code(exc)
+    if code is not None:
+        return 'transient' if 400 <= code < 500 else 'permanent'
+    if isinstance(exc, RECONNECT_ERRORS + (OSError,)):
+        return 'transient'
+    return 'permanent'
+
+
+def failure_result(exc):
+    return {"success": False, "error": str(exc), "error_class": classify_error(exc),
+            "code": smtp_error_code(exc)}
+
+
+def build_email(to_email, subject, template_name=None, context=None, body_text=None, from_email=None,
+                html_body=None):
+    """
+    Build (but do not send) an email for the configured Django EMAIL backend.
+    The HTML part is `html_body` if given (pre-rendered), else `template_name` rendered with `context`.
+    """
+    from_email = from_email or getattr(settings, "DEFAULT_FROM_EMAIL", settings.EMAIL_HOST_USER)
+    plain_body = body_text or ''
+
+    if template_name and not html_body:
+        html_body = render_to_string(template_name, context or {})
+
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_body or html_body or '',
+        from_email=from_email,
+        to=[to_email],
+    )
+    if html_body:
+        msg.attach_alternative(html_body, "text/html")
+    return msg
+
+
+def send_email_batch(messages, connection=None):
+    """
+    Send many EmailMessages over one SMTP connection (one TLS handshake and
+    login for the whole batch). A dropped connection is reopened and the
+    message retried once. Returns one {"success": bool, "error": str,
+    "error_class": "transient"|"permanent", "code": int|None} per message,
+    in order.
+    """
+    results = []
+    if not messages:
+        return results
+
+    conn = connection or get_connection(fail_silently=False)
+    try:
+        conn.open()
+    except Exception as e:
+        return [failure_result(e) for _ in messages]
+
+    try:
+        for msg in messages:
+            for attempt in (1, 2):
+                try:
+                    sent = conn.send_messages([msg])
+                    if sent:
+                        results.append({"success": True})
+                    else:
+                        results.append({"success": False, "error": "not sent",
+                                        "error_class": "transient", "code": None})
+                    break
+                except RECONNECT_ERRORS as e:
+                    if attempt == 2:
+                        results.append(failure_result(e))
+                        break
+                    try:
+                        conn.close()
+                        conn.open()
+                    except Exception as reopen_error:
+                        results.append(failure_result(reopen_error))
+                        break
+                except Exception as e:
+                    results.append(failure_result(e))
+                    break
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    return results
+
+
 def send_email(to_email, subject, template_name=None, context=None, body_text=None, from_email=None):
     """
     Send a single email via the configured Django EMAIL backend.
     Returns {"success": True} or {"success": False, "error": "..."}
     """
     try:
-        from_email = from_email or getattr(settings, "DEFAULT_FROM_EMAIL", settings.EMAIL_HOST_USER)
-        html_body = None
-        plain_body = ''
-
-        if template_name:
-            html_body = render_to_string(template_name, context or {})
-            plain_body = body_text or ''
-        else:
-            plain_body = body_text or ''
-
-        msg = EmailMessage(
-            subject=subject,
-            body=plain_body or html_body or '',
-            from_email=from_email,
-            to=[to_email],
-        )
-
-        if html_body:
-            msg.attach_alternative(html_body, "text/html")
-
-        msg.send(fail_silently=False)
-        return {"success": True}
+        msg = build_email(to_email, subject, template_name=template_name, context=context,
+                          body_text=body_text, from_email=from_email)
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        return failure_result(e)
+    return send_email_batch([msg])[0]
@@ -0,0 +1,154 @@
+# notifications/ratelimit.py
+"""
+Shared token-bucket rate limits for outbound providers.
+
+Each provider in PROVIDER_RATE_LIMITS ('smtp', 'msg91', 'twilio') has a bucket
+of `burst` tokens refilled at `rate` tokens per second. Every worker draws from
+the same bucket -- a RateLimitBucket row by default, or a Redis hash when
+RATE_LIMIT_BACKEND = 'redis' -- so the combined send rate of all workers stays
+at the provider quota.
+
+acquire() never sleeps: it grants as many tokens as are available right now
+and reports how long until the rest would be. Callers send what was granted
+and reschedule the remainder with that countdown.
+"""
+import math
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .models import RateLimitBucket
+
+# optimistic-update attempts before giving up on a contended DB bucket
+CAS_RETRIES = 5
+
+
+def _wait(wanted, tokens, rate, burst):
+    """Seconds until `wanted` more tokens (capped at burst) are available."""
+    if wanted <= 0:
+        return 0.0
+    return max(min(wanted, burst) - tokens, 0) / rate
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+class DatabaseTokenBucket:
+    """Bucket state in a RateLimitBucket row, updated with compare-and-swap on `version`."""
+
+    def __init__(self, name, rate, burst):
+        self.name, self.rate, self.burst = name, rate, burst
+
+    def acquire(self, n=1):
+        for _ in range(CAS_RETRIES):
+            now = timezone.now()
+            bucket, _ = RateLimitBucket.objects.get_or_create(
+                name=self.name, defaults={'tokens': self.burst, 'updated_at': now}
+            )
+            elapsed = max((now - bucket.updated_at).total_seconds(), 0)
+            tokens = min(self.burst, bucket.tokens + elapsed * self.rate)
+            granted = min(n, int(tokens))
+            tokens -= granted
+
+            updated = RateLimitBucket.objects.filter(pk=bucket.pk, version=bucket.version).update(
+                tokens=tokens, updated_at=now, version=bucket.version + 1
+            )
+            if updated:
+                return granted, _wait(n - granted, tokens, self.rate, self.burst)
+        # lost every race: someone else is draining the bucket, back off one token's worth
+        return 0, 1 / self.rate
+
+
+# Refill and take atomically on the Redis server, using its clock so that
+# workers with skewed clocks still agree.
+REDIS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local n = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(n, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return {granted, tostring(tokens)}
+"""
+
+_redis_scripts = {}
+
+
+def _redis_script():
+    url = getattr(settings, 'RATE_LIMIT_REDIS_URL', None)
+    if not url:
+        raise ImproperlyConfigured("RATE_LIMIT_BACKEND='redis' needs RATE_LIMIT_REDIS_URL (or CACHE_URL).")
+    if url not in _redis_scripts:
+        try:
+            import redis
+        except ImportError as e:
+            raise ImproperlyConfigured("RATE_LIMIT_BACKEND='redis' needs the redis package.") from e
+        _redis_scripts[url] = redis.Redis.from_url(url).register_script(REDIS_SCRIPT)
+    return _redis_scripts[url]
+
+
+class RedisTokenBucket:
+    """Bucket state in a Redis hash, refilled and taken in one Lua call."""
+
+    def __init__(self, name, rate, burst):
+        self.name, self.rate, self.burst = name, rate, burst
+
+    def acquire(self, n=1):
+        granted, tokens = _redis_script()(
+            keys=[f"subhub:ratelimit:{self.name}"], args=[self.rate, self.burst, n]
+        )
+        granted, tokens = int(granted), float(tokens)
+        return granted, _wait(n - granted, tokens, self.rate, self.burst)
+
+
+BACKENDS = {
+    'db': DatabaseTokenBucket,
+    'redis': RedisTokenBucket,
+}
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+def provider_limit(provider):
+    """(rate, burst) for `provider`, or None when it is not rate limited."""
+    conf = getattr(settings, 'PROVIDER_RATE_LIMITS', {}).get(provider) or {}
+    rate = float(conf.get('rate') or 0)
+    if rate <= 0:
+        return None
+    burst = max(int(conf.get('burst') or math.ceil(rate)), 1)
+    return rate, burst
+
+
+def get_bucket(provider):
+    limit = provider_limit(provider)
+    if limit is None:
+        return None
+    backend = getattr(settings, 'RATE_LIMIT_BACKEND', 'db')
+    try:
+        bucket_class = BACKENDS[backend]
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown RATE_LIMIT_BACKEND {backend!r}")
+    return bucket_class(provider, *limit)
+
+
+def acquire(provider, n=1):
+    """
+    Take up to `n` send tokens for `provider`.
+    Returns (granted, retry_after): send `granted` items now and reschedule
+    the other n - granted after `retry_after` seconds.
+    """
+    if n <= 0:
+        return 0, 0.0
+    bucket = get_bucket(provider)
+    if bucket is None:
+        return n, 0.0
+    return bucket.acquire(n)
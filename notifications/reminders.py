@@ -0,0 +1,140 @@
+# notifications/reminders.py
+"""
+Subscription expiry reminder engine.
+
+Offsets (days before end_date) come from SUBSCRIPTION_REMINDER_OFFSETS, e.g.
+14/7/3/1/0. Each run issues at most one reminder per subscription: the tier
+the subscription is currently in, i.e. the smallest offset >= days left. A
+run that was missed is caught up by the next one (up to
+SUBSCRIPTION_REMINDER_CATCHUP_DAYS past end_date for the expiry notice), and
+the ReminderLedger unique constraint guarantees each (subscription, kind,
+offset, period) is issued exactly once.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Alert, Notification, ReminderLedger, Subscription
+
+DEFAULT_OFFSETS = (14, 7, 3, 1, 0)
+
+
+def reminder_offsets(offsets=None, setting='SUBSCRIPTION_REMINDER_OFFSETS'):
+    offsets = offsets if offsets is not None else getattr(settings, setting, DEFAULT_OFFSETS)
+    return sorted({int(o) for o in offsets})
+
+
+def due_offset(days_left, offsets):
+    """Smallest configured offset >= days_left (offsets sorted ascending), else None."""
+    for offset in offsets:
+        if offset >= days_left:
+            return offset
+    return None
+
+
+def reminder_text(days_left, username, plan_name):
+    if days_left <= 0:
+        return ("Your Subscription Has Ended",
+                f"Hi {username}, your subscription to {plan_name} has expired.")
+    when = "tomorrow" if days_left == 1 else f"in {days_left} days"
+    return ("Your Subscription Ends Soon",
+            f"Hi {username}, your subscription to {plan_name} will expire {when}.")
+
+
+def _build(kind, sub, today, now):
+    title, text = reminder_text((sub.end_date - today).days, sub.customer.username, sub.plan.name)
+    if kind == 'alert':
+        return Alert(category='Subscription', subject=title, message=text,
+                     email=sub.customer.email, date_sent=now)
+    return Notification(title=title, type='Subscription', details=text,
+                        recipient=sub.customer.email, recipient_user=sub.customer,
+                        status='pending', date_sent=now)
+
+
+def candidate_subscriptions(offsets, today, catchup_days, queryset=None):
+    """
+    Single range query over end_date covering every configured offset. Ended
+    subscriptions that expiry_job has already deactivated stay candidates for
+    the catch-up window, so their expiry notice doesn't depend on which job
+    ran first.
+    """
+    base = queryset if queryset is not None else Subscription.objects.all()
+    return (
+        base.filter(
+            Q(is_active=True) | Q(subscription_status='Inactive', end_date__lte=today),
+            end_date__gte=today - timedelta(days=catchup_days),
+            end_date__lte=today + timedelta(days=max(offsets)),
+        )
+        .select_related('customer', 'plan')
+        .only('id', 'end_date', 'customer__id', 'customer__email', 'customer__username', 'plan__name')
+        .order_by('pk')
+    )
+
+
+def _process_chunk(kind, chunk, offsets, today, now, run_id, on_created):
+    due = []
+    for sub in chunk:
+        offset = due_offset((sub.end_date - today).days, offsets)
+        if offset is not None:
+            due.append((sub, offset))
+    if not due:
+        return 0, 0
+
+    model = Alert if kind == 'alert' else Notification
+    with transaction.atomic():
+        ReminderLedger.objects.bulk_create(
+            [ReminderLedger(subscription=sub, kind=kind, offset_days=offset,
+                            period=sub.end_date, run_id=run_id) for sub, offset in due],
+            ignore_conflicts=True,
+        )
+        won = set(
+            ReminderLedger.objects.filter(run_id=run_id, subscription__in=[sub for sub, _ in due])
+            .values_list('subscription_id', 'offset_days')
+        )
+        objs = [_build(kind, sub, today, now) for sub, offset in due if (sub.pk, offset) in won]
+        created = model.objects.bulk_create(objs)
+
+    if on_created and created:
+        on_created(created)
+    return len(due), len(created)
+
+
+def run_reminders(kind='notification', offsets=None, today=None, chunk_size=None,
+                  catchup_days=None, queryset=None, on_created=None):
+    """
+    Issue due reminders of `kind` ('notification' or 'alert') in chunks.
+
+    `queryset` is the Subscription queryset to start from (e.g. an id shard); `on_created`
+    is called with each chunk's newly created rows (e.g. to send them).
+    Returns {"candidates", "due", "created", "run_id"}.
+    """
+    offsets = reminder_offsets(offsets)
+    today = today or timezone.localdate()
+    now = timezone.now()
+    chunk_size = chunk_size or settings.NOTIFICATION_BATCH_SIZE
+    if catchup_days is None:
+        catchup_days = getattr(settings, 'SUBSCRIPTION_REMINDER_CATCHUP_DAYS', 3)
+    run_id = uuid.uuid4().hex
+
+    subs = candidate_subscriptions(offsets, today, catchup_days, queryset)
+
+    stats = {"candidates": 0, "due": 0, "created": 0, "run_id": run_id}
+    chunk = []
+    for sub in subs.iterator(chunk_size=chunk_size):
+        chunk.append(sub)
+        if len(chunk) >= chunk_size:
+            due, created = _process_chunk(kind, chunk, offsets, today, now, run_id, on_created)
+            stats["candidates"] += len(chunk)
+            stats["due"] += due
+            stats["created"] += created
+            chunk = []
+    if chunk:
+        due, created = _process_chunk(kind, chunk, offsets, today, now, run_id, on_created)
+        stats["candidates"] += len(chunk)
+        stats["due"] += due
+        stats["created"] += created
+    return stats
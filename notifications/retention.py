@@ -0,0 +1,80 @@
+# notifications/retention.py
+"""
+Retention for Notification and Alert rows.
+
+Rows older than the cutoff are removed oldest-pk first in chunks. Each chunk
+is first written to its own gzip JSONL file under NOTIFICATION_ARCHIVE_DIR
+(written to a temp name and renamed into place), then deleted in a short
+transaction of its own. The table itself is the checkpoint: an interrupted
+run leaves at most one chunk archived but not yet deleted, and the next run
+selects exactly that chunk again and rewrites the same file before deleting.
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Alert, Notification
+
+# (model, date field) pairs pruned by prune_old_rows
+PRUNED_MODELS = (
+    (Notification, 'date_sent'),
+    (Alert, 'date_sent'),
+)
+
+
+def archive_dir():
+    return Path(getattr(settings, 'NOTIFICATION_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def _write_archive(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with gzip.open(tmp, 'wt', encoding='utf-8') as fh:
+        for row in rows:
+            fh.write(json.dumps(row, cls=DjangoJSONEncoder))
+            fh.write('\n')
+    os.replace(tmp, path)
+
+
+def prune_model(model, date_field, cutoff, chunk_size, archive=True):
+    """Archive and delete `model` rows with date_field < cutoff; returns rows deleted."""
+    label = model._meta.model_name
+    old = model.objects.filter(**{f'{date_field}__lt': cutoff})
+    if model is Notification:
+        # never pull a row out from under a sender that has claimed it
+        old = old.exclude(status='sending')
+
+    deleted = 0
+    while True:
+        rows = list(old.order_by('pk').values()[:chunk_size])
+        if not rows:
+            return deleted
+        pks = [row['id'] for row in rows]
+        if archive:
+            name = f"{label}-{pks[0]:010d}-{pks[-1]:010d}.jsonl.gz"
+            _write_archive(archive_dir() / label / cutoff.date().isoformat() / name, rows)
+        with transaction.atomic():
+            count, _ = model.objects.filter(pk__in=pks).delete()
+        deleted += count
+
+
+def prune_old_rows(retention_days=None, chunk_size=None, archive=True):
+    """Prune every model in PRUNED_MODELS; returns {"notification": n, "alert": n}."""
+    if retention_days is None:
+        retention_days = settings.NOTIFICATION_RETENTION_DAYS
+    chunk_size = chunk_size or getattr(settings, 'NOTIFICATION_PRUNE_CHUNK_SIZE', 1000)
+    # midnight boundary so a rerun on the same day uses the same cutoff (and archive folder)
+    midnight = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = midnight - timedelta(days=retention_days)
+
+    return {
+        model._meta.model_name: prune_model(model, field, cutoff, chunk_size, archive)
+        for model, field in PRUNED_MODELS
+    }
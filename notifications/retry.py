@@ -0,0 +1,62 @@
+# notifications/retry.py
+"""
+Retry scheduling for failed notification sends.
+
+A failed send is classified by providers_email.classify_error:
+  - transient (SMTP 4xx, dropped connection, timeout): status 'retry' with
+    next_attempt_at = now + exponential backoff with jitter
+  - permanent (SMTP 5xx, bad address, broken template): status 'dead'
+Once a row has used max_attempts of its policy it goes to 'dead' as well.
+tasks.retry_failed_notifications sweeps due 'retry' rows through the
+(status, next_attempt_at) index and hands them back to send_notification_batch.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+
+DEFAULT_POLICIES = {
+    'transient': {'max_attempts': 6, 'base_seconds': 60, 'max_seconds': 6 * 3600},
+    'permanent': {'max_attempts': 1},
+}
+
+# keep only the last few errors in meta["errors"]
+ERROR_HISTORY = 5
+
+
+def retry_policy(error_class):
+    policies = getattr(settings, 'NOTIFICATION_RETRY_POLICIES', DEFAULT_POLICIES)
+    return policies.get(error_class) or DEFAULT_POLICIES['permanent']
+
+
+def backoff_delay(attempt, policy):
+    """
+    Seconds to wait before retry number `attempt` (1-based): base * 2^(attempt-1),
+    capped at max_seconds, with "equal jitter" (random in the upper half) so rows
+    that failed together don't come back together.
+    """
+    delay = min(policy.get('max_seconds', 3600), policy.get('base_seconds', 60) * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def apply_failure(notification, result, now):
+    """
+    Record a failed attempt on `notification` (attempts already incremented)
+    and decide between another try and the dead-letter state.
+    """
+    error_class = result.get('error_class') or 'permanent'
+    policy = retry_policy(error_class)
+
+    meta = dict(notification.meta or {})
+    errors = list(meta.get('errors', []))
+    errors.append({'at': now.isoformat(), 'error': result.get('error'), 'class': error_class,
+                   'code': result.get('code')})
+    meta.update(error=result.get('error'), error_class=error_class, errors=errors[-ERROR_HISTORY:])
+    notification.meta = meta
+
+    if notification.attempts < policy.get('max_attempts', 1):
+        notification.status = 'retry'
+        notification.next_attempt_at = now + timedelta(seconds=backoff_delay(notification.attempts, policy))
+    else:
+        notification.status = 'dead'
+        notification.next_attempt_at = None
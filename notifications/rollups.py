@@ -0,0 +1,144 @@
+# notifications/rollups.py
+"""
+Maintenance of the DailyOwnerMetrics rollup table.
+
+- refresh_daily_metrics(): recompute a handful of (plan, day) buckets from source
+  rows; called from Payment / Subscription signals.
+- rebuild_daily_metrics(): recompute a whole date window with grouped queries;
+  run nightly by the `rebuild_daily_owner_metrics` Celery task.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyOwnerMetrics, Payment, Plan, Subscription
+
+# Payment.payment_method value -> DailyOwnerMetrics counter field
+METHOD_FIELDS = {
+    'UPI': 'upi_payments',
+    'Netbanking': 'netbanking_payments',
+    'Card': 'card_payments',
+    'Wallet': 'wallet_payments',
+}
+
+
+def _payment_aggregates():
+    aggs = {'revenue': Sum('amount'), 'payments_count': Count('id')}
+    for method, field in METHOD_FIELDS.items():
+        aggs[field] = Count('id', filter=Q(payment_method=method))
+    return aggs
+
+
+def _plan_owners(plan_ids=None):
+    qs = Plan.objects.all()
+    if plan_ids is not None:
+        qs = qs.filter(pk__in=plan_ids)
+    return dict(qs.values_list('id', 'category__created_by'))
+
+
+# ----------------------------
+# Incremental refresh
+# ----------------------------
+def refresh_daily_metrics(plan_id, days):
+    """
+    Recompute the rollup rows for `plan_id` on each date in `days` from the
+    Payment / Subscription tables. Each bucket costs two small aggregates.
+    """
+    owner_id = _plan_owners([plan_id]).get(plan_id)
+    if owner_id is None:
+        return
+
+    for day in {d for d in days if d}:
+        pay = Payment.objects.filter(
+            subscription__plan_id=plan_id, payment_date__date=day
+        ).aggregate(**_payment_aggregates())
+
+        subs = Subscription.objects.filter(plan_id=plan_id).aggregate(
+            new_subscriptions=Count('id', filter=Q(start_date=day)),
+            expirations=Count('id', filter=Q(end_date=day)),
+            active_count=Count('id', filter=Q(start_date__lte=day) & (
+                Q(end_date__isnull=True) | Q(end_date__gte=day)
+            )),
+        )
+
+        values = {**subs, **pay, 'revenue': pay['revenue'] or 0}
+        DailyOwnerMetrics.objects.update_or_create(
+            owner_id=owner_id, date=day, plan_id=plan_id, defaults=values
+        )
+
+
+# ----------------------------
+# Full rebuild (nightly)
+# ----------------------------
+def rebuild_daily_metrics(since=None, until=None, batch_size=1000):
+    """
+    Rebuild DailyOwnerMetrics for [since, until] (default: Jan 1st of the
+    current year .. today) using grouped queries only. Returns the row count.
+
+    Active counts are derived as a running total:
+        active(d) = starts(<= d) - ends(< d)
+    so no per-subscription work happens in Python.
+    """
+    until = until or timezone.localdate()
+    since = since or until.replace(month=1, day=1)
+    owners = _plan_owners()
+
+    buckets = defaultdict(dict)  # (plan_id, day) -> field values
+
+    payments = (
+        Payment.objects.filter(payment_date__date__gte=since, payment_date__date__lte=until)
+        .annotate(day=TruncDate('payment_date'))
+        .values('subscription__plan', 'day')
+        .annotate(**_payment_aggregates())
+    )
+    for row in payments:
+        key = (row.pop('subscription__plan'), row.pop('day'))
+        buckets[key].update(row)
+
+    started = Subscription.objects.filter(start_date__isnull=False)
+    starts = defaultdict(dict)
+    for row in (started.filter(start_date__gte=since, start_date__lte=until)
+                .values('plan', 'start_date').annotate(n=Count('id'))):
+        starts[row['plan']][row['start_date']] = row['n']
+    ends = defaultdict(dict)
+    for row in (started.filter(end_date__gte=since, end_date__lte=until)
+                .values('plan', 'end_date').annotate(n=Count('id'))):
+        ends[row['plan']][row['end_date']] = row['n']
+
+    # subscriptions already running when the window opens
+    baseline = dict(
+        started.filter(start_date__lt=since)
+        .exclude(end_date__lt=since)
+        .values('plan').annotate(n=Count('id')).values_list('plan', 'n')
+    )
+
+    n_days = (until - since).days + 1
+    for plan_id in set(starts) | set(ends) | set(baseline):
+        running = baseline.get(plan_id, 0)
+        plan_starts, plan_ends = starts.get(plan_id, {}), ends.get(plan_id, {})
+        ended_yesterday = 0
+        for offset in range(n_days):
+            day = since + timedelta(days=offset)
+            running += plan_starts.get(day, 0) - ended_yesterday
+            ended_yesterday = plan_ends.get(day, 0)
+            if running or plan_starts.get(day) or ended_yesterday:
+                buckets[(plan_id, day)].update(
+                    new_subscriptions=plan_starts.get(day, 0),
+                    expirations=ended_yesterday,
+                    active_count=running,
+                )
+
+    rows = [
+        DailyOwnerMetrics(owner_id=owners[plan_id], plan_id=plan_id, date=day, **values)
+        for (plan_id, day), values in buckets.items()
+        if owners.get(plan_id) is not None
+    ]
+
+    with transaction.atomic():
+        DailyOwnerMetrics.objects.filter(date__gte=since, date__lte=until).delete()
+        DailyOwnerMetrics.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,115 @@
+# notifications/search.py
+"""
+Indexed search for notifications and payments.
+
+The backend follows the configured database:
+  - sqlite  : FTS5 tables kept current by triggers (migration 0025).
+              notifications_notification_fts indexes title/details as an
+              external-content table; notifications_payment_fts stores each
+              payment's transaction_id, customer username and plan name, and
+              is refreshed when any of those change.
+  - postgres: notification title/details through a GIN index on their
+              'simple' tsvector; payments through pg_trgm GIN indexes on the
+              three searched columns, which the icontains filter then uses.
+  - other   : plain icontains scans.
+
+Every word of the query must match, as a prefix ("inv" finds "invoice").
+Notification results are ranked (bm25 / ts_rank), best first. Both indexes
+are updated by the database itself on every insert, update and delete.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Notification
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 8
+
+# must match the expression index created in migration 0025 exactly
+NOTIFICATION_TSVECTOR = "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(details, ''))"
+
+
+def backend():
+    return connection.vendor if connection.vendor in ('sqlite', 'postgresql') else None
+
+
+def terms(query):
+    """Lower-cased words of `query`; punctuation and FTS operators are dropped."""
+    return [word.lower() for word in WORD_RE.findall(query or '')][:MAX_TERMS]
+
+
+def fts5_query(words):
+    # each word quoted (so AND/OR/NEAR are plain words) and prefix-matched
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def tsquery(words):
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+# ----------------------------
+# Notifications
+# ----------------------------
+def _ranked_ids(words, limit):
+    with connection.cursor() as cursor:
+        if backend() == 'sqlite':
+            cursor.execute(
+                "SELECT rowid FROM notifications_notification_fts "
+                "WHERE notifications_notification_fts MATCH %s ORDER BY rank LIMIT %s",
+                [fts5_query(words), limit],
+            )
+        else:
+            cursor.execute(
+                f"SELECT id FROM notifications_notification, to_tsquery('simple', %s) query "
+                f"WHERE {NOTIFICATION_TSVECTOR} @@ query "
+                f"ORDER BY ts_rank({NOTIFICATION_TSVECTOR}, query) DESC, id DESC LIMIT %s",
+                [tsquery(words), limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_notifications(query, limit=None):
+    """Best-matching notifications for `query`, most relevant first (at most `limit`)."""
+    words = terms(query)
+    if not words:
+        return []
+    limit = limit or getattr(settings, 'NOTIFICATION_SEARCH_LIMIT', 100)
+
+    if backend() is None:
+        matches = Notification.objects.all()
+        for word in words:
+            matches = matches.filter(Q(title__icontains=word) | Q(details__icontains=word))
+        return list(matches.order_by('-date_sent', '-id')[:limit])
+
+    ids = _ranked_ids(words, limit)
+    found = Notification.objects.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
+
+
+# ----------------------------
+# Payments
+# ----------------------------
+def filter_payments(payments, query):
+    """Narrow a Payment queryset to rows whose transaction id, customer or plan match `query`."""
+    words = terms(query)
+    if not words:
+        return payments
+
+    if backend() == 'sqlite':
+        return payments.filter(pk__in=RawSQL(
+            "SELECT rowid FROM notifications_payment_fts WHERE notifications_payment_fts MATCH %s",
+            [fts5_query(words)],
+        ))
+
+    # postgres serves these from the trigram indexes; elsewhere they scan
+    for word in words:
+        payments = payments.filter(
+            Q(subscription__customer__username__icontains=word) |
+            Q(subscription__plan__name__icontains=word) |
+            Q(transaction_id__icontains=word)
+        )
+    return payments
@@ -0,0 +1,150 @@
+# notifications/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_dashboards
+from .models import Category, Payment, Plan, Subscription, owner_for_plan
+from .rollups import refresh_daily_metrics
+
+
+# ----------------------------
+# Denormalized owner (Subscription.owner / Payment.owner)
+# ----------------------------
+def _sync_owner(owner_id, **plan_lookup):
+    Subscription.objects.filter(**plan_lookup).update(owner_id=owner_id)
+    Payment.objects.filter(**{f'subscription__{k}': v for k, v in plan_lookup.items()}).update(owner_id=owner_id)
+
+
+@receiver(pre_save, sender=Plan)
+def plan_remember_owner(sender, instance, **kwargs):
+    instance._previous_owner_id = owner_for_plan(instance.pk)
+
+
+@receiver(pre_save, sender=Category)
+def category_remember_owner(sender, instance, **kwargs):
+    instance._previous_owner_id = None
+    if instance.pk:
+        instance._previous_owner_id = Category.objects.filter(pk=instance.pk).values_list(
+            'created_by', flat=True).first()
+
+
+@receiver(post_save, sender=Plan)
+def plan_owner_sync(sender, instance, created, **kwargs):
+    owner = owner_for_plan(instance.pk)
+    if not created and owner != instance._previous_owner_id:
+        _sync_owner(owner, plan_id=instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def category_owner_sync(sender, instance, created, **kwargs):
+    if not created and instance.created_by_id != instance._previous_owner_id:
+        _sync_owner(instance.created_by_id, plan__category_id=instance.pk)
+
+
+# ----------------------------
+# DailyOwnerMetrics maintenance
+# ----------------------------
+def _schedule_refresh(plan_id, days):
+    if plan_id:
+        transaction.on_commit(lambda: refresh_daily_metrics(plan_id, days))
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def payment_rollup(sender, instance, **kwargs):
+    plan_id = (
+        Subscription.objects.filter(pk=instance.subscription_id)
+        .values_list('plan_id', flat=True)
+        .first()
+    )
+    _schedule_refresh(plan_id, [timezone.localtime(instance.payment_date).date()])
+
+
+@receiver(pre_save, sender=Subscription)
+def subscription_remember_previous(sender, instance, **kwargs):
+    # the stored plan/owner/dates, so post_save can fix the buckets it moved out of
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Subscription.objects.filter(pk=instance.pk).values(
+            'plan_id', 'owner_id', 'start_date', 'end_date').first()
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def subscription_rollup(sender, instance, **kwargs):
+    # start/end buckets plus today's active count; historic active counts for
+    # back-dated subscriptions are corrected by the nightly rebuild.
+    today = timezone.localdate()
+    days = [instance.start_date, instance.end_date, today]
+    previous = getattr(instance, '_previous', None)
+    if previous and previous['plan_id'] != instance.plan_id:
+        # the subscription's payments moved to the new plan too: refresh their days on both
+        paid = [timezone.localtime(d).date() for d in instance.payments.values_list('payment_date', flat=True)]
+        days += paid
+        _schedule_refresh(previous['plan_id'], [previous['start_date'], previous['end_date'], today, *paid])
+    elif previous:
+        days += [previous['start_date'], previous['end_date']]
+    _schedule_refresh(instance.plan_id, days)
+
+
+# ----------------------------
+# Dashboard cache invalidation
+# ----------------------------
+# Registered after the rollup receivers so their on_commit refresh runs first.
+def _schedule_invalidation(owner_ids=(), customer_ids=()):
+    owner_ids, customer_ids = list(owner_ids), list(customer_ids)
+    transaction.on_commit(lambda: invalidate_dashboards(owner_ids, customer_ids))
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    owner_ids = [instance.owner_id]
+    previous = getattr(instance, '_previous', None)
+    if previous and previous['owner_id'] != instance.owner_id:
+        # moved to another owner's plan: the old owner's dashboard lost it
+        owner_ids.append(previous['owner_id'])
+    _schedule_invalidation(owner_ids=owner_ids, customer_ids=[instance.customer_id])
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def payment_changed(sender, instance, **kwargs):
+    customer = Subscription.objects.filter(pk=instance.subscription_id).values_list(
+        'customer_id', flat=True).first()
+    _schedule_invalidation(owner_ids=[instance.owner_id], customer_ids=[customer])
+
+
+@receiver([post_save, post_delete], sender=Plan)
+def plan_changed(sender, instance, **kwargs):
+    owner = Category.objects.filter(pk=instance.category_id).values_list(
+        'created_by', flat=True).first()
+    customers = Subscription.objects.filter(plan_id=instance.pk).values_list(
+        'customer_id', flat=True).distinct()
+    _schedule_invalidation(
+        owner_ids=[owner, getattr(instance, '_previous_owner_id', None)],
+        customer_ids=customers,
+    )
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    customers = Subscription.objects.filter(plan__category_id=instance.pk).values_list(
+        'customer_id', flat=True).distinct()
+    _schedule_invalidation(owner_ids=[instance.created_by_id], customer_ids=customers)
+
+
+# ----------------------------
+# Discount windows (notifications/discounts.py)
+# ----------------------------
+@receiver(post_save, sender=Plan)
+def plan_schedule_discount(sender, instance, **kwargs):
+    # save() already stored current_price; queue the boundary tasks and, if the
+    # discount is live, its announcement (sent at most once per window)
+    from .discounts import notify_enabled
+    from .tasks import notify_plan_discount, schedule_discount_boundaries
+
+    def schedule():
+        schedule_discount_boundaries([instance])
+        if instance.discount_applied and notify_enabled():
+            notify_plan_discount.delay(instance.pk)
+
+    transaction.on_commit(schedule)
@@ -1,137 +1,421 @@
-from celery import shared_task
-from django.core.management import call_command
+import logging
+import time
+from datetime import datetime, timedelta
 
-@shared_task
-def send_payment_reminders():
-    call_command('send_reminders')
+from celery import chord, group, shared_task
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 
-@shared_task
-def generate_alerts():
-    call_command('generate_alerts')
+from . import discounts, outbox
+from .jobs import SUBSCRIPTION_JOBS, plan_shards, shard_count, shard_queryset
+from .locks import prune_leases, singleton_task
+from .models import Broadcast, Notification, User
+from .outbox import finish_broadcast_if_done
+from .templating import compile_template, recipient_context
+from .utils import send_and_update_notification
 
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------
+# Daily subscription jobs (monolithic or sharded)
+# ----------------------------
+def _run_subscription_job(job, chunk_size=None):
+    """
+    Run `job` in-process, or, when SUBSCRIPTION_JOB_SHARDS > 1, fan it out as
+    one run_subscription_job_shard task per shard with a chord callback that
+    aggregates per-shard counts and timings.
+    """
+    chunk_size = chunk_size or settings.NOTIFICATION_BATCH_SIZE
+    if shard_count() > 1:
+        shards = plan_shards()
+        if not shards:
+            return {"status": "ok", "job": job, "shards": 0, "counts": {}}
+        chord(
+            group(run_subscription_job_shard.s(job, shard, chunk_size) for shard in shards)
+        )(aggregate_subscription_job.s(job))
+        return {"status": "dispatched", "job": job, "shards": len(shards)}
+
+    started = time.monotonic()
+    counts = SUBSCRIPTION_JOBS[job](chunk_size=chunk_size)
+    timings = counts.pop("timings", {})
+    seconds = round(time.monotonic() - started, 3)
+    logger.info("%s: counts=%s timings=%s seconds=%s", job, counts, timings, seconds)
+    return {"status": "ok", "job": job, "counts": counts, "timings": timings, "seconds": seconds}
 
-from celery import shared_task
-from django.utils import timezone
-from datetime import timedelta
-from .models import Subscription, Notification
 
 @shared_task
-def check_subscription_notifications():
-    today = timezone.now().date()
+def run_subscription_job_shard(job, shard, chunk_size=None):
+    started = time.monotonic()
+    counts = SUBSCRIPTION_JOBS[job](queryset=shard_queryset(shard), chunk_size=chunk_size)
+    timings = counts.pop("timings", {})
+    return {"job": job, "shard": shard, "counts": counts, "timings": timings,
+            "seconds": round(time.monotonic() - started, 3)}
 
-    # 1️⃣ Notify 5 days before expiry
-    five_day_subs = Subscription.objects.filter(
-        is_active=True,
-        end_date=today + timedelta(days=5)
-    )
 
-    for sub in five_day_subs:
-        Notification.objects.create(
-            title="Your Subscription Ends Soon",
-            recipient=sub.customer.email,
-            type="Subscription",
-            details=f"Hi {sub.customer.username}, your subscription to {sub.plan.name} will expire in 5 days.",
-            date_sent=timezone.now()
-        )
+@shared_task
+def aggregate_subscription_job(results, job):
+    totals, phases = {}, {}
+    for result in results:
+        for key, value in result["counts"].items():
+            totals[key] = totals.get(key, 0) + value
+        # slowest shard per phase
+        for phase, value in result.get("timings", {}).items():
+            phases[phase] = max(phases.get(phase, 0), value)
+    timings = [r["seconds"] for r in results]
+    summary = {
+        "status": "ok",
+        "job": job,
+        "shards": len(results),
+        "counts": totals,
+        "timings": phases,
+        "max_shard_seconds": max(timings, default=0),
+        "total_shard_seconds": round(sum(timings), 3),
+    }
+    logger.info("%s (sharded): %s", job, summary)
+    return summary
 
-    # 2️⃣ Notify on expiry day
-    expiring_today = Subscription.objects.filter(
-        is_active=True,
-        end_date=today
-    )
 
-    for sub in expiring_today:
-        Notification.objects.create(
-            title="Your Subscription Has Ended",
-            recipient=sub.customer.email,
-            type="Subscription",
-            details=f"Hi {sub.customer.username}, your subscription to {sub.plan.name} has expired today.",
-            date_sent=timezone.now()
-        )
+# Scheduled entry points: @singleton_task lets one instance per day through,
+# even with several beat / worker instances running.
+@shared_task
+@singleton_task(period='daily')
+def send_payment_reminders(chunk_size=None):
+    return _run_subscription_job('send_payment_reminders', chunk_size)
 
-        # Optionally auto-deactivate
-        sub.subscription_status = "Inactive"
-        sub.is_active = False
-        sub.save()
+@shared_task
+@singleton_task(period='daily')
+def generate_alerts(chunk_size=None):
+    return _run_subscription_job('generate_alerts', chunk_size)
 
+@shared_task
+@singleton_task(period='daily')
+def check_subscription_notifications(chunk_size=None):
+    """
+    Daily expiry job: deactivate subscriptions that have ended in one UPDATE
+    (jobs.expiry_job). Expiry reminders go out with send_payment_reminders.
+    """
+    return _run_subscription_job('check_subscription_notifications', chunk_size)
+
+
+@shared_task
+@singleton_task(period='daily')
+def rebuild_daily_owner_metrics(days=None):
+    """
+    Nightly rebuild of the DailyOwnerMetrics rollups (default: current year).
+    """
+    from .rollups import rebuild_daily_metrics
+    since = None
+    if days:
+        since = timezone.localdate() - timedelta(days=int(days))
+    rows = rebuild_daily_metrics(since=since)
+    return {"status": "rebuilt", "rows": rows}
 
-# notifications/tasks.py
-from celery import shared_task
-from django.utils import timezone
-from .models import Notification, User
-from .providers_email import send_email
-from django.db import transaction
 
 @shared_task
 def send_email_task(notification_id):
     try:
-        notif = Notification.objects.get(pk=notification_id)
+        notif = Notification.objects.select_related('recipient_user', 'template').get(pk=notification_id)
     except Notification.DoesNotExist:
         return {"status": "not_found", "id": notification_id}
 
-    subject = notif.title or "Notification from SUBHUB"
-    template_name = getattr(notif, 'template', None)  # optional
-    context = getattr(notif, 'context', None) or {}
-    body_text = notif.details or ''
-
-    # recipient email resolution
-    if getattr(notif, 'recipient_user', None):
-        recipient_email = notif.recipient_user.email
-    else:
-        recipient_email = notif.recipient  # assume email
-
-    result = send_email(recipient_email, subject, template_name=template_name, context=context, body_text=body_text)
-
-    notif.attempts = (notif.attempts or 0) + 1
-    notif.last_attempt_at = timezone.now()
-    if result.get("success"):
-        notif.status = "sent"
-        notif.sent_at = timezone.now()
-        notif.meta = {"sent_via": "email"}
-    else:
-        notif.status = "failed"
-        notif.meta = {"error": result.get("error")}
-    notif.save(update_fields=['status','meta','attempts','last_attempt_at','sent_at'])
+    result = send_and_update_notification(notif)
     return {"id": notification_id, "result": result}
 
 @shared_task
-def enqueue_email_broadcast(template_notification_id, batch_size=50, pause_seconds=1.0):
+def enqueue_email_broadcast(template_notification_id, batch_size=None):
     """
-    Create per-user Notification rows for every customer and queue send_email_task.
+    Create per-user Notification rows for every customer, copied from a template
+    Notification, with one bulk INSERT per chunk of NOTIFICATION_BATCH_SIZE
+    customers, and queue one send_notification_batch task per chunk.
+    Customers are streamed with iterator(chunk_size=...) so memory stays bounded.
+    Pacing is left to the SMTP rate limit in send_notification_batch.
     """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+
     try:
-        template = Notification.objects.get(pk=template_notification_id)
+        template = Notification.objects.select_related('template').get(pk=template_notification_id)
     except Notification.DoesNotExist:
         return {"status": "template_not_found"}
 
-    customers = User.objects.filter(role='customer').only('id','email','username')
-    total = customers.count()
-    if total == 0:
-        return {"status": "no_customers"}
+    customers = User.objects.filter(role='customer').order_by('pk').values_list(
+        'id', 'email', 'username', 'mobile_number'
+    )
+    stored_template = template.template
+
+    total = chunks = 0
+    batch = []
 
-    i = 0
-    for cust in customers.iterator():
-        with transaction.atomic():
-            per_notif = Notification.objects.create(
+    def flush(rows):
+        nonlocal total, chunks
+        now = timezone.now()
+        created = Notification.objects.bulk_create([
+            Notification(
                 title=template.title,
                 type=template.type,
-                recipient_user=cust,
-                recipient=cust.email,
+                recipient_user_id=pk,
+                recipient=email,
                 details=template.details,
+                template=stored_template,
+                context=recipient_context(
+                    stored_template, {'username': username, 'email': email, 'mobile_number': mobile},
+                    template.context,
+                ) if stored_template else {},
                 status='pending',
-                date_sent=timezone.now(),
+                date_sent=now,
             )
-        # schedule send in batches to avoid spikes
-        countdown = (i // batch_size) * pause_seconds
-        send_email_task.apply_async(args=[per_notif.id], countdown=countdown)
-        i += 1
+            for pk, email, username, mobile in rows
+        ])
+        if not outbox.enabled():
+            send_notification_batch.delay([n.pk for n in created])
+        total += len(created)
+        chunks += 1
+
+    for row in customers.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    if total == 0:
+        return {"status": "no_customers"}
 
     template.meta = {"broadcast_total": total, "broadcasted_at": timezone.now().isoformat()}
     template.save(update_fields=['meta'])
-    return {"status":"enqueued","total":total}
+    return {"status": "enqueued", "total": total, "chunks": chunks}
+
+
+# ----------------------------
+# Broadcast pipeline (new_notification_view -> start_broadcast -> send_notification_batch)
+# ----------------------------
+@shared_task
+def start_broadcast(broadcast_id, chunk_size=None):
+    """
+    Create one pending Notification per customer in bulk chunks and fan each
+    chunk out to send_notification_batch (or leave it to the outbox dispatcher).
+    Progress lives on the Broadcast row.
+    """
+    chunk_size = chunk_size or settings.NOTIFICATION_BATCH_SIZE
+    try:
+        broadcast = Broadcast.objects.select_related('template').get(pk=broadcast_id)
+    except Broadcast.DoesNotExist:
+        return {"status": "not_found", "id": broadcast_id}
+    try:
+        if broadcast.template:
+            compile_template(broadcast.template)  # fail fast on a broken template, before any rows
+    except Exception:
+        _fail_broadcast(broadcast_id)
+        raise
+
+    chunks = _fan_out(broadcast, User.objects.filter(role='customer').order_by('pk'), chunk_size)
+    return {"status": "dispatched", "id": broadcast_id, "chunks": chunks}
+
+
+def _fail_broadcast(broadcast_id):
+    Broadcast.objects.filter(pk=broadcast_id).update(status='failed', finished_at=timezone.now())
 
 
+def _fan_out(broadcast, recipients, chunk_size):
+    """
+    Create the broadcast's rows for every user in `recipients`, chunk by chunk;
+    returns chunks. An error marks the broadcast 'failed' and is re-raised.
+    """
+    broadcast_id = broadcast.pk
+    customers = recipients.values_list('id', 'email', 'username', 'mobile_number')
+    try:
+        Broadcast.objects.filter(pk=broadcast_id).update(
+            status='running', started_at=timezone.now(), total_recipients=customers.count()
+        )
+
+        chunks = 0
+        batch = []
+        for row in customers.iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                _dispatch_broadcast_chunk(broadcast, batch)
+                chunks += 1
+                batch = []
+        if batch:
+            _dispatch_broadcast_chunk(broadcast, batch)
+            chunks += 1
+    except Exception:
+        _fail_broadcast(broadcast_id)
+        raise
+
+    Broadcast.objects.filter(pk=broadcast_id).update(dispatch_done=True)
+    finish_broadcast_if_done(broadcast_id)
+    return chunks
+
+
+def _dispatch_broadcast_chunk(broadcast, customers):
+    # skip customers that already received this exact message
+    already = Notification.objects.users_with_content(
+        broadcast.title, broadcast.details, broadcast.type, [row[0] for row in customers]
+    )
+    template = broadcast.template
+    now = timezone.now()
+    rows = Notification.objects.bulk_create([
+        Notification(
+            title=broadcast.title,
+            type=broadcast.type,
+            details=broadcast.details,
+            recipient_user_id=pk,
+            recipient=email,
+            broadcast=broadcast,
+            template=template,
+            # only the template's declared variables are stored per row
+            context=recipient_context(
+                template, {'username': username, 'email': email, 'mobile_number': mobile},
+                broadcast.context,
+            ) if template else {},
+            status='pending',
+            date_sent=now,
+        )
+        for pk, email, username, mobile in customers if pk not in already
+    ])
+    Broadcast.objects.filter(pk=broadcast.pk).update(
+        created_count=F('created_count') + len(rows),
+        skipped_count=F('skipped_count') + len(already),
+    )
+    if rows and not outbox.enabled():
+        send_notification_batch.delay([n.pk for n in rows])
+
+
+@shared_task
+def send_notification_batch(notification_ids, broadcast_id=None):
+    """
+    Claim and send a batch of notifications over one SMTP connection. Each
+    channel sends only as many as its rate limit grants; the rest go to 'retry'
+    for when its bucket has refilled. Rows already claimed, sent or dead-lettered
+    elsewhere are skipped. Broadcast progress is recorded from each row's
+    broadcast (`broadcast_id` is accepted for tasks queued by older code).
+    """
+    ids = sorted(notification_ids)
+    notifications = outbox.claim(len(ids), ids=ids)
+    results = outbox.deliver(notifications)
+    sent = sum(1 for r in results if r.get('success'))
+    deferred = sum(1 for r in results if r.get('deferred'))
+    return {"sent": sent, "failed": len(results) - sent - deferred, "deferred": deferred}
+
+
+# ----------------------------
+# Retries (see notifications/retry.py)
+# ----------------------------
+@shared_task
+@singleton_task(period=None)
+def retry_failed_notifications(limit=None, batch_size=None):
+    """
+    Re-queue notifications whose next_attempt_at has passed, oldest first.
+    Picked rows get next_attempt_at pushed out by NOTIFICATION_RETRY_CLAIM_SECONDS
+    so the next sweep skips them while their batch is queued; if the batch
+    never runs they simply come due again.
+    """
+    if outbox.enabled():
+        return {"status": "skipped", "reason": "outbox dispatcher handles retries"}
+    limit = limit or getattr(settings, 'NOTIFICATION_RETRY_SWEEP_LIMIT', 1000)
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    now = timezone.now()
+
+    due = list(
+        Notification.objects.filter(status='retry', next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not due:
+        return {"status": "idle", "queued": 0}
+
+    claim_until = now + timedelta(seconds=getattr(settings, 'NOTIFICATION_RETRY_CLAIM_SECONDS', 600))
+    Notification.objects.filter(pk__in=due, status='retry').update(next_attempt_at=claim_until)
+
+    for start in range(0, len(due), batch_size):
+        send_notification_batch.delay(due[start:start + batch_size])
+    return {"status": "queued", "queued": len(due)}
+
+
+# ----------------------------
+# Retention (see notifications/retention.py)
+# ----------------------------
+@shared_task
+@singleton_task(period='daily')
+def prune_old_notifications(retention_days=None, chunk_size=None):
+    """
+    Archive and delete Notification/Alert rows older than NOTIFICATION_RETENTION_DAYS,
+    and drop job leases of past periods.
+    """
+    from .retention import prune_old_rows
+
+    started = time.monotonic()
+    deleted = prune_old_rows(retention_days, chunk_size)
+    deleted['joblease'] = prune_leases()
+    logger.info("prune_old_notifications: deleted %s in %.1fs", deleted, time.monotonic() - started)
+    return {"status": "pruned", **deleted}
+
+
+# ----------------------------
+# Discount windows (see notifications/discounts.py)
+# ----------------------------
+def schedule_discount_boundaries(plans, now=None, start=None):
+    """Queue apply_discount_boundary at each of `plans`' boundaries after start (default now) within the horizon."""
+    queued = 0
+    for plan in plans:
+        for eta in discounts.boundaries(plan, now, start=start):
+            try:
+                apply_discount_boundary.apply_async(args=[plan.pk, eta.isoformat()], eta=eta)
+                queued += 1
+            except Exception:
+                # the sweeper corrects the price within DISCOUNT_SWEEP_SECONDS anyway
+                logger.warning("could not schedule discount boundary for plan %s", plan.pk, exc_info=True)
+    return queued
 
 
+def _announce(plan_ids):
+    if discounts.notify_enabled():
+        for plan_id in plan_ids:
+            notify_plan_discount.delay(plan_id)
 
 
+@shared_task
+def apply_discount_boundary(plan_id, eta):
+    """Re-evaluate a plan's stored price at one of its discount boundaries."""
+    eta = datetime.fromisoformat(eta)
+    early = (eta - timezone.now()).total_seconds()
+    if early > 0:
+        # delivered ahead of its ETA (broker clock skew): wait for the boundary
+        apply_discount_boundary.apply_async(args=[plan_id, eta.isoformat()], countdown=early)
+        return {"status": "early", "id": plan_id}
+    started = discounts.refresh_prices([plan_id])
+    _announce(started)
+    return {"status": "applied", "id": plan_id, "started": bool(started)}
+
+
+@shared_task
+@singleton_task(period=None)
+def sweep_plan_discounts():
+    """Fix stored prices that disagree with the clock and schedule the next boundaries."""
+    now = timezone.now()
+    started = discounts.refresh_prices(now=now)
+    _announce(started)
+    start, within = discounts.sweep_window(now)
+    queued = schedule_discount_boundaries(discounts.upcoming(now, within, start), now, start)
+    return {"status": "swept", "started": len(started), "scheduled": queued}
+
+
+@shared_task
+def notify_plan_discount(plan_id, chunk_size=None):
+    """
+    Send a 'Discount' notification about the plan's live discount to customers
+    subscribed in its category, once per discount window.
+    """
+    plan = discounts.claim_announcement(plan_id)
+    if plan is None:
+        return {"status": "skipped", "id": plan_id}
+
+    title, details = discounts.announcement(plan)
+    broadcast = Broadcast.objects.create(
+        title=title, details=details, type='Discount', created_by_id=plan.category.created_by_id
+    )
+    chunks = _fan_out(broadcast, discounts.audience(plan), chunk_size or settings.NOTIFICATION_BATCH_SIZE)
+    return {"status": "dispatched", "id": plan_id, "broadcast": broadcast.pk, "chunks": chunks}
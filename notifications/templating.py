@@ -0,0 +1,141 @@
+# notifications/templating.py
+"""
+Compile-once rendering for NotificationTemplate.
+
+compile_template() parses a template's subject, text and HTML bodies into
+Django Template objects once per process and template version; the template's
+CSS is inlined into the HTML source before parsing, so inlining costs nothing
+per message either. Rendering a recipient is then a single Template.render()
+with their compact context -- just the template's declared variables, stored
+on the Notification row.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from django.template import Context, Template, engines
+
+# per-recipient values a template may declare as variables
+RECIPIENT_FIELDS = ('username', 'email', 'mobile_number')
+
+# compiled templates kept per process, keyed by (pk, updated_at)
+CACHE_SIZE = 64
+_compiled = {}
+
+
+# ----------------------------
+# CSS inlining (simple selectors: tag, .class, #id, tag.class)
+# ----------------------------
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+CSS_RULE_RE = re.compile(r'([^{}]+)\{([^{}]*)\}')
+SELECTOR_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9]*)?(?:\.([\w-]+))?(?:#([\w-]+))?$')
+START_TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)((?:[^<>"\']|"[^"]*"|\'[^\']*\')*?)(/?)>')
+ATTR_RE = r'\b{}\s*=\s*("([^"]*)"|\'([^\']*)\')'
+
+
+def parse_css(css):
+    """[(tag, class, id, declarations)] for every simple selector; others are ignored."""
+    rules = []
+    for selectors, body in CSS_RULE_RE.findall(CSS_COMMENT_RE.sub('', css or '')):
+        declarations = '; '.join(d.strip() for d in body.split(';') if d.strip())
+        for selector in selectors.split(','):
+            match = SELECTOR_RE.match(selector.strip())
+            if match and any(match.groups()) and declarations:
+                tag, cls, ident = match.groups()
+                rules.append(((tag or '').lower(), cls, ident, declarations))
+    return rules
+
+
+def _attr(attrs, name):
+    match = re.search(ATTR_RE.format(name), attrs)
+    return (match.group(2) if match.group(2) is not None else match.group(3)) if match else None
+
+
+def inline_css(html, css):
+    """Copy matching CSS rules into style="" attributes; existing inline styles win."""
+    rules = parse_css(css)
+    if not rules:
+        return html
+
+    def apply(match):
+        tag, attrs, close = match.group(1), match.group(2), match.group(3)
+        classes = set((_attr(attrs, 'class') or '').split())
+        ident = _attr(attrs, 'id')
+        styles = [
+            declarations for rule_tag, cls, rule_id, declarations in rules
+            if (not rule_tag or rule_tag == tag.lower())
+            and (not cls or cls in classes)
+            and (not rule_id or rule_id == ident)
+        ]
+        if not styles:
+            return match.group(0)
+        existing = _attr(attrs, 'style')
+        if existing:
+            styles.append(existing)
+            attrs = re.sub(ATTR_RE.format('style'), '', attrs)
+        style = '; '.join(styles).replace('"', "'")
+        return f'<{tag}{attrs.rstrip()} style="{style}"{close}>'
+
+    return START_TAG_RE.sub(apply, html)
+
+
+# ----------------------------
+# Compile / render
+# ----------------------------
+@dataclass(frozen=True)
+class CompiledTemplate:
+    subject: Template
+    text: Template
+    html: Optional[Template]
+
+    def render(self, context):
+        """(subject, text, html) for one recipient."""
+        plain = Context(context, autoescape=False)
+        subject = ' '.join(self.subject.render(plain).split())  # no newlines in headers
+        text = self.text.render(plain)
+        html = self.html.render(Context(context)) if self.html else None
+        return subject, text, html
+
+
+def compile_source(template):
+    engine = engines['django'].engine
+    html = inline_css(template.body_html, template.css) if template.body_html else ''
+    return CompiledTemplate(
+        subject=engine.from_string(template.subject),
+        text=engine.from_string(template.body_text),
+        html=engine.from_string(html) if html else None,
+    )
+
+
+def compile_template(template):
+    """Compiled form of `template`, built once per process and template version."""
+    if template.pk is None:
+        return compile_source(template)
+    key = (template.pk, template.updated_at)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        if len(_compiled) >= CACHE_SIZE:
+            _compiled.clear()
+        compiled = _compiled[key] = compile_source(template)
+    return compiled
+
+
+def recipient_context(template, recipient=None, shared=None):
+    """
+    Compact context for one recipient: only the template's declared variables,
+    taken from `recipient` (a User or a dict of RECIPIENT_FIELDS) over `shared`.
+    """
+    values = dict(shared or {})
+    if recipient is not None:
+        for field in RECIPIENT_FIELDS:
+            value = recipient.get(field) if isinstance(recipient, dict) else getattr(recipient, field, None)
+            if value is not None:
+                values[field] = value
+    return {name: values[name] for name in (template.variables or []) if name in values}
+
+
+def render_notification(notification):
+    """(subject, text, html) for a Notification: its template if it has one, else title/details."""
+    if notification.template_id:
+        return compile_template(notification.template).render(notification.context or {})
+    return notification.title, notification.details or '', None
@@ -1,4 +1,1080 @@
-from django.test import TestCase
+import gzip
+import json
+import shutil
+import smtplib
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import Http404
+from django.template import TemplateSyntaxError
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from notifications import (
+    channels, discounts, jobs, locks, metrics, outbox, ratelimit, reminders, tasks, views,
+)
+from notifications.cache import admin_dashboard_key, customer_dashboard_key, get_or_compute, invalidate
+from notifications.models import (
+    Alert, Broadcast, Category, CustomerProfile, DailyOwnerMetrics, JobLease, Notification,
+    NotificationTemplate, Payment, Plan, RateLimitBucket, ReminderLedger, Subscription, User,
+    notification_content_hash, plan_effective_price, plan_monthly_price,
+)
+from notifications.pagination import keyset_paginate
+from notifications.providers_email import build_email, send_email_batch
+from notifications.retention import prune_old_rows
+from notifications.retry import backoff_delay
+from notifications.rollups import rebuild_daily_metrics
+from notifications.search import filter_payments, search_notifications
+from notifications.templating import compile_template, recipient_context, render_notification
+from notifications.utils import send_and_update_notification
+
+
+# ----------------------------
+# Outbox claims (notifications/outbox.py)
+# ----------------------------
+class OutboxClaimTests(TestCase):
+    def setUp(self):
+        self.rows = Notification.objects.bulk_create([
+            Notification(title='Renewal due', details=f'Invoice #{i} is due', type='Subscription',
+                         recipient=f'customer{i}@example.com')
+            for i in range(5)
+        ])
+
+    def test_claims_do_not_overlap(self):
+        first = outbox.claim(3)
+        second = outbox.claim(3)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({n.pk for n in first} & {n.pk for n in second})
+        self.assertEqual(outbox.claim(3), [])
+        self.assertEqual(Notification.objects.filter(status='sending').count(), 5)
+
+    def test_claim_only_among_ids(self):
+        target = self.rows[1].pk
+        self.assertEqual([n.pk for n in outbox.claim(5, ids=[target])], [target])
+        self.assertEqual(outbox.claim(5, ids=[target]), [])
+
+    def test_retry_rows_are_claimed_once_due(self):
+        now = timezone.now()
+        due, later = self.rows[0], self.rows[1]
+        Notification.objects.exclude(pk__in=[due.pk, later.pk]).update(status='sent')
+        Notification.objects.filter(pk=due.pk).update(status='retry', next_attempt_at=now - timedelta(seconds=1))
+        Notification.objects.filter(pk=later.pk).update(status='retry', next_attempt_at=now + timedelta(hours=1))
+        self.assertEqual([n.pk for n in outbox.claim(5)], [due.pk])
+
+    def test_stale_claims_are_released(self):
+        claimed = outbox.claim(2)
+        Notification.objects.filter(pk=claimed[0].pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(outbox.release_stale_claims(timeout=600), 1)
+        self.assertEqual(Notification.objects.get(pk=claimed[0].pk).status, 'pending')
+        self.assertEqual(Notification.objects.get(pk=claimed[1].pk).status, 'sending')
+
+
+# ----------------------------
+# Retries and dead letters (notifications/retry.py)
+# ----------------------------
+TRANSIENT = {"success": False, "error": "421 try again later", "error_class": "transient", "code": 421}
+PERMANENT = {"success": False, "error": "550 mailbox unavailable", "error_class": "permanent", "code": 550}
+
+
+@override_settings(
+    PROVIDER_RATE_LIMITS={},
+    NOTIFICATION_RETRY_POLICIES={
+        'transient': {'max_attempts': 2, 'base_seconds': 60, 'max_seconds': 600},
+        'permanent': {'max_attempts': 1},
+    },
+)
+class RetryTests(TestCase):
+    def setUp(self):
+        self.notification = Notification.objects.create(
+            title='Payment received', details='Thanks for your payment', type='Payment',
+            recipient='payer@example.com',
+        )
+
+    def send(self, result):
+        with mock.patch('notifications.channels.send_email_batch', return_value=[result]):
+            send_and_update_notification(self.notification)
+        self.notification.refresh_from_db()
+
+    def make_due(self):
+        Notification.objects.filter(pk=self.notification.pk).update(next_attempt_at=timezone.now())
+
+    def test_transient_failure_retries_then_dead_letters(self):
+        self.send(TRANSIENT)
+        self.assertEqual((self.notification.status, self.notification.attempts), ('retry', 1))
+        self.assertGreater(self.notification.next_attempt_at, timezone.now())
+        # not due yet: the dispatcher's claim passes it over
+        self.assertEqual(outbox.claim(5), [])
+
+        self.make_due()
+        self.send(TRANSIENT)
+        self.assertEqual((self.notification.status, self.notification.attempts), ('dead', 2))
+        self.assertIsNone(self.notification.next_attempt_at)
+        self.assertEqual([e['code'] for e in self.notification.meta['errors']], [421, 421])
+
+    def test_permanent_failure_dead_letters_at_once(self):
+        self.send(PERMANENT)
+        self.assertEqual((self.notification.status, self.notification.attempts), ('dead', 1))
+
+    def test_success_after_retry_clears_error(self):
+        self.send(TRANSIENT)
+        self.make_due()
+        self.send({"success": True, "provider_message_id": "msg-1"})
+        self.assertEqual((self.notification.status, self.notification.attempts), ('sent', 2))
+        self.assertNotIn('error', self.notification.meta)
+        self.assertEqual(self.notification.provider_message_id, 'msg-1')
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        policy = {'base_seconds': 60, 'max_seconds': 300}
+        for attempt, ceiling in ((1, 60), (2, 120), (3, 240), (4, 300), (9, 300)):
+            delay = backoff_delay(attempt, policy)
+            self.assertGreaterEqual(delay, ceiling / 2)
+            self.assertLessEqual(delay, ceiling)
+
+
+# ----------------------------
+# Provider rate limits (notifications/ratelimit.py)
+# ----------------------------
+@override_settings(RATE_LIMIT_BACKEND='db', PROVIDER_RATE_LIMITS={'smtp': {'rate': 1.0, 'burst': 3}})
+class RateLimitTests(TestCase):
+    def test_partial_grant_reports_retry_after(self):
+        granted, retry_after = ratelimit.acquire('smtp', 5)
+        self.assertEqual(granted, 3)
+        self.assertAlmostEqual(retry_after, 2.0, delta=0.1)
+
+        granted, retry_after = ratelimit.acquire('smtp', 1)
+        self.assertEqual(granted, 0)
+        self.assertGreater(retry_after, 0)
+        self.assertLessEqual(retry_after, 1.0)
+
+    def test_bucket_refills_at_rate(self):
+        ratelimit.acquire('smtp', 3)
+        RateLimitBucket.objects.filter(name='smtp').update(updated_at=timezone.now() - timedelta(seconds=2))
+        self.assertEqual(ratelimit.acquire('smtp', 5)[0], 2)
+
+    def test_unlimited_provider_grants_everything(self):
+        self.assertEqual(ratelimit.acquire('unknown', 7), (7, 0.0))
+
+    def test_limited_sends_are_deferred_not_attempted(self):
+        Notification.objects.bulk_create([
+            Notification(title='Plan update', details='Your plan changed', type='Subscription',
+                         recipient=f'member{i}@example.com')
+            for i in range(5)
+        ])
+        sent = [{"success": True, "provider_message_id": None}] * 3
+        with mock.patch('notifications.channels.send_email_batch', return_value=sent) as send:
+            results = outbox.deliver(outbox.claim(5))
+
+        self.assertEqual(len(send.call_args.args[0]), 3)
+        self.assertEqual([bool(r.get('deferred')) for r in results], [False] * 3 + [True] * 2)
+        deferred = Notification.objects.filter(status='retry')
+        self.assertEqual(deferred.count(), 2)
+        self.assertFalse(deferred.exclude(attempts=0).exists())
+
+
+# ----------------------------
+# Keyset pagination (notifications/pagination.py)
+# ----------------------------
+class KeysetPaginationTests(TestCase):
+    ordering = ('type', '-date_sent', 'id')
+
+    def setUp(self):
+        # repeated (type, date_sent) pairs, so ties are broken by id
+        now = timezone.now()
+        for i in range(23):
+            Notification.objects.create(
+                title=f"Notice {i}", details="See your dashboard", recipient=f"reader{i}@example.com",
+                type=('Payment', 'Discount')[i % 2], date_sent=now - timedelta(minutes=i // 4),
+            )
+        self.expected = list(Notification.objects.order_by(*self.ordering).values_list('pk', flat=True))
+
+    def page(self, url='?'):
+        request = RequestFactory().get('/' + url)
+        return keyset_paginate(Notification.objects.all(), request, self.ordering, per_page=5)
+
+    def test_walk_visits_every_row_once_in_both_directions(self):
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page(pages[-1].next_url))
+        self.assertEqual([n.pk for page in pages for n in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+
+        page, backward = pages[-1], []
+        while True:
+            backward[:0] = [n.pk for n in page]
+            if not page.has_previous:
+                break
+            page = self.page(page.previous_url)
+        self.assertEqual(backward, self.expected)
+
+    def test_links_keep_other_parameters(self):
+        page = self.page('?sort_by=type&page=4')
+        self.assertIn('sort_by=type', page.next_url)
+        self.assertNotIn('page=', page.next_url)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        page = self.page('?cursor=not-a-cursor')
+        self.assertEqual([n.pk for n in page], self.expected[:5])
+
+
+# ----------------------------
+# MRR and plan prices in SQL (notifications/models.py, notifications/metrics.py)
+# ----------------------------
+class MonthlyRecurringRevenueTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('mrr-admin', 'mrr-admin@example.com', role='admin')
+        category = Category.objects.create(name='Streaming', created_by=self.owner)
+        self.yearly = Plan.objects.create(category=category, name='Annual', duration='yearly', price=Decimal('1000'))
+        self.monthly = Plan.objects.create(category=category, name='Monthly', duration='monthly',
+                                           price=Decimal('212.50'))
+        customer = User.objects.create_user('mrr-customer', 'mrr-customer@example.com')
+        for plan in (self.yearly, self.monthly):
+            Subscription.objects.create(customer=customer, plan=plan, start_date=timezone.localdate(),
+                                        subscription_status='Active', is_active=True)
+
+    def test_yearly_whole_number_price_is_not_floor_divided(self):
+        monthly = Plan.objects.filter(pk=self.yearly.pk).annotate(m=plan_monthly_price()).get().m
+        self.assertAlmostEqual(float(monthly), 83.33, places=2)
+
+    def test_dashboard_mrr_matches_python_prices(self):
+        expected = round(float(self.yearly.final_price) / 12 + float(self.monthly.final_price), 2)
+        self.assertEqual(metrics.calculate_mrr(self.owner), expected)
+        self.assertEqual(metrics.compute_dashboard_metrics(self.owner).mrr, expected)
+
+    def test_discount_applies_inside_window_only(self):
+        now = timezone.now()
+        Plan.objects.filter(pk=self.monthly.pk).update(
+            discount_percent=Decimal('15'), discount_activated_date=now - timedelta(days=1),
+            discount_deactivated_date=now + timedelta(days=1),
+        )
+        plan = Plan.objects.filter(pk=self.monthly.pk)
+        self.assertAlmostEqual(float(plan.annotate(p=plan_effective_price(now=now)).get().p), 180.62, places=2)
+        later = now + timedelta(days=2)
+        self.assertEqual(plan.annotate(p=plan_effective_price(now=later)).get().p, Decimal('212.50'))
+
+
+# ----------------------------
+# Expiry reminders and the reminder ledger (notifications/reminders.py)
+# ----------------------------
+@override_settings(SUBSCRIPTION_REMINDER_OFFSETS=[7, 3, 0], SUBSCRIPTION_REMINDER_CATCHUP_DAYS=3)
+class ReminderTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        owner = User.objects.create_user('reminder-admin', 'reminder-admin@example.com', role='admin')
+        category = Category.objects.create(name='Fitness', created_by=owner)
+        plan = Plan.objects.create(category=category, name='Gym Monthly', duration='monthly', price=Decimal('499'))
+        self.customer = User.objects.create_user('member', 'member@example.com')
+        self.sub = Subscription.objects.create(
+            customer=self.customer, plan=plan, start_date=self.today - timedelta(days=27),
+            end_date=self.today + timedelta(days=3), subscription_status='Active', is_active=True,
+        )
+
+    def run_on(self, day):
+        return reminders.run_reminders(today=day)
+
+    def test_rerun_issues_nothing_new(self):
+        self.assertEqual(self.run_on(self.today)['created'], 1)
+        self.assertEqual(self.run_on(self.today)['created'], 0)
+        self.assertEqual(Notification.objects.filter(recipient_user=self.customer).count(), 1)
+        self.assertEqual(list(ReminderLedger.objects.values_list('offset_days', flat=True)), [3])
+
+    def test_ledger_rejects_a_second_entry(self):
+        entry = dict(subscription=self.sub, kind='notification', offset_days=3, period=self.sub.end_date)
+        ReminderLedger.objects.create(run_id='first', **entry)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ReminderLedger.objects.create(run_id='second', **entry)
+
+    def test_each_tier_is_issued_once_as_the_end_date_nears(self):
+        for day in range(4):
+            self.run_on(self.today + timedelta(days=day))
+        self.assertEqual(sorted(ReminderLedger.objects.values_list('offset_days', flat=True)), [0, 3])
+
+    def test_missed_expiry_notice_is_caught_up_after_deactivation(self):
+        self.run_on(self.today)
+        # the reminder run on the end date was missed; expiry_job ran on schedule
+        later = self.sub.end_date + timedelta(days=2)
+        with mock.patch('django.utils.timezone.localdate', return_value=later):
+            self.assertEqual(jobs.expiry_job()['deactivated'], 1)
+
+        self.assertEqual(self.run_on(later)['created'], 1)
+        self.assertEqual(self.run_on(later)['created'], 0)
+        notice = Notification.objects.filter(recipient_user=self.customer).latest('pk')
+        self.assertEqual(notice.title, 'Your Subscription Has Ended')
+
+    def test_catch_up_window_is_bounded(self):
+        Subscription.objects.filter(pk=self.sub.pk).update(is_active=False, subscription_status='Inactive')
+        self.assertEqual(self.run_on(self.sub.end_date + timedelta(days=4))['candidates'], 0)
+
+    def test_pending_subscriptions_are_not_reminded(self):
+        Subscription.objects.filter(pk=self.sub.pk).update(
+            is_active=False, subscription_status='Pending', end_date=self.today)
+        self.assertEqual(self.run_on(self.today)['candidates'], 0)
+
+
+# ----------------------------
+# Daily rollups (notifications/rollups.py)
+# ----------------------------
+class DailyMetricsTests(TestCase):
+    fields = ('owner_id', 'plan_id', 'date', 'revenue', 'payments_count', 'new_subscriptions',
+              'expirations', 'active_count', 'upi_payments', 'card_payments')
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.owner = User.objects.create_user('rollup-admin', 'rollup-admin@example.com', role='admin')
+        category = Category.objects.create(name='News', created_by=self.owner)
+        self.plans = [
+            Plan.objects.create(category=category, name='Daily Digest', duration='monthly', price=Decimal('99')),
+            Plan.objects.create(category=category, name='Archive', duration='yearly', price=Decimal('1200')),
+        ]
+        self.customers = [User.objects.create_user(f'reader{i}', f'reader{i}@example.com') for i in range(3)]
+
+    def rows(self):
+        return {
+            (row['plan_id'], row['date']): row
+            for row in DailyOwnerMetrics.objects.values(*self.fields)
+        }
+
+    def test_incremental_refresh_matches_full_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            subs = []
+            for i, (customer, plan) in enumerate(zip(self.customers, self.plans * 2)):
+                start = self.today - timedelta(days=10 - i)
+                subs.append(Subscription.objects.create(
+                    customer=customer, plan=plan, start_date=start, end_date=start + timedelta(days=8),
+                    subscription_status='Active', is_active=True,
+                ))
+            for i, (sub, method) in enumerate(zip(subs, ('UPI', 'Card', 'UPI'))):
+                Payment.objects.create(subscription=sub, transaction_id=f'txn-{i}', amount=sub.plan.price,
+                                       payment_method=method, status='completed',
+                                       payment_date=timezone.now() - timedelta(days=i))
+        incremental = self.rows()
+        self.assertTrue(incremental)
+
+        rebuild_daily_metrics(since=self.today - timedelta(days=30))
+        rebuilt = self.rows()
+        for key, row in incremental.items():
+            # refresh stores empty buckets as zero rows, the rebuild leaves them out
+            empty = dict(row, **{f: 0 for f in self.fields[3:]})
+            self.assertEqual(row, rebuilt.get(key, empty), key)
+        # the rebuild also fills the days in between with active counts
+        self.assertGreater(len(rebuilt), len(incremental))
+        self.assertEqual(sum(r['revenue'] for r in rebuilt.values()), Decimal('1398'))
+
+    def test_month_chart_reads_the_rollups(self):
+        DailyOwnerMetrics.objects.create(owner=self.owner, plan=self.plans[0], date=self.today,
+                                         revenue=Decimal('250.50'), new_subscriptions=2)
+        revenue, subscriptions = metrics.monthly_series(self.owner, self.today.year)
+        self.assertEqual(revenue[self.today.month - 1], 250.5)
+        self.assertEqual(subscriptions[self.today.month - 1], 2)
+
+
+# ----------------------------
+# Daily subscription jobs (notifications/jobs.py)
+# ----------------------------
+@override_settings(SUBSCRIPTION_JOB_SHARDS=1)
+class ExpiryJobTests(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        owner = User.objects.create_user('jobs-admin', 'jobs-admin@example.com', role='admin')
+        category = Category.objects.create(name='Music', created_by=owner)
+        plan = Plan.objects.create(category=category, name='Lossless', duration='monthly', price=Decimal('149'))
+        self.ended, self.running = [
+            Subscription.objects.create(
+                customer=User.objects.create_user(f'listener{i}', f'listener{i}@example.com'), plan=plan,
+                start_date=today - timedelta(days=30), end_date=today + timedelta(days=days),
+                subscription_status='Active', is_active=True,
+            )
+            for i, days in enumerate((-1, 5))
+        ]
+
+    def test_deactivates_ended_subscriptions_and_reports_phase_timings(self):
+        result = tasks.check_subscription_notifications()
+
+        self.assertEqual(result['counts'], {'deactivated': 1})
+        self.assertEqual(set(result['timings']), {'select', 'update', 'invalidate'})
+        self.ended.refresh_from_db()
+        self.running.refresh_from_db()
+        self.assertEqual((self.ended.is_active, self.ended.subscription_status), (False, 'Inactive'))
+        self.assertTrue(self.running.is_active)
+
+    def test_shard_results_keep_slowest_phase(self):
+        summary = tasks.aggregate_subscription_job([
+            {'counts': {'deactivated': 2}, 'timings': {'select': 0.2, 'update': 0.1}, 'seconds': 0.3},
+            {'counts': {'deactivated': 3}, 'timings': {'select': 0.1, 'update': 0.4}, 'seconds': 0.5},
+        ], 'check_subscription_notifications')
+        self.assertEqual(summary['counts'], {'deactivated': 5})
+        self.assertEqual(summary['timings'], {'select': 0.2, 'update': 0.4})
+        self.assertEqual(summary['max_shard_seconds'], 0.5)
+
+
+# ----------------------------
+# Denormalized owner (notifications/models.py)
+# ----------------------------
+class SubscriptionOwnerTests(TestCase):
+    def setUp(self):
+        self.owners = [User.objects.create_user(f'tenant{i}', f'tenant{i}@example.com', role='admin')
+                       for i in range(2)]
+        self.plans = [
+            Plan.objects.create(category=Category.objects.create(name=f'Tenant {i}', created_by=owner),
+                                name=f'Tenant {i} Basic', duration='monthly', price=Decimal('10'))
+            for i, owner in enumerate(self.owners)
+        ]
+        customer = User.objects.create_user('switcher', 'switcher@example.com')
+        self.sub = Subscription.objects.create(customer=customer, plan=self.plans[0],
+                                               start_date=timezone.localdate())
+        self.payment = Payment.objects.create(subscription=self.sub, transaction_id='txn-move', amount=Decimal('10'))
+
+    def assertOwnedBy(self, owner):
+        self.assertEqual(Subscription.objects.get(pk=self.sub.pk).owner_id, owner.pk)
+        self.assertEqual(Payment.objects.get(pk=self.payment.pk).owner_id, owner.pk)
+
+    def test_owner_is_derived_from_the_plan(self):
+        self.assertOwnedBy(self.owners[0])
+        self.assertEqual(Subscription.objects.for_owner(self.owners[1]).count(), 0)
+
+    def test_moving_to_another_owners_plan(self):
+        sub = Subscription.objects.get(pk=self.sub.pk)
+        sub.plan = self.plans[1]
+        sub.save()
+        self.assertOwnedBy(self.owners[1])
+
+    def test_moving_with_update_fields_persists_the_owner(self):
+        sub = Subscription.objects.get(pk=self.sub.pk)
+        sub.plan = self.plans[1]
+        sub.save(update_fields=['plan'])
+        self.assertOwnedBy(self.owners[1])
+
+    def test_update_fields_without_the_plan_leave_the_owner(self):
+        sub = Subscription.objects.get(pk=self.sub.pk)
+        sub.plan = self.plans[1]
+        sub.save(update_fields=['address'])
+        self.assertOwnedBy(self.owners[0])
+
+
+# ----------------------------
+# Delivery channels (notifications/channels.py)
+# ----------------------------
+@override_settings(PROVIDER_RATE_LIMITS={}, MSG91_AUTH_KEY=None, TWILIO_ACCOUNT_SID='AC1', TWILIO_AUTH_TOKEN='token',
+                   TWILIO_PHONE_NUMBER='+15550000', TWILIO_COUNTRY='44', MSG91_COUNTRY='91')
+class ChannelRoutingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('texter', 'texter@example.com', mobile_number='7700900123',
+                                             notification_channels=['msg91', 'twilio', 'email'])
+        self.notification = Notification.objects.create(
+            title='Renewal', details='Renews tomorrow', type='Subscription',
+            recipient=self.user.email, recipient_user=self.user,
+        )
+
+    def test_unconfigured_channels_are_skipped(self):
+        self.assertEqual([c.name for c in channels.channels_for(self.notification)], ['twilio', 'email'])
+
+    def test_twilio_prefixes_its_own_country(self):
+        self.assertEqual(channels.CHANNELS['twilio'].address(self.notification), '+447700900123')
+
+    def test_failed_channel_falls_back_to_the_next(self):
+        texted = {"success": False, "error": "503", "error_class": "transient", "code": None}
+        mailed = [{"success": True, "provider_message_id": "mail-1"}]
+        with mock.patch.object(channels.CHANNELS['twilio'], 'send_text', return_value=texted) as text, \
+                mock.patch('notifications.channels.send_email_batch', return_value=mailed):
+            result = channels.deliver([self.notification])[0]
+
+        text.assert_called_once_with('+447700900123', mock.ANY)
+        self.assertEqual((result['success'], result['channel']), (True, 'email'))
+
+
+# ----------------------------
+# Dashboard cache (notifications/cache.py)
+# ----------------------------
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('cached', 'cached@example.com', role='admin')
+        plan = Plan.objects.create(category=Category.objects.create(name='Cached', created_by=self.owner),
+                                   name='Cached Basic', duration='monthly', price=Decimal('10'))
+        self.customer = User.objects.create_user('reader', 'reader@example.com')
+        self.sub = Subscription.objects.create(customer=self.customer, plan=plan, start_date=timezone.localdate())
+        self.key = admin_dashboard_key(self.owner.pk)
+
+    def test_hit_skips_the_builder(self):
+        builder = mock.Mock(return_value={'mrr': 10})
+        get_or_compute(self.key, builder)
+        self.assertEqual(get_or_compute(self.key, builder), {'mrr': 10})
+        builder.assert_called_once()
+
+    def test_payment_invalidates_owner_and_customer_dashboards(self):
+        customer_key = customer_dashboard_key(self.customer.pk)
+        get_or_compute(self.key, dict)
+        get_or_compute(customer_key, dict)
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(subscription=self.sub, transaction_id='txn-cache', amount=Decimal('10'))
+        self.assertIsNone(cache.get(self.key))
+        self.assertIsNone(cache.get(customer_key))
+
+    def test_recompute_racing_an_invalidation_is_not_stored(self):
+        def builder():
+            invalidate(self.key)
+            return {'mrr': 'stale'}
+
+        self.assertEqual(get_or_compute(self.key, builder), {'mrr': 'stale'})
+        self.assertIsNone(cache.get(self.key))
+
+
+# ----------------------------
+# Dashboard KPIs (notifications/metrics.py)
+# ----------------------------
+class DashboardMetricsTests(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        started = today - timedelta(days=60)
+        self.owner = User.objects.create_user('kpi-admin', 'kpi-admin@example.com', role='admin')
+        plan = Plan.objects.create(category=Category.objects.create(name='KPI', created_by=self.owner),
+                                   name='KPI Basic', duration='monthly', price=Decimal('10'))
+        customers = []
+        for name, city in (('kpi-a', 'Kochi'), ('kpi-b', 'Pune'), ('kpi-c', 'Kochi')):
+            customer = User.objects.create_user(name, f'{name}@example.com')
+            CustomerProfile.objects.create(user=customer, state='Kerala', city=city)
+            customers.append(customer)
+
+        for i, customer in enumerate(customers[:2]):
+            sub = Subscription.objects.create(customer=customer, plan=plan, start_date=started,
+                                              subscription_status='Active', is_active=True)
+            Payment.objects.create(subscription=sub, transaction_id=f'kpi-{i}', amount=Decimal('30'))
+        Subscription.objects.create(customer=customers[2], plan=plan, start_date=started,
+                                    end_date=today - timedelta(days=5), subscription_status='Inactive')
+        Subscription.objects.create(customer=customers[0], plan=plan, start_date=today,
+                                    subscription_status='Active', is_active=True)
+
+        # another tenant's subscription must stay out of the scoped KPIs
+        other = User.objects.create_user('kpi-other', 'kpi-other@example.com', role='admin')
+        other_plan = Plan.objects.create(category=Category.objects.create(name='Other', created_by=other),
+                                         name='Other Basic', duration='monthly', price=Decimal('99'))
+        Subscription.objects.create(customer=customers[1], plan=other_plan, start_date=today,
+                                    subscription_status='Active', is_active=True)
+
+    def test_owner_scoped_kpis(self):
+        kpis = metrics.compute_dashboard_metrics(self.owner)
+        self.assertEqual((kpis.active_subscriptions, kpis.new_subscriptions, kpis.total_plans), (3, 1, 1))
+        self.assertEqual((kpis.total_revenue, kpis.arpu, kpis.mrr), (60.0, 30.0, 30.0))
+        self.assertEqual(kpis.churn_rate, 33.33)
+
+    def test_top_location_counts_subscriptions(self):
+        kpis = metrics.compute_dashboard_metrics(self.owner)
+        self.assertEqual((kpis.top_location, kpis.top_location_ratio), ('Kochi', 75.0))
+
+    def test_unscoped_kpis_include_every_owner(self):
+        kpis = metrics.compute_dashboard_metrics()
+        self.assertEqual((kpis.active_subscriptions, kpis.total_plans, kpis.mrr), (4, 2, 129.0))
+
+
+# ----------------------------
+# Location analytics (notifications/metrics.py, views.location_analytics)
+# ----------------------------
+class LocationAnalyticsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('geo-admin', 'geo-admin@example.com', role='admin')
+        plan = Plan.objects.create(category=Category.objects.create(name='Geo', created_by=self.owner),
+                                   name='Geo Basic', duration='monthly', price=Decimal('10'))
+        places = [('Kerala', 'Ernakulam', 'Kochi'), ('Kerala', 'Ernakulam', 'Aluva'),
+                  ('Kerala', 'Thrissur', 'Thrissur'), ('Goa', 'North Goa', 'Panaji')]
+        for i, (state, district, city) in enumerate(places):
+            customer = User.objects.create_user(f'geo-{i}', f'geo-{i}@example.com')
+            CustomerProfile.objects.create(user=customer, state=state, district=district, city=city)
+            Subscription.objects.create(customer=customer, plan=plan, start_date=timezone.localdate())
+
+    def test_breakdown_groups_by_level(self):
+        rows = metrics.location_breakdown(self.owner, 'state')
+        self.assertEqual([(r['location'], r['subscriptions'], r['ratio']) for r in rows],
+                         [('Kerala', 3, 75.0), ('Goa', 1, 25.0)])
+
+    def test_drill_down_filters_by_parent_levels(self):
+        rows = metrics.location_breakdown(self.owner, 'city', state='Kerala', district='Ernakulam')
+        self.assertEqual([r['location'] for r in rows], ['Aluva', 'Kochi'])
+        with self.assertRaises(ValueError):
+            metrics.location_breakdown(self.owner, 'state', city='Kochi')
+
+    def test_view_is_admin_only(self):
+        request = RequestFactory().get('/dashboard/locations/', {'level': 'district', 'state': 'Kerala'})
+        request.user = self.owner
+        body = json.loads(views.location_analytics(request).content)
+        self.assertEqual([r['location'] for r in body['results']], ['Ernakulam', 'Thrissur'])
+
+        request.user = User.objects.get(username='geo-0')
+        self.assertEqual(views.location_analytics(request).status_code, 403)
+
+
+# ----------------------------
+# Subscription job shards (notifications/jobs.py)
+# ----------------------------
+class JobShardTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('shard-admin', 'shard-admin@example.com', role='admin')
+        plan = Plan.objects.create(category=Category.objects.create(name='Shards', created_by=owner),
+                                   name='Shards Basic', duration='monthly', price=Decimal('10'))
+        customers = [User.objects.create_user(f'sharded{i}', f'sharded{i}@example.com') for i in range(3)]
+        for i in range(7):
+            Subscription.objects.create(customer=customers[i % 3], plan=plan, start_date=timezone.localdate())
+        self.ids = set(Subscription.objects.values_list('pk', flat=True))
+
+    def covered(self, shards):
+        return [set(jobs.shard_queryset(shard).values_list('pk', flat=True)) for shard in shards]
+
+    def test_shards_partition_the_table(self):
+        for mode in ('range', 'hash'):
+            with self.subTest(mode=mode):
+                parts = self.covered(jobs.plan_shards(3, mode))
+                self.assertEqual(len(parts), 3)
+                self.assertEqual(sum(len(p) for p in parts), len(self.ids))
+                self.assertEqual(set().union(*parts), self.ids)
+
+    def test_hash_shards_keep_a_customer_together(self):
+        for part in self.covered(jobs.plan_shards(2, 'hash')):
+            customers = Subscription.objects.filter(pk__in=part).values('customer')
+            spans = set(Subscription.objects.filter(customer__in=customers).values_list('pk', flat=True))
+            self.assertEqual(spans, part)
+
+    def test_range_shards_of_an_empty_table(self):
+        Subscription.objects.all().delete()
+        self.assertEqual(jobs.plan_shards(4, 'range'), [])
+
+
+# ----------------------------
+# Job leases (notifications/locks.py)
+# ----------------------------
+@override_settings(JOB_LEASE_TTL_SECONDS=600)
+class JobLeaseTests(TestCase):
+    def expire(self, name, **extra):
+        JobLease.objects.filter(name=name).update(expires_at=timezone.now() - timedelta(seconds=1), **extra)
+
+    def test_one_holder_at_a_time(self):
+        self.assertIsNotNone(locks.acquire_lease('job:1', holder='a'))
+        self.assertIsNone(locks.acquire_lease('job:1', holder='b'))
+
+    def test_expired_lease_is_taken_over_unless_completed(self):
+        locks.acquire_lease('crashed', holder='a')
+        self.expire('crashed')
+        self.assertEqual(locks.acquire_lease('crashed', holder='b'), 'b')
+        self.assertFalse(locks.heartbeat('crashed', 'a'))
+
+        locks.acquire_lease('done', holder='a')
+        locks.release_lease('done', 'a')
+        self.expire('done')
+        self.assertIsNone(locks.acquire_lease('done', holder='b'))
+
+    def test_singleton_task_runs_once_per_period(self):
+        calls = []
+
+        @locks.singleton_task(period='daily')
+        def nightly():
+            calls.append(1)
+            return {'status': 'ok'}
+
+        self.assertEqual(nightly(), {'status': 'ok'})
+        with self.assertLogs('notifications.locks', 'INFO'):
+            self.assertEqual(nightly()['status'], 'skipped')
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_run_can_be_retried(self):
+        attempts = []
+
+        @locks.singleton_task(period='daily')
+        def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError('boom')
+            return 'ok'
+
+        with self.assertRaises(RuntimeError):
+            flaky()
+        self.assertEqual(flaky(), 'ok')
+
+    def test_prune_keeps_recent_leases(self):
+        locks.acquire_lease('old', holder='a')
+        locks.acquire_lease('recent', holder='a')
+        JobLease.objects.filter(name='old').update(expires_at=timezone.now() - timedelta(days=3))
+        self.assertEqual(locks.prune_leases(), 1)
+        self.assertEqual(list(JobLease.objects.values_list('name', flat=True)), ['recent'])
+
+
+# ----------------------------
+# Broadcast fan-out (tasks.start_broadcast, views.broadcast_status)
+# ----------------------------
+@override_settings(NOTIFICATION_DELIVERY='celery', NOTIFICATION_BATCH_SIZE=2, PROVIDER_RATE_LIMITS={})
+class BroadcastTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('broadcaster', 'broadcaster@example.com', role='admin')
+        for i in range(5):
+            User.objects.create_user(f'audience{i}', f'audience{i}@example.com', role='customer')
+        self.broadcast = Broadcast.objects.create(title='Maintenance', details='Down at midnight',
+                                                  type='Subscription', created_by=self.admin)
+
+    def mailed(self, messages, connection=None):
+        return [{"success": True, "provider_message_id": f"mail-{i}"} for i in range(len(messages))]
+
+    def run_broadcast(self):
+        with mock.patch('notifications.channels.send_email_batch', side_effect=self.mailed), \
+                mock.patch.object(tasks.send_notification_batch, 'delay', side_effect=tasks.send_notification_batch):
+            result = tasks.start_broadcast(self.broadcast.pk)
+        self.broadcast.refresh_from_db()
+        return result
+
+    def test_fan_out_sends_every_customer_and_completes(self):
+        self.assertEqual(self.run_broadcast()['chunks'], 3)
+        self.assertEqual(self.broadcast.status, 'completed')
+        self.assertEqual((self.broadcast.total_recipients, self.broadcast.sent_count), (5, 5))
+        self.assertEqual(self.broadcast.progress, 100.0)
+        self.assertEqual(self.broadcast.notifications.filter(status='sent').count(), 5)
+
+    def test_chunks_skip_customers_that_already_have_the_message(self):
+        Notification.objects.create(title='Maintenance', details='Down at midnight', type='Subscription',
+                                    recipient='audience0@example.com',
+                                    recipient_user=User.objects.get(username='audience0'))
+        with mock.patch.object(tasks.send_notification_batch, 'delay') as delay:
+            tasks.start_broadcast(self.broadcast.pk)
+        self.broadcast.refresh_from_db()
+
+        self.assertEqual([len(c.args[0]) for c in delay.call_args_list], [1, 2, 1])
+        self.assertEqual((self.broadcast.created_count, self.broadcast.skipped_count), (4, 1))
+        self.assertEqual(self.broadcast.status, 'running')
+        self.assertEqual(self.broadcast.notifications.filter(status='pending').count(), 4)
+
+    def test_broken_template_fails_before_any_rows(self):
+        self.broadcast.template = NotificationTemplate.objects.create(
+            name='broken', subject='{% if %}', body_text='Hi')
+        self.broadcast.save()
+        with self.assertRaises(TemplateSyntaxError):
+            tasks.start_broadcast(self.broadcast.pk)
+        self.broadcast.refresh_from_db()
+        self.assertEqual(self.broadcast.status, 'failed')
+        self.assertFalse(self.broadcast.notifications.exists())
+
+    def test_status_is_visible_to_its_creator_only(self):
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        self.assertEqual(json.loads(views.broadcast_status(request, self.broadcast.pk).content)['status'], 'queued')
+
+        request.user = User.objects.create_user('snoop', 'snoop@example.com', role='admin')
+        with self.assertRaises(Http404):
+            views.broadcast_status(request, self.broadcast.pk)
+
+
+# ----------------------------
+# Batched SMTP sends (notifications/providers_email.py)
+# ----------------------------
+class EmailBatchTests(TestCase):
+    def setUp(self):
+        self.messages = [build_email(f'reader{i}@example.com', 'Hello', body_text='Hi') for i in range(3)]
+        self.conn = mock.Mock()
+        self.conn.send_messages.return_value = 1
+
+    def test_batch_shares_one_connection(self):
+        results = send_email_batch(self.messages, connection=self.conn)
+        self.assertEqual(results, [{"success": True}] * 3)
+        self.conn.open.assert_called_once()
+        self.assertEqual(self.conn.send_messages.call_count, 3)
+        self.conn.close.assert_called_once()
+
+    def test_dropped_connection_is_reopened_and_retried_once(self):
+        self.conn.send_messages.side_effect = [smtplib.SMTPServerDisconnected('gone'), 1,
+                                               smtplib.SMTPServerDisconnected('gone'),
+                                               smtplib.SMTPServerDisconnected('gone again'), 1]
+        results = send_email_batch(self.messages, connection=self.conn)
+        self.assertEqual([r['success'] for r in results], [True, False, True])
+        self.assertEqual(results[1]['error_class'], 'transient')
+        self.assertEqual(self.conn.open.call_count, 3)
+
+    def test_smtp_replies_are_classified(self):
+        self.conn.send_messages.side_effect = [smtplib.SMTPResponseException(451, 'later'),
+                                               smtplib.SMTPResponseException(550, 'no such user'), 1]
+        results = send_email_batch(self.messages, connection=self.conn)
+        self.assertEqual([(r.get('error_class'), r.get('code')) for r in results],
+                         [('transient', 451), ('permanent', 550), (None, None)])
+
+
+# ----------------------------
+# Content-hash dedup (notifications/models.py)
+# ----------------------------
+class ContentHashTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('hashed', 'hashed@example.com')
+        self.notification = Notification.objects.create(
+            title='Plan renewed', details='See you next month', type='Subscription',
+            recipient=' Hashed@Example.COM ', recipient_user=self.user,
+        )
+
+    def test_save_and_bulk_create_store_hash_and_lowercase_recipient(self):
+        [bulk] = Notification.objects.bulk_create([Notification(
+            title='Plan renewed', details='See you next month', type='Subscription', recipient='HASHED@example.com',
+        )])
+        for row in (self.notification, bulk):
+            row.refresh_from_db()
+            self.assertEqual(row.recipient, 'hashed@example.com')
+            self.assertEqual(row.content_hash,
+                             notification_content_hash('Plan renewed', 'See you next month', 'Subscription'))
+
+    def test_lookup_matches_exact_content_only(self):
+        self.assertEqual(list(Notification.objects.with_content('Plan renewed', 'See you next month',
+                                                                'Subscription')), [self.notification])
+        self.assertFalse(Notification.objects.with_content('Plan renewed', 'See you next month', 'Payment').exists())
+        other = User.objects.create_user('unhashed', 'unhashed@example.com')
+        self.assertEqual(Notification.objects.users_with_content(
+            'Plan renewed', 'See you next month', 'Subscription', [self.user.pk, other.pk]), {self.user.pk})
+
+    def test_update_fields_refresh_the_hash(self):
+        self.notification.details = 'See you next year'
+        self.notification.save(update_fields=['details'])
+        self.assertTrue(Notification.objects.with_content('Plan renewed', 'See you next year',
+                                                          'Subscription').exists())
+
+
+# ----------------------------
+# Retention archive / prune (notifications/retention.py)
+# ----------------------------
+class RetentionTests(TestCase):
+    def setUp(self):
+        archive = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive)
+        self.archive = Path(archive)
+        override = override_settings(NOTIFICATION_ARCHIVE_DIR=self.archive)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        old = timezone.now() - timedelta(days=40)
+        self.old = Notification.objects.bulk_create([
+            Notification(title='Old', details=f'Old #{i}', type='Payment', recipient='old@example.com',
+                         date_sent=old, status='sent')
+            for i in range(5)
+        ])
+        self.claimed = Notification.objects.create(title='Old', details='In flight', type='Payment',
+                                                   recipient='old@example.com', date_sent=old, status='sending')
+        self.recent = Notification.objects.create(title='New', details='Recent', type='Payment',
+                                                  recipient='new@example.com')
+        Alert.objects.create(category='Subscription', subject='Old alert', message='Gone', date_sent=old)
+
+    def archived(self, label):
+        rows = []
+        for path in sorted(self.archive.glob(f'{label}/*/*.jsonl.gz')):
+            with gzip.open(path, 'rt', encoding='utf-8') as fh:
+                rows += [json.loads(line) for line in fh]
+        return rows
+
+    def test_old_rows_are_archived_in_chunks_then_deleted(self):
+        self.assertEqual(prune_old_rows(retention_days=30, chunk_size=2), {'notification': 5, 'alert': 1})
+        self.assertEqual(sorted(r['id'] for r in self.archived('notification')), sorted(n.pk for n in self.old))
+        self.assertEqual(len(list(self.archive.glob('notification/*/*.jsonl.gz'))), 3)
+        self.assertEqual([a['subject'] for a in self.archived('alert')], ['Old alert'])
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {self.claimed.pk, self.recent.pk})
+
+    def test_rerun_is_a_no_op(self):
+        prune_old_rows(retention_days=30, chunk_size=2)
+        self.assertEqual(prune_old_rows(retention_days=30, chunk_size=2), {'notification': 0, 'alert': 0})
+        self.assertEqual(len(self.archived('notification')), 5)
+
+    def test_without_archive_nothing_is_written(self):
+        prune_old_rows(retention_days=30, archive=False)
+        self.assertEqual(list(self.archive.iterdir()), [])
+
+
+# ----------------------------
+# MSG91 multi-recipient calls (notifications/channels.py)
+# ----------------------------
+@override_settings(MSG91_AUTH_KEY='key', MSG91_BATCH_SIZE=3)
+class MSG91BatchTests(TestCase):
+    def setUp(self):
+        self.channel = channels.MSG91Channel()
+        self.notifications = [
+            Notification(title='Renewal', details=details, type='Subscription',
+                         recipient_user=User(username=f'sms{i}', mobile_number=f'90000000{i:02d}'))
+            for i, details in enumerate(['Tomorrow'] * 4 + ['Today'])
+        ]
+
+    def test_identical_texts_share_an_entry_up_to_the_batch_size(self):
+        calls = list(self.channel.pack(self.notifications))
+        self.assertEqual([indexes for _, indexes in calls], [[0, 1, 2], [3, 4]])
+        self.assertEqual(calls[0][0], [{'message': 'Renewal: Tomorrow',
+                                        'to': ['9000000000', '9000000001', '9000000002']}])
+        self.assertEqual([entry['message'] for entry in calls[1][0]], ['Renewal: Tomorrow', 'Renewal: Today'])
+
+    def test_recipients_share_their_calls_outcome(self):
+        outcomes = [{"success": True, "provider_message_id": "req-1"}, channels.http_failure(None, status=503)]
+        with mock.patch.object(self.channel, '_post', side_effect=outcomes) as post:
+            results = self.channel.send_batch(self.notifications)
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual([r['success'] for r in results], [True, True, True, False, False])
+        self.assertEqual(results[3]['error_class'], 'transient')
+
+
+# ----------------------------
+# Notification templates (notifications/templating.py)
+# ----------------------------
+class TemplatingTests(TestCase):
+    def setUp(self):
+        self.template = NotificationTemplate.objects.create(
+            name='renewal', subject='Hi {{ username }},\n your {{ plan }} renews', body_text='{{ plan }} & more',
+            body_html='<p class="lead">Hi <b>{{ username }}</b></p>',
+            css='.lead { color: red } b { font-weight: 700 }',
+            variables=['username', 'plan'],
+        )
+
+    def test_renders_subject_text_and_inlined_html(self):
+        subject, text, html = compile_template(self.template).render({'username': '<Ann>', 'plan': 'Gold'})
+        self.assertEqual(subject, 'Hi <Ann>, your Gold renews')
+        self.assertEqual(text, 'Gold & more')
+        self.assertEqual(html, '<p class="lead" style="color: red">'
+                               'Hi <b style="font-weight: 700">&lt;Ann&gt;</b></p>')
+
+    def test_compiled_once_per_version(self):
+        self.assertIs(compile_template(self.template), compile_template(self.template))
+        self.template.subject = 'Changed'
+        self.template.save()
+        self.assertEqual(compile_template(self.template).render({})[0], 'Changed')
+
+    def test_recipient_context_keeps_declared_variables_only(self):
+        user = User(username='ann', email='ann@example.com')
+        context = recipient_context(self.template, user, {'plan': 'Gold', 'coupon': 'X1'})
+        self.assertEqual(context, {'username': 'ann', 'plan': 'Gold'})
+
+    def test_notification_renders_from_its_stored_context(self):
+        notification = Notification(title='ignored', type='Subscription', template=self.template,
+                                    context={'username': 'ann', 'plan': 'Gold'})
+        self.assertEqual(render_notification(notification)[0], 'Hi ann, your Gold renews')
+
+
+# ----------------------------
+# Full-text search (notifications/search.py)
+# ----------------------------
+class SearchTests(TestCase):
+    def setUp(self):
+        self.invoice = Notification.objects.create(title='Invoice ready', details='Your invoice for March',
+                                                   type='Payment', recipient='a@example.com')
+        self.renewal = Notification.objects.create(title='Renewal', details='Plan renews with an invoice',
+                                                   type='Subscription', recipient='b@example.com')
+        owner = User.objects.create_user('search-admin', 'search-admin@example.com', role='admin')
+        self.plan = Plan.objects.create(category=Category.objects.create(name='Search', created_by=owner),
+                                        name='Platinum', duration='monthly', price=Decimal('10'))
+        sub = Subscription.objects.create(customer=User.objects.create_user('meera', 'meera@example.com'),
+                                          plan=self.plan, start_date=timezone.localdate())
+        self.payment = Payment.objects.create(subscription=sub, transaction_id='TXN9001', amount=Decimal('10'))
+
+    def test_words_match_as_prefixes_best_first(self):
+        self.assertEqual(search_notifications('invo'), [self.invoice, self.renewal])
+        self.assertEqual(search_notifications('invoice march'), [self.invoice])
+        # FTS syntax is stripped and operator words must match like any other word
+        self.assertEqual(search_notifications('"invoice*) ('), [self.invoice, self.renewal])
+        self.assertEqual(search_notifications('invoice OR renewal'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.renewal.details = 'Plan renews tomorrow'
+        self.renewal.save()
+        self.invoice.delete()
+        self.assertEqual(search_notifications('invoice'), [])
+        self.assertEqual(search_notifications('tomorrow'), [self.renewal])
+
+    def test_payments_match_transaction_customer_and_plan(self):
+        for query in ('txn9', 'meer', 'plat'):
+            with self.subTest(query=query):
+                self.assertEqual(list(filter_payments(Payment.objects.all(), query)), [self.payment])
+
+        self.plan.name = 'Gold'
+        self.plan.save()
+        self.assertFalse(filter_payments(Payment.objects.all(), 'platinum').exists())
+        self.assertTrue(filter_payments(Payment.objects.all(), 'gold').exists())
+
+
+# ----------------------------
+# Plan list by final price (Plan.objects.with_effective_price, views.plan_list)
+# ----------------------------
+class PlanPriceListTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.admin = User.objects.create_user('pricer', 'pricer@example.com', role='admin')
+        category = Category.objects.create(name='Pricing', created_by=self.admin)
+        self.cheap = Plan.objects.create(category=category, name='Cheap', duration='monthly', price=Decimal('50'))
+        # list price 200, but 60% off right now
+        self.sale = Plan.objects.create(
+            category=category, name='Sale', duration='monthly', price=Decimal('200'), discount_percent=Decimal('60'),
+            discount_activated_date=now - timedelta(days=1), discount_deactivated_date=now + timedelta(days=1),
+        )
+        self.premium = Plan.objects.create(category=category, name='Premium', duration='monthly',
+                                           price=Decimal('100'))
+        other = User.objects.create_user('rival', 'rival@example.com', role='admin')
+        Plan.objects.create(category=Category.objects.create(name='Rival', created_by=other), name='Rival',
+                            duration='monthly', price=Decimal('1'))
+        self.client.force_login(self.admin)
+
+    def test_annotation_matches_stored_price(self):
+        for plan in Plan.objects.with_effective_price():
+            self.assertEqual(plan.final_price, Plan.objects.get(pk=plan.pk).current_price)
+        sale = Plan.objects.with_effective_price().get(pk=self.sale.pk)
+        self.assertEqual((sale.final_price, sale.discount_status), (Decimal('80.00'), 'active'))
+
+    def test_sorted_and_filtered_by_final_price(self):
+        response = self.client.get(reverse('plan_list'), {'sort_by': 'final_price', 'min_price': '60'})
+        self.assertEqual([p.name for p in response.context['plans']], ['Sale', 'Premium'])
+        self.assertEqual(response.context['price_stats']['discounted'], 1)
+
+        response = self.client.get(reverse('plan_list'), {'sort_by': 'final_price', 'max_price': 'nan'})
+        self.assertEqual([p.name for p in response.context['plans']], ['Cheap', 'Sale', 'Premium'])
+
+
+# ----------------------------
+# Stored discount prices (notifications/discounts.py)
+# ----------------------------
+@override_settings(DISCOUNT_SCHEDULE_HORIZON_SECONDS=900, DISCOUNT_SWEEP_SECONDS=300)
+class DiscountWindowTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        owner = User.objects.create_user('discounter', 'discounter@example.com', role='admin')
+        self.plan = Plan.objects.create(category=Category.objects.create(name='Deals', created_by=owner),
+                                        name='Deal', duration='monthly', price=Decimal('100'),
+                                        discount_percent=Decimal('25'))
+
+    def open_window(self, start, end):
+        # queryset.update() bypasses save(), leaving the stored price stale
+        Plan.objects.filter(pk=self.plan.pk).update(discount_activated_date=start, discount_deactivated_date=end)
+        self.plan.refresh_from_db()
+
+    def test_refresh_stores_stale_prices_once(self):
+        self.open_window(self.now - timedelta(minutes=1), self.now + timedelta(days=1))
+        self.assertEqual(discounts.refresh_prices(now=self.now), [self.plan.pk])
+        self.plan.refresh_from_db()
+        self.assertEqual((self.plan.current_price, self.plan.discount_applied), (Decimal('75.00'), True))
+        self.assertEqual(discounts.refresh_prices(now=self.now), [])
+
+        later = self.now + timedelta(days=2)
+        self.assertEqual(discounts.refresh_prices(now=later), [])
+        self.plan.refresh_from_db()
+        self.assertEqual((self.plan.current_price, self.plan.discount_applied), (Decimal('100.00'), False))
+
+    def test_each_boundary_is_scheduled_by_one_sweep(self):
+        self.open_window(self.now + timedelta(seconds=700), self.now + timedelta(seconds=1100))
+        start, within = discounts.sweep_window(self.now)
+        self.assertEqual(start, self.now + timedelta(seconds=600))
+        self.assertEqual(discounts.boundaries(self.plan, self.now, within, start),
+                         [self.plan.discount_activated_date])
+        self.assertEqual(list(discounts.upcoming(self.now, within, start)), [self.plan])
+
+        # the next sweep has moved past the activation and reaches the deactivation
+        later = self.now + timedelta(seconds=300)
+        self.assertEqual(discounts.boundaries(self.plan, later, within, discounts.sweep_window(later)[0]),
+                         [self.plan.discount_deactivated_date + discounts.AFTER_WINDOW])
+
+    def test_window_is_announced_once(self):
+        self.open_window(self.now - timedelta(minutes=1), self.now + timedelta(days=1))
+        self.assertEqual(discounts.claim_announcement(self.plan.pk, self.now), self.plan)
+        self.assertIsNone(discounts.claim_announcement(self.plan.pk, self.now))
+
+        # a new window may be announced again
+        self.open_window(self.now + timedelta(minutes=1), self.now + timedelta(days=1))
+        self.assertIsNotNone(discounts.claim_announcement(self.plan.pk, self.now + timedelta(minutes=2)))
+
 
 # Create your tests here.
 from notifications.models import Subscription
@@ -40,6 +40,7 @@ urlpatterns = [
     # Dashboard
     # -----------------------------
     path('dashboard/', views.LKJH_view, name='LKJH'),
+    path('dashboard/locations/', views.location_analytics, name='location_analytics'),
 
     # -----------------------------
     # Notifications (Admin)
@@ -50,6 +51,7 @@ urlpatterns = [
     path('notifications/all/', views.all_notifications_view, name='notifications_list'),
     path('notifications/detail/<int:pk>/', views.notification_detail, name='detail'),
     path('notifications/search/', views.search_noti, name='search_noti'),
+    path('notifications/broadcasts/<int:pk>/', views.broadcast_status, name='broadcast_status'),
 
     # -----------------------------
     # Payments (Admin)
@@ -1,74 +1,70 @@
 # notifications/utils.py
-import time
+from datetime import timedelta
+
 from django.utils import timezone
-from django.conf import settings
-from .providers_email import send_email
+from . import channels
+from .retry import apply_failure
 from .models import Notification
 
-def send_and_update_notification(notification: Notification, pause_seconds: float = 0.0):
-    """
-    Send a Notification synchronously via email and update its DB fields.
-    This version is defensive: it only updates fields that actually exist on the model.
-    """
-    # Resolve recipient email
-    if getattr(notification, 'recipient_user', None):
-        recipient_email = notification.recipient_user.email
-    else:
-        recipient_email = notification.recipient
+UPDATE_FIELDS = ['status', 'meta', 'attempts', 'last_attempt_at', 'sent_at', 'next_attempt_at',
+                 'claim_token', 'claimed_at', 'provider', 'provider_message_id']
 
-    subject = notification.title or "Notification from SUBHUB"
-    template_name = getattr(notification, 'template', None)
-    context = getattr(notification, 'context', None) or {}
-    body_text = notification.details or ''
 
-    # Send email (synchronously)
-    result = send_email(recipient_email, subject,
-                        template_name=template_name,
-                        context=context,
-                        body_text=body_text)
-
-    # Update DB fields defensively
-    # increase attempts if exists
-    if hasattr(notification, 'attempts'):
-        notification.attempts = (notification.attempts or 0) + 1
-
-    # update last_attempt_at if present
-    if hasattr(notification, 'last_attempt_at'):
-        notification.last_attempt_at = timezone.now()
+def _apply_result(notification, result, now):
+    notification.claim_token = notification.claimed_at = None
+    if result.get("deferred"):
+        # every channel was over its rate limit: not an attempt, just try again later
+        notification.status = "retry"
+        notification.next_attempt_at = now + timedelta(seconds=result.get("retry_after") or 0)
+        return
 
+    notification.attempts = (notification.attempts or 0) + 1
+    notification.last_attempt_at = now
+    notification.provider = result.get("channel") or ''
     if result.get("success"):
-        if hasattr(notification, 'status'):
-            notification.status = "sent"
-        if hasattr(notification, 'sent_at'):
-            notification.sent_at = timezone.now()
-        # meta: write if field exists (JSONField or TextField)
-        if hasattr(notification, 'meta'):
-            notification.meta = {"sent_via": "email"}
-    else:
-        if hasattr(notification, 'status'):
-            notification.status = "failed"
-        if hasattr(notification, 'meta'):
-            notification.meta = {"error": result.get("error")}
-
-    # build update_fields list dynamically
-    update_fields = []
-    for f in ('status', 'meta', 'attempts', 'last_attempt_at', 'sent_at'):
-        if hasattr(notification, f):
-            update_fields.append(f)
-
-    if update_fields:
-        notification.save(update_fields=update_fields)
+        notification.status = "sent"
+        notification.sent_at = now
+        notification.next_attempt_at = None
+        notification.provider_message_id = result.get("provider_message_id")
+        meta = dict(notification.meta or {})
+        meta.pop("error", None)
+        meta.pop("error_class", None)
+        meta["sent_via"] = notification.provider or "email"
+        notification.meta = meta
     else:
-        # fallback if nothing in update_fields (shouldn't happen)
-        notification.save()
+        apply_failure(notification, result, now)
 
-    # optional pause to avoid hitting SMTP limits
-    if pause_seconds and pause_seconds > 0:
-        time.sleep(pause_seconds)
-
-    return result
 
+def send_notifications(notifications):
+    """
+    Deliver several Notifications through their recipients' channels (one
+    SMTP connection / pooled HTTP session per channel for the whole batch) and
+    persist the outcome of all of them with one bulk_update. Returns one result
+    dict per notification, in order.
+    """
+    notifications = list(notifications)
+    results = channels.deliver(notifications)
 
+    now = timezone.now()
+    for notification, result in zip(notifications, results):
+        _apply_result(notification, result, now)
+    if notifications:
+        Notification.objects.bulk_update(notifications, UPDATE_FIELDS)
+    return results
 
 
+def send_and_update_notification(notification: Notification):
+    """
+    Send a Notification synchronously through its channels and update its DB fields.
+    The row is claimed through the outbox first, like every other sender; if it
+    can't be claimed (another sender has it, or it was already sent or
+    dead-lettered) nothing is sent. If every channel is over its rate limit
+    the row goes to 'retry' with next_attempt_at set to when a token is expected.
+    """
+    from . import outbox
 
+    claimed = outbox.claim(1, ids=[notification.pk])
+    if not claimed:
+        return {"success": False, "in_flight": True,
+                "error": "Notification is already being sent or is no longer pending"}
+    return outbox.deliver(claimed)[0]
@@ -1,192 +1,32 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.mail import send_mail
-from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.generic import CreateView, ListView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.db.models import Sum, Count, Q
-from datetime import date
-from collections import Counter
-from django.utils import timezone
-from datetime import date, timedelta
-from .models import Notification, Alert, Plan, Subscription, User ,AdminProfile,CustomerProfile , Payment
+from django.http import JsonResponse
+from django.db.models import Avg, Count, Max, Min, Q
+from decimal import Decimal, InvalidOperation
+from .models import Notification, Plan, Subscription, User ,AdminProfile,CustomerProfile , Payment
 from .forms import SignUpForm, LoginForm, NotificationForm, PlanForm
+from . import metrics
+from .metrics import compute_dashboard_metrics
+from .cache import admin_dashboard_key, get_or_compute
 
 
-from twilio.rest import Client
-
-def _has_field(model, field_name):
-    """Return True if model has a field named field_name."""
-    try:
-        model._meta.get_field(field_name)
-        return True
-    except Exception:
-        return False
-
-# ----------------------------
-# Utility: return scoped Plan queryset (or None)
-# ----------------------------
-def _get_scoped_plans(owner):
-    """
-    Return a Plan queryset that belongs to `owner` via known ownership fields.
-    If owner is falsy -> return Plan.objects.all() (no scoping).
-    If no owner-like field exists on Category or Plan -> return None (indicates no scoping possible).
-    NOTE: This function intentionally does not try invalid lookups.
-    """
-    if not owner:
-        return Plan.objects.all()
-
-    # Preferred: Category.created_by -> Plan via category__created_by
-    if _has_field(Category, 'created_by'):
-        qs = Plan.objects.filter(category__created_by=owner)
-        return qs
-
-    # Alternative names on Category (if you used a different name)
-    for alt in ('owner', 'user', 'added_by', 'author'):
-        if _has_field(Category, alt):
-            lookup = f"category__{alt}"
-            qs = Plan.objects.filter(**{lookup: owner})
-            return qs
-
-    # Check Plan-level owner fields (only if field exists)
-    for pname in ('created_by', 'owner', 'user', 'added_by', 'author'):
-        if _has_field(Plan, pname):
-            qs = Plan.objects.filter(**{pname: owner})
-            return qs
-
-    # No owner-like field discovered — return None to indicate "no scoping available"
-    return None
-
 # ----------------------------
 # Helper wrappers
 # ----------------------------
 def _scoped_qs_for_owner(model_qs, owner):
     """
-    Given a base queryset (e.g., Payment.objects.all() or Subscription.objects.all()),
-    and an owner, attempt to scope it to owner's plans via subscription__plan__in(scoped_plans).
-    Returns:
-      - if owner falsy: original model_qs (no scoping)
-      - if scoped_plans is a queryset: model_qs filtered to that set
-      - if scoped_plans is None: None (caller should interpret as empty result / zero)
+    Scope a Payment or Subscription queryset to `owner` via the denormalized
+    owner column (TenantQuerySet.for_owner). If owner is falsy the queryset
+    is returned unscoped.
     """
     if not owner:
         return model_qs
-
-    scoped_plans = _get_scoped_plans(owner)
-    if scoped_plans is None:
-        return None
-
-    return model_qs.filter(subscription__plan__in=scoped_plans)
-
-# ----------------------------
-# 💰 Revenue & Subscription Metrics
-# ----------------------------
-
-def calculate_total_revenue(owner=None):
-    """
-    Total revenue from all payments (sum of Payment.amount).
-    If owner is provided, scope to owner's plans (via Category.created_by or Plan owner field).
-    If no scoping available, returns 0.
-    """
-    qs = Payment.objects.all()
-    scoped_qs = _scoped_qs_for_owner(qs, owner)
-    if scoped_qs is None:
-        return 0.0
-    total = scoped_qs.aggregate(total=Sum('amount'))['total']
-    return float(total or 0.0)
-
-
-def calculate_mrr(owner=None):
-    """
-    Monthly Recurring Revenue = sum of monthly-equivalent prices of active subscriptions.
-    Yearly plans are normalized to monthly by dividing price by 12.
-    If owner is provided and scoping is not possible, returns 0.
-    """
-    subs = Subscription.objects.filter(subscription_status='Active')
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0.0
-        subs = subs.filter(plan__in=scoped_plans)
-
-    total = 0.0
-    for s in subs.select_related('plan'):
-        price = float(s.plan.price or 0)
-        if s.plan.duration == 'monthly':
-            total += price
-        elif s.plan.duration == 'yearly':
-            total += price / 12.0
-        else:
-            total += price
-    return round(total, 2)
-
-
-def calculate_new_subscriptions(owner=None, days=30):
-    """
-    Number of new subscriptions started in the last `days`.
-    """
-    since = timezone.now().date() - timedelta(days=days)
-    subs = Subscription.objects.filter(start_date__gte=since)
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0
-        subs = subs.filter(plan__in=scoped_plans)
-    return subs.count()
-
-
-def calculate_arpu(owner=None):
-    """
-    ARPU = Total Revenue / Number of Active Customers (distinct customers with active subs).
-    Uses payments for revenue (calculate_total_revenue).
-    """
-    total_revenue = calculate_total_revenue(owner=owner)
-    subs = Subscription.objects.filter(subscription_status='Active')
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0.0
-        subs = subs.filter(plan__in=scoped_plans)
-
-    active_customers = subs.values('customer').distinct().count()
-    if active_customers == 0:
-        return 0.0
-    return round(total_revenue / active_customers, 2)
-
-
-def calculate_churn_rate(owner=None, days=30):
-    """
-    Churn Rate = (Inactive subscriptions during period) / (subscriptions at start of period) × 100.
-    This is a simple period-based churn estimate.
-    """
-    today = timezone.now().date()
-    start = today - timedelta(days=days)
-
-    subs_at_start = Subscription.objects.filter(start_date__lt=start)
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0.0
-        subs_at_start = subs_at_start.filter(plan__in=scoped_plans)
-    total_at_start = subs_at_start.count()
-
-    inactive_during = Subscription.objects.filter(
-        subscription_status='Inactive',
-        end_date__gte=start,
-        end_date__lte=today
-    )
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0.0
-        inactive_during = inactive_during.filter(plan__in=scoped_plans)
-
-    inactive_count = inactive_during.count()
-    if total_at_start == 0:
-        return 0.0
-    return round((inactive_count / total_at_start) * 100, 2)
+    return model_qs.for_owner(owner)
 
 # ----------------------------
 # 💳 Payment Method Analytics
@@ -197,19 +37,9 @@ def payment_method_percentage(method, owner=None):
     Percentage of payments using `method` among all payments (or owner's payments).
     Returns 0 if no payments exist or scoping not possible.
     """
-    base_qs = Payment.objects.filter(payment_method=method)
-    if owner:
-        scoped = _scoped_qs_for_owner(base_qs, owner)
-        if scoped is None:
-            return 0.0
-        method_count = scoped.count()
-        total = _scoped_qs_for_owner(Payment.objects.all(), owner)
-        if total is None:
-            return 0.0
-        total_count = total.count()
-    else:
-        method_count = base_qs.count()
-        total_count = Payment.objects.count()
+    qs = _scoped_qs_for_owner(Payment.objects.all(), owner)
+    counts = qs.aggregate(total=Count('id'), method=Count('id', filter=Q(payment_method=method)))
+    method_count, total_count = counts['method'], counts['total']
 
     if total_count == 0:
         return 0.0
@@ -224,110 +54,26 @@ def other_total(owner=None): return payment_method_percentage('other', owner)
 # 👥 Customer & Location Analytics
 # ----------------------------
 
-def active_total(owner=None):
-    qs = Subscription.objects.filter(subscription_status='Active')
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0
-        qs = qs.filter(plan__in=scoped_plans)
-    return qs.count()
-
-def top_performing(owner=None, top_n=1):
-    qs = Subscription.objects.all()
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return None if top_n == 1 else []
-        qs = qs.filter(plan__in=scoped_plans)
-
-    plan_counts = qs.values('plan__name').annotate(count=Count('id')).order_by('-count')
-    if not plan_counts:
-        return None if top_n == 1 else []
-    if top_n == 1:
-        return plan_counts[0]['plan__name']
-    return [p['plan__name'] for p in plan_counts[:top_n]]
-
-def locationbased(owner=None, n=1):
-    qs = Subscription.objects.all()
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return None, 0
-        qs = qs.filter(plan__in=scoped_plans)
-    total = qs.count()
-    if total == 0:
-        return None, 0
-    counter = Counter(sub.address for sub in qs if sub.address)
-    common = counter.most_common(n)
-    if not common:
-        return None, 0
-    loc, freq = common[n-1]
-    return loc, round((freq / total) * 100, 2)
-
-# ----------------------------
-# 📊 Revenue by Plan Type
-# ----------------------------
-
-def prem_total(owner=None):
-    price_obj = Plan.objects.filter(name__iexact='premium').first()
-    if not price_obj:
-        return 0.0
-    qs = Subscription.objects.filter(plan__name__iexact='premium')
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0.0
-        qs = qs.filter(plan__in=scoped_plans)
-    return round(qs.count() * float(price_obj.price), 2)
-
-def pro_total(owner=None):
-    price_obj = Plan.objects.filter(name__iexact='pro').first()
-    if not price_obj:
-        return 0.0
-    qs = Subscription.objects.filter(plan__name__iexact='pro')
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0.0
-        qs = qs.filter(plan__in=scoped_plans)
-    return round(qs.count() * float(price_obj.price), 2)
-
-def basic_total(owner=None):
-    price_obj = Plan.objects.filter(name__iexact='basic').first()
-    if not price_obj:
-        return 0.0
-    qs = Subscription.objects.filter(plan__name__iexact='basic')
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return 0.0
-        qs = qs.filter(plan__in=scoped_plans)
-    return round(qs.count() * float(price_obj.price), 2)
-
-# ----------------------------
-# 📅 Monthly Aggregations
-# ----------------------------
-
-def get_monthly_revenue(owner=None):
-    current_year = date.today().year
-    qs = Payment.objects.filter(payment_date__year=current_year)
-    if owner:
-        scoped = _scoped_qs_for_owner(qs, owner)
-        if scoped is None:
-            return []
-        qs = scoped
-    return qs.values('payment_date__month').annotate(total_revenue=Sum('amount')).order_by('payment_date__month')
-
-def get_monthly_subscriptions(owner=None):
-    current_year = date.today().year
-    qs = Subscription.objects.filter(start_date__year=current_year)
-    if owner:
-        scoped_plans = _get_scoped_plans(owner)
-        if scoped_plans is None:
-            return []
-        qs = qs.filter(plan__in=scoped_plans)
-    return qs.values('start_date__month').annotate(subscription_count=Count('id')).order_by('start_date__month')
+@login_required
+def location_analytics(request):
+    """
+    JSON drill-down over customer locations, e.g.
+    ?level=district&state=Kerala&top=5
+    Admins only, scoped to their own subscribers.
+    """
+    if getattr(request.user, 'role', None) != 'admin':
+        return JsonResponse({'ok': False, 'error': 'Admins only'}, status=403)
+    owner = request.user
+    level = request.GET.get('level', 'state')
+    parents = {
+        k: request.GET[k] for k in metrics.LOCATION_LEVELS if k in request.GET and k != level
+    }
+    try:
+        top_n = int(request.GET.get('top', 10))
+        rows = metrics.location_breakdown(owner, level, top_n=top_n, **parents)
+    except ValueError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    return JsonResponse({'ok': True, 'level': level, 'filters': parents, 'results': rows})
 
 
 def _admin_plan_queryset(user):
@@ -340,75 +86,47 @@ def _admin_plan_queryset(user):
     return Plan.objects.filter(category__created_by=user)
 
 
+def _admin_dashboard_context(owner):
+    """Build the (cacheable) dashboard context for `owner`, or globally when None."""
+    # All KPIs + chart series in one pass (see notifications/metrics.py)
+    dashboard = compute_dashboard_metrics(owner=owner)
+    months = list(range(1, 13))
+
+    # Recent transactions: scoped to admin's plans via plan.category.created_by
+    recent_transactions = Subscription.objects.filter(customer__role='customer')
+    if owner:
+        recent_transactions = recent_transactions.for_owner(owner)
+    recent_transactions = recent_transactions.select_related('customer', 'plan').order_by('-start_date')[:5]
+
+    return {
+        'total_revenue': dashboard.total_revenue,
+        'total_customers': dashboard.active_subscriptions,
+        'new_subscriptions': dashboard.new_subscriptions,
+        'churn_rate': dashboard.churn_rate,
+        'arpu': dashboard.arpu,
+        'mrr': dashboard.mrr,
+        'revenue_labels': months,
+        'revenue_data': dashboard.revenue_by_month,
+        'subscription_labels': months,
+        'subscription_data': dashboard.subscriptions_by_month,
+        'recent_transactions': list(recent_transactions),
+        'total_plans': dashboard.total_plans,
+        'location': dashboard.top_location,
+        'location_ratio': dashboard.top_location_ratio,
+    }
+
+
 @login_required
 def LKJH_view(request):
     user = request.user
     is_admin = getattr(user, 'role', None) == 'admin'
     owner = user if is_admin else None
 
-    # Use helper functions (they must accept owner=None|User)
-    total_revenue = calculate_total_revenue(owner=owner)
-    total_customers = active_total(owner=owner)
-    new_subscriptions = calculate_new_subscriptions(owner=owner)
-    churn_rate = calculate_churn_rate(owner=owner)
-    arpu = calculate_arpu(owner=owner)
-    mrr = calculate_mrr(owner=owner)
-
-    # Total plans: if admin scope by categories created by this admin
-    if is_admin:
-        plans_qs = _admin_plan_queryset(user)
-        total_plans = plans_qs.count()
-    else:
-        total_plans = Plan.objects.count()
-
-    # Monthly aggregations
-    monthly_revenue_qs = get_monthly_revenue(owner=owner)
-    monthly_subscriptions_qs = get_monthly_subscriptions(owner=owner)
-
-    months = range(1, 13)
-    revenue_data = [0.0] * 12
-    subscription_data = [0.0] * 12
-
-    # defensive extraction of month keys
-    for entry in monthly_revenue_qs:
-        month = entry.get('payment_date__month') or entry.get('start_date__month') or entry.get('month')
-        if month:
-            revenue_data[int(month) - 1] = float(entry.get('total_revenue') or 0)
-
-    for entry in monthly_subscriptions_qs:
-        month = entry.get('start_date__month') or entry.get('payment_date__month') or entry.get('month')
-        if month:
-            subscription_data[int(month) - 1] = float(entry.get('subscription_count') or 0)
-
-    # Recent transactions: scoped to admin's plans via plan.category.created_by
-    if is_admin:
-        plan_ids = list(_admin_plan_queryset(user).values_list('id', flat=True))
-        recent_transactions = Subscription.objects.filter(
-            plan__id__in=plan_ids,
-            customer__role='customer'
-        ).order_by('-start_date')[:5]
-    else:
-        recent_transactions = Subscription.objects.filter(customer__role='customer').order_by('-start_date')[:5]
-
-    # Location-based (helper accepts owner)
-    location, location_ratio = locationbased(owner=owner)
-
-    context = {
-        'total_revenue': total_revenue,
-        'total_customers': total_customers,
-        'new_subscriptions': new_subscriptions,
-        'churn_rate': churn_rate,
-        'arpu': arpu,
-        'mrr': mrr,
-        'revenue_labels': list(months),
-        'revenue_data': revenue_data,
-        'subscription_labels': list(months),
-        'subscription_data': subscription_data,
-        'recent_transactions': recent_transactions,
-        'total_plans': total_plans,
-        'location': location,
-        'location_ratio': location_ratio,
-    }
+    # Cached per owner; invalidated by notifications/signals.py
+    context = get_or_compute(
+        admin_dashboard_key(owner.pk if owner else None),
+        lambda: _admin_dashboard_context(owner),
+    )
     return render(request, 'dashboard/index.html', context)
 
 
@@ -477,62 +195,41 @@ def logout_view(request):
 # --------------------------
 
 from .filters import OrderFilter
+from .pagination import keyset_paginate
+from .search import filter_payments, search_notifications
+
+# sort_by option -> keyset ordering (always ending in the unique id)
+NOTIFICATION_ORDERINGS = {
+    'date_sent_desc': ('-date_sent', '-id'),
+    'date_sent_asc': ('date_sent', 'id'),
+    'type': ('type', '-date_sent', '-id'),
+    'title': ('title', 'id'),
+    'recipient': ('recipient', 'id'),
+}
+
+
+def _filtered_notifications(request):
+    """OrderFilter-ed notifications plus the keyset ordering for ?sort_by=."""
+    myFilter = OrderFilter(request.GET, queryset=Notification.objects.all())
+    sort_by = request.GET.get('sort_by', 'date_sent_desc')
+    if sort_by not in NOTIFICATION_ORDERINGS:
+        sort_by = 'date_sent_desc'
+    return myFilter, sort_by, NOTIFICATION_ORDERINGS[sort_by]
+
 
 def notifications_view(request):
-    notifications = Notification.objects.all()
-    alerts = Alert.objects.all()
-    myFilter = OrderFilter(request.GET, queryset=notifications)
-    notifications = myFilter.qs
-    sort_by = request.GET.get('sort_by', 'date_sent_desc')
-    
-    if sort_by == 'type':
-        notifications = notifications.order_by('type')
-    elif sort_by == 'title':
-        notifications = notifications.order_by('title')
-    elif sort_by == 'recipient':
-        notifications = notifications.order_by('recipient')
-    elif sort_by == 'date_sent_asc':
-        notifications = notifications.order_by('date_sent')
-    else:  # default is 'date_sent_desc'
-        notifications = notifications.order_by('-date_sent')
-    
+    myFilter, sort_by, ordering = _filtered_notifications(request)
+    page = keyset_paginate(myFilter.qs, request, ordering, per_page=25)
+
     context = {
-        'notifications': notifications,
-        'alerts': alerts,
+        'notifications': page,
+        'page': page,
         'myFilter': myFilter,
         'sort_by': sort_by,
     }
     return render(request, 'notifications/notifications.html', context)
 
 
-import requests
-from django.conf import settings
-
-def send_sms_via_msg91(phone, message):
-    """Send SMS using MSG91 transactional API"""
-    url = "https://api.msg91.com/api/v2/sendsms"
-    headers = {
-        'authkey': settings.MSG91_AUTH_KEY,
-        'Content-Type': 'application/json'
-    }
-    payload = {
-        "sender": settings.MSG91_SENDER_ID,
-        "route": settings.MSG91_ROUTE,
-        "country": settings.MSG91_COUNTRY,
-        "sms": [
-            {"message": message, "to": [phone]}
-        ]
-    }
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        return True
-    except Exception as e:
-        print(f"MSG91 error: {e}")
-        return False
-
-
-
 # notifications/views.py (snippet)
 from django.shortcuts import render, redirect
 from django.contrib import messages
@@ -546,14 +243,20 @@ from django.contrib import messages
 from .forms import NotificationForm
 from .models import Notification, User
 from .utils import send_and_update_notification
+from . import outbox
+from .models import Broadcast, normalize_recipient
+from .templating import recipient_context
+from .tasks import start_broadcast
 from django.db import transaction
+from django.urls import reverse
 
 def new_notification_view(request):
     """
     Admin view to send a notification. This implementation avoids creating a
     'template' Notification row that duplicates per-user notifications.
     - For single recipient: create one Notification and send it.
-    - For broadcast: create per-user Notification rows only.
+    - For broadcast: queue a Broadcast; tasks.start_broadcast creates the
+      per-user rows in bulk chunks and fans the sends out to Celery workers.
     """
     if request.method == 'POST':
         form = NotificationForm(request.POST)
@@ -567,41 +270,21 @@ def new_notification_view(request):
             notif_type = cleaned['type']
             details = cleaned['details']
             recipient_value = cleaned.get('recipient')  # can be email for single send
+            template = cleaned.get('template')  # optional NotificationTemplate
 
             if send_to_all:
-                # Broadcast: create per-user notification rows and send synchronously
-                users = User.objects.filter(role='customer').only('id', 'email')
-                sent = 0
-                failed = 0
-
-                # Use a DB transaction to avoid partial states if you want
-                with transaction.atomic():
-                    for user in users.iterator():
-                        # Skip creating a per-user notification if one already exists very recently
-                        exists = Notification.objects.filter(
-                            recipient_user=user,
-                            title=title,
-                            details=details
-                        ).exists()
-                        if exists:
-                            continue
-
-                        per_notif = Notification.objects.create(
-                            title=title,
-                            type=notif_type,
-                            recipient_user=user,
-                            recipient=user.email,
-                            details=details,
-                            status='pending'
-                        )
-
-                        res = send_and_update_notification(per_notif, pause_seconds=0.2)
-                        if res.get('success'):
-                            sent += 1
-                        else:
-                            failed += 1
-
-                messages.success(request, f'Broadcast completed. Sent: {sent}. Failed: {failed}.')
+                # Broadcast: record it and let Celery create/send the per-user rows
+                broadcast = Broadcast.objects.create(
+                    title=title,
+                    type=notif_type,
+                    details=details,
+                    template=template,
+                    created_by=request.user if request.user.is_authenticated else None,
+                )
+                transaction.on_commit(lambda: start_broadcast.delay(broadcast.pk))
+
+                messages.success(request, f'Broadcast #{broadcast.pk} queued. Track it at '
+                                          f'{reverse("broadcast_status", args=[broadcast.pk])}.')
                 return redirect('notifications')
 
             else:
@@ -611,15 +294,15 @@ def new_notification_view(request):
                 recipient_user = User.objects.filter(email__iexact=recipient_email).first()
 
                 # Prevent duplicate if same user already has same notification recently
-                existing = Notification.objects.filter(
-                    recipient__iexact=recipient_email,
-                    title=title,
-                    details=details
+                existing = Notification.objects.with_content(title, details, notif_type).filter(
+                    recipient=normalize_recipient(recipient_email)
                 ).first()
                 if existing and existing.recipient_user == recipient_user:
                     messages.info(request, "An identical notification already exists; resent that instead.")
-                    # resend existing
-                    send_and_update_notification(existing, pause_seconds=0)
+                    # resend existing (a row some sender has claimed is left to that sender)
+                    outbox.requeue([existing.pk])
+                    if not outbox.enabled():
+                        send_and_update_notification(existing)
                     return redirect('notifications')
 
                 n = Notification.objects.create(
@@ -628,9 +311,16 @@ def new_notification_view(request):
                     recipient=recipient_email,
                     recipient_user=recipient_user,
                     details=details,
+                    template=template,
+                    context=recipient_context(template, recipient_user or {'email': recipient_email})
+                    if template else {},
                     status='pending'
                 )
-                res = send_and_update_notification(n, pause_seconds=0)
+                if outbox.enabled():
+                    # the outbox dispatcher sends it once this request commits
+                    messages.success(request, "Email queued for delivery.")
+                    return redirect('notifications')
+                res = send_and_update_notification(n)
                 if res.get('success'):
                     messages.success(request, "Email sent successfully.")
                 else:
@@ -664,18 +354,25 @@ def update_notification_view(request, pk):
     if request.method == 'POST':
         form = NotificationForm(request.POST, instance=notif)
         if form.is_valid():
-            notif = form.save(commit=False)
+            notif = form.save()
+            # back to 'pending' for the resend; a row some sender has claimed stays with it
+            outbox.requeue([notif.pk])
+            if outbox.enabled():
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse({'ok': True, 'message': 'Email queued for resending.'})
+                messages.success(request, "Email queued for resending.")
+                return redirect('notifications')
             # If AJAX request, perform send and return JSON
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 # synchronous send (safe for small tests / admin)
-                result = send_and_update_notification(notif, pause_seconds=0)
+                result = send_and_update_notification(notif)
                 if result.get('success'):
                     return JsonResponse({'ok': True, 'message': 'Email resent successfully.'})
                 else:
                     return JsonResponse({'ok': False, 'message': result.get('error', 'Unknown error')} , status=500)
             else:
                 # non-AJAX fallback: send and redirect with messages
-                result = send_and_update_notification(notif, pause_seconds=0)
+                result = send_and_update_notification(notif)
                 if result.get('success'):
                     messages.success(request, "Email resent successfully!")
                 else:
@@ -693,31 +390,31 @@ def update_notification_view(request, pk):
 
 
 
-# ✅ List all notifications
 @login_required
-def all_notifications_view(request):
-    notifications = Notification.objects.all().order_by('-date_sent')
-    myFilter = OrderFilter(request.GET, queryset=notifications)
-    notifications = myFilter.qs
+def broadcast_status(request, pk):
+    """JSON progress of a queued broadcast (only its creator may read it)."""
+    broadcast = get_object_or_404(Broadcast, pk=pk, created_by=request.user)
+    return JsonResponse({
+        'id': broadcast.pk,
+        'status': broadcast.status,
+        'total_recipients': broadcast.total_recipients,
+        'created': broadcast.created_count,
+        'skipped': broadcast.skipped_count,
+        'sent': broadcast.sent_count,
+        'failed': broadcast.failed_count,
+        'progress': broadcast.progress,
+    })
 
-    sort_by = request.GET.get('sort_by', 'date_sent_desc')
-    if sort_by == 'type':
-        notifications = notifications.order_by('type')
-    elif sort_by == 'title':
-        notifications = notifications.order_by('title')
-    elif sort_by == 'recipient':
-        notifications = notifications.order_by('recipient')
-    elif sort_by == 'date_sent_asc':
-        notifications = notifications.order_by('date_sent')
-    else:
-        notifications = notifications.order_by('-date_sent')
 
-    paginator = Paginator(notifications, 15)
-    page = request.GET.get('page')
-    notifications_page = paginator.get_page(page)
+# ✅ List all notifications
+@login_required
+def all_notifications_view(request):
+    myFilter, sort_by, ordering = _filtered_notifications(request)
+    notifications_page = keyset_paginate(myFilter.qs, request, ordering, per_page=15)
 
     context = {
         'notifications': notifications_page,
+        'page': notifications_page,
         'myFilter': myFilter,
         'sort_by': sort_by,
     }
@@ -741,12 +438,8 @@ def search_noti(request):
     else:
         query = request.GET.get('q', '').strip()
 
-    if query:
-        notifications = Notification.objects.filter(
-            Q(title__icontains=query) | Q(details__icontains=query)
-        ).order_by('-date_sent')
-    else:
-        notifications = Notification.objects.none()
+    # ranked full-text matches from the search index, best first
+    notifications = search_notifications(query) if query else []
 
     return render(request, 'notifications/search_noti.html', {'searched': query, 'notifications': notifications})
 
@@ -756,14 +449,33 @@ def search_noti(request):
 
 
 
+# sort_by -> keyset ordering for plan_list
+PLAN_ORDERINGS = {
+    'name': ('name', 'id'),
+    'price': ('price', 'id'),
+    'created_date': ('created_date', 'id'),
+    'final_price': ('effective_price', 'id'),
+}
+
+
+def _price_param(request, name):
+    try:
+        value = Decimal(request.GET.get(name, ''))
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
 @login_required
 def plan_list(request):
     sort_by = request.GET.get('sort_by', 'name')
     search_query = request.GET.get('search', '')
     category_id = request.GET.get('category', '')
+    min_price = _price_param(request, 'min_price')
+    max_price = _price_param(request, 'max_price')
 
-    # Base queryset
-    plans = Plan.objects.all()
+    # Base queryset: final price and discount state computed by the database
+    plans = Plan.objects.with_effective_price().select_related('category')
 
     # ✅ Restrict admin to only their own plans
     if request.user.role == 'admin':
@@ -777,23 +489,35 @@ def plan_list(request):
     if category_id:
         plans = plans.filter(category__id=category_id)
 
+    # Final price range
+    if min_price is not None:
+        plans = plans.filter(effective_price__gte=min_price)
+    if max_price is not None:
+        plans = plans.filter(effective_price__lte=max_price)
+
+    price_stats = plans.aggregate(
+        lowest=Min('effective_price'),
+        highest=Max('effective_price'),
+        average=Avg('effective_price'),
+        discounted=Count('id', filter=Q(discount_active=True)),
+    )
+
     # Sorting options
-    if sort_by == 'price':
-        plans = plans.order_by('price')
-    elif sort_by == 'created_date':
-        plans = plans.order_by('created_date')
-    elif sort_by == 'final_price':
-        plans = sorted(plans, key=lambda x: x.final_price)
-    else:
-        plans = plans.order_by('name')
+    if sort_by not in PLAN_ORDERINGS:
+        sort_by = 'name'
+    page = keyset_paginate(plans, request, PLAN_ORDERINGS[sort_by], per_page=25)
 
     categories = Category.objects.all()
 
     context = {
-        'plans': plans,
+        'plans': page,
+        'page': page,
+        'price_stats': price_stats,
         'categories': categories,
         'search_query': search_query,
         'sort_by': sort_by,
+        'min_price': request.GET.get('min_price', ''),
+        'max_price': request.GET.get('max_price', ''),
         'selected_category': int(category_id) if category_id else None,
     }
     return render(request, 'plans/plans_list.html', context)
@@ -879,18 +603,15 @@ def payments_list(request):
     query = request.GET.get('q', '').strip()
 
     # only payments related to plans whose category.created_by == current admin
-    payments = Payment.objects.select_related(
+    payments = Payment.objects.for_owner(request.user).select_related(
         'subscription__customer', 'subscription__plan', 'subscription__plan__category'
-    ).filter(subscription__plan__category__created_by=request.user)
+    )
 
     if query:
-        payments = payments.filter(
-            Q(subscription__customer__username__icontains=query) |
-            Q(subscription__plan__name__icontains=query) |
-            Q(transaction_id__icontains=query)
-        )
+        payments = filter_payments(payments, query)
 
-    return render(request, 'payments/payments_list.html', {'payments': payments, 'query': query})
+    page = keyset_paginate(payments, request, ('-payment_date', '-id'), per_page=25)
+    return render(request, 'payments/payments_list.html', {'payments': page, 'page': page, 'query': query})
 
 
 # --------------------------
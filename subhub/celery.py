@@ -1,7 +1,6 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
-from celery.schedules import crontab
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'subhub.settings')
@@ -20,10 +19,5 @@ app.autodiscover_tasks()
 def debug_task(self):
     print('Request: {0!r}'.format(self.request))
 
-# Configure Celery Beat schedule.
-app.conf.beat_schedule = {
-    'send-payment-reminders-daily': {
-        'task': 'notifications.tasks.send_payment_reminders',
-        'schedule': crontab(hour=0, minute=0),  # Run daily at midnight.
-    },
-}
+# Celery Beat schedule lives in settings.CELERY_BEAT_SCHEDULE (loaded above);
+# defining it here as well would replace it and double-schedule jobs.
@@ -78,11 +78,15 @@ MSG91_AUTH_KEY = os.getenv('MSG91_AUTH_KEY')
 MSG91_SENDER_ID = os.getenv('MSG91_SENDER_ID', 'SUBHUB')
 MSG91_ROUTE = os.getenv('MSG91_ROUTE', '4')
 MSG91_COUNTRY = os.getenv('MSG91_COUNTRY', '91')
+# Max recipients per MSG91 API call (identical texts share one "sms" entry)
+MSG91_BATCH_SIZE = int(os.getenv('MSG91_BATCH_SIZE', 100))
 
 # Twilio (fallback)
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
+# prefix for numbers stored without a '+' country code
+TWILIO_COUNTRY = os.getenv('TWILIO_COUNTRY', MSG91_COUNTRY)
 
 # Optional Email (SMTP) settings (useful as fallback or for admin mails)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -107,6 +111,22 @@ DATABASES = {
     }
 }
 
+# Cache (dashboard contexts). LocMem is per-process: set CACHE_URL to a Redis
+# URL in production so signal-driven invalidation reaches every worker. Without
+# it, other processes only see a change once their copy expires, so the default
+# timeout drops to a few seconds under the LocMem fallback.
+CACHE_URL = os.getenv('CACHE_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'subhub-default',
+    }
+}
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv('DASHBOARD_CACHE_TIMEOUT', 300 if CACHE_URL else 10))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
@@ -137,6 +157,11 @@ CELERY_TIMEZONE = os.getenv('CELERY_TIMEZONE', 'UTC')
 
 # Celery beat schedule (include your existing tasks + added prune task)
 CELERY_BEAT_SCHEDULE = {
+    # payment reminders (formerly scheduled in subhub/celery.py)
+    'send-payment-reminders-daily': {
+        'task': 'notifications.tasks.send_payment_reminders',
+        'schedule': crontab(hour=0, minute=0),  # daily at midnight
+    },
     # existing generate_alerts (if you have it implemented)
     'generate-alerts-daily': {
         'task': 'notifications.tasks.generate_alerts',
@@ -147,6 +172,21 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'notifications.tasks.check_subscription_notifications',
         'schedule': crontab(hour=0, minute=10),  # runs daily at 00:10
     },
+    # rebuild dashboard rollups (DailyOwnerMetrics)
+    'rebuild-daily-owner-metrics': {
+        'task': 'notifications.tasks.rebuild_daily_owner_metrics',
+        'schedule': crontab(hour=0, minute=20),  # runs daily at 00:20
+    },
+    # re-send notifications whose retry backoff has elapsed
+    'retry-failed-notifications': {
+        'task': 'notifications.tasks.retry_failed_notifications',
+        'schedule': crontab(minute='*'),  # every minute
+    },
+    # correct stored plan prices and schedule discount boundaries (notifications/discounts.py)
+    'sweep-plan-discounts': {
+        'task': 'notifications.tasks.sweep_plan_discounts',
+        'schedule': int(os.getenv('DISCOUNT_SWEEP_SECONDS', 300)),
+    },
     # prune old notifications (auto-cleanup)
     'prune-old-notifications-daily': {
         'task': 'notifications.tasks.prune_old_notifications',
@@ -155,11 +195,79 @@ CELERY_BEAT_SCHEDULE = {
     },
 }
 
+# Scheduled tasks take a DB lease (notifications/locks.py); a holder that stops
+# heart-beating loses it after this many seconds.
+JOB_LEASE_TTL_SECONDS = int(os.getenv('JOB_LEASE_TTL_SECONDS', 600))
+
 # Notification tuning (used by enqueue_broadcast task)
 NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 50))
-NOTIFICATION_BATCH_PAUSE_SECONDS = float(os.getenv('NOTIFICATION_BATCH_PAUSE_SECONDS', 1.0))
+# Most results search_noti shows, ranked by relevance (notifications/search.py)
+NOTIFICATION_SEARCH_LIMIT = int(os.getenv('NOTIFICATION_SEARCH_LIMIT', 100))
+# Delivery channels (notifications/channels.py): users without their own
+# User.notification_channels get this ordered list, falling back left to right.
+NOTIFICATION_DEFAULT_CHANNELS = os.getenv('NOTIFICATION_DEFAULT_CHANNELS', 'email').split(',')
+SMS_HTTP_POOL_SIZE = int(os.getenv('SMS_HTTP_POOL_SIZE', 10))
+SMS_HTTP_TIMEOUT = float(os.getenv('SMS_HTTP_TIMEOUT', 10))
+# Who sends notifications (notifications/outbox.py): 'celery' = tasks/views send
+# them; 'outbox' = views and tasks only write rows and `manage.py dispatch_outbox`
+# processes deliver them.
+NOTIFICATION_DELIVERY = os.getenv('NOTIFICATION_DELIVERY', 'celery')
+# Rows left in 'sending' longer than this by a dead sender go back to 'pending'
+OUTBOX_CLAIM_TIMEOUT_SECONDS = int(os.getenv('OUTBOX_CLAIM_TIMEOUT_SECONDS', 600))
+# Failed sends (notifications/retry.py): transient errors back off exponentially
+# (base * 2^n seconds, capped, with jitter) up to max_attempts; permanent errors
+# and exhausted rows become status 'dead'.
+NOTIFICATION_RETRY_POLICIES = {
+    'transient': {
+        'max_attempts': int(os.getenv('NOTIFICATION_RETRY_MAX_ATTEMPTS', 6)),
+        'base_seconds': int(os.getenv('NOTIFICATION_RETRY_BASE_SECONDS', 60)),
+        'max_seconds': int(os.getenv('NOTIFICATION_RETRY_MAX_SECONDS', 6 * 3600)),
+    },
+    'permanent': {'max_attempts': 1},
+}
+NOTIFICATION_RETRY_SWEEP_LIMIT = int(os.getenv('NOTIFICATION_RETRY_SWEEP_LIMIT', 1000))
+NOTIFICATION_RETRY_CLAIM_SECONDS = int(os.getenv('NOTIFICATION_RETRY_CLAIM_SECONDS', 600))
+# Outbound provider quotas shared by all workers (notifications/ratelimit.py):
+# `rate` sends per second, `burst` sends allowed at once. rate 0 = unlimited.
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'db')  # 'db' | 'redis'
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', CACHE_URL)
+PROVIDER_RATE_LIMITS = {
+    'smtp': {
+        'rate': float(os.getenv('SMTP_RATE_PER_SECOND', 1.0)),
+        'burst': int(os.getenv('SMTP_RATE_BURST', 50)),
+    },
+    'msg91': {
+        'rate': float(os.getenv('MSG91_RATE_PER_SECOND', 10.0)),
+        'burst': int(os.getenv('MSG91_RATE_BURST', 100)),
+    },
+    'twilio': {
+        'rate': float(os.getenv('TWILIO_RATE_PER_SECOND', 1.0)),
+        'burst': int(os.getenv('TWILIO_RATE_BURST', 10)),
+    },
+}
+# Plan discount windows (notifications/discounts.py): boundary ETA tasks are
+# queued at most DISCOUNT_SCHEDULE_HORIZON_SECONDS ahead; the sweeper runs every
+# DISCOUNT_SWEEP_SECONDS, so the horizon should exceed it. Set
+# DISCOUNT_NOTIFY_CUSTOMERS to announce a starting discount to the customers
+# subscribed in the plan's category.
+DISCOUNT_SWEEP_SECONDS = int(os.getenv('DISCOUNT_SWEEP_SECONDS', 300))
+DISCOUNT_SCHEDULE_HORIZON_SECONDS = int(os.getenv('DISCOUNT_SCHEDULE_HORIZON_SECONDS', 900))
+DISCOUNT_NOTIFY_CUSTOMERS = os.getenv('DISCOUNT_NOTIFY_CUSTOMERS', 'False') in ('True', 'true', '1')
+
+# Subscription expiry reminders: days before end_date (see notifications/reminders.py)
+SUBSCRIPTION_REMINDER_OFFSETS = [int(d) for d in os.getenv('SUBSCRIPTION_REMINDER_OFFSETS', '14,7,3,1,0').split(',')]
+SUBSCRIPTION_ALERT_OFFSETS = [int(d) for d in os.getenv('SUBSCRIPTION_ALERT_OFFSETS', '7,0').split(',')]
+# How many days after end_date a missed expiry notice is still sent
+SUBSCRIPTION_REMINDER_CATCHUP_DAYS = int(os.getenv('SUBSCRIPTION_REMINDER_CATCHUP_DAYS', 3))
+# Split the daily subscription jobs into N shards run in parallel (1 = single task)
+SUBSCRIPTION_JOB_SHARDS = int(os.getenv('SUBSCRIPTION_JOB_SHARDS', 1))
+SUBSCRIPTION_JOB_SHARD_MODE = os.getenv('SUBSCRIPTION_JOB_SHARD_MODE', 'range')  # 'range' | 'hash'
 # How long to keep notifications before pruning (days)
 NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 30))
+# Pruned rows are deleted this many at a time, each chunk archived first as
+# gzip JSONL under NOTIFICATION_ARCHIVE_DIR/<model>/<cutoff date>/
+NOTIFICATION_PRUNE_CHUNK_SIZE = int(os.getenv('NOTIFICATION_PRUNE_CHUNK_SIZE', 1000))
+NOTIFICATION_ARCHIVE_DIR = Path(os.getenv('NOTIFICATION_ARCHIVE_DIR', BASE_DIR / 'archive'))
 
 # Auth user model
 AUTH_USER_MODEL = 'notifications.User'